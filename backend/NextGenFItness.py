@@ -1,12 +1,11 @@
 from json import scanner
-from flask import Flask, request, jsonify,send_from_directory,current_app
+from flask import Flask, Response, request, jsonify,send_file,current_app
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
+from werkzeug.utils import safe_join, secure_filename
 import sqlite3
 import base64
 import re # Import the re module for regeximport os
-import random
 import os
 import shutil
 import json
@@ -18,9 +17,28 @@ from PIL import Image
 import requests
 from food_recognition import FoodRecognition
 from diet_plan_system import DietPlanSystem, integrate_diet_system_with_app, setup_diet_plan_routes
+from db_pool import ConnectionPool
+from dietary_rollups import compact_dietary_rollups
+from exercise_catalog import ExerciseCatalog, exercise_folder_name
+from exercise_query import exercise_filters, find_exercises, page_exercises
+from exercise_search import search_exercises as search_exercise_rows
+from exercise_similarity import ExerciseSimilarity
+from id_sequence import next_id
+from image_derivatives import DERIVATIVE_SIZES, ImageDerivatives
+from migrations import migrate
+from plan_lifecycle import expire_plans
+from reminder_engine import create_daily_reminders, mark_overdue_exercises, reset_watermark
+from scheduler import JobScheduler
+from static_assets import StaticAssets, set_cache_headers
+from workout_stats import read_plan_progress, read_workout_stats
+from workout_schedule import (EXERCISES_PER_DAY, PLAN_STORAGE_MATERIALIZED, PLAN_STORAGE_RULE, ScheduleRule,
+                              build_schedule, iter_plan_json, materialize_schedule, schedule_to_dict)
 import google.generativeai as genai
-from dateutil.relativedelta import relativedelta
-from collections import Counter
+import logging
+from app_logging import setup_logging
+
+setup_logging()
+logger = logging.getLogger('NextGenFItness')  # not __name__: the app is usually run as __main__
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EXERCISE_FOLDER = os.path.join(BASE_DIR, 'exercises')
@@ -72,155 +90,83 @@ def bad_request(e):
 def internal_error(e):
     return jsonify({'error': 'Internal server error', 'success': False}), 500
 
+# Shared connection pool (WAL, synchronous=NORMAL, foreign keys) used by every route
+db_pool = ConnectionPool('NextGenFitness.db')
+
 def get_db_connection():
-    conn = sqlite3.connect('NextGenFitness.db')
-    conn.row_factory = sqlite3.Row
-    return conn
+    return db_pool.checkout()
+
+# Content hashes of the exercise photos and uploaded images, for ?v= URLs and ETags
+exercise_assets = StaticAssets(IMAGE_DIR)
+upload_assets = StaticAssets(UPLOAD_FOLDER)
+
+# Exercise rows, image URLs and parsed instructions, loaded once and served from memory
+exercise_catalog = ExerciseCatalog(get_db_connection, EXERCISE_FOLDER, asset_version=exercise_assets.version)
+
+# Feature matrix behind substitutions and muscle-balanced plan rotations
+exercise_similarity = ExerciseSimilarity(get_db_connection)
+exercise_catalog.on_invalidate(exercise_similarity.invalidate)
+
+# Resized WebP/JPEG variants of the exercise photos, cached on disk
+IMAGE_CACHE_FOLDER = os.path.join(BASE_DIR, 'image_cache')
+image_derivatives = ImageDerivatives(IMAGE_CACHE_FOLDER)
+
+# Overdue marking and daily reminders for all users run in bulk shortly after
+# midnight; request handlers only read their results
+reminder_scheduler = JobScheduler(get_db_connection)
+reminder_scheduler.add_daily_job('overdue_exercises', '00:05',
+                                 lambda conn, run_date: mark_overdue_exercises(conn, today=run_date))
+reminder_scheduler.add_daily_job('daily_reminders', '00:05',
+                                 lambda conn, run_date: create_daily_reminders(conn, today=run_date))
+# Expired diet and workout plans are marked Completed in bulk, not on read
+reminder_scheduler.add_daily_job('plan_lifecycle', '00:10',
+                                 lambda conn, run_date: expire_plans(conn, today=run_date))
+reminder_scheduler.add_daily_job('dietary_rollups', '00:15',
+                                 lambda conn, run_date: compact_dietary_rollups(conn, today=run_date))
+
+@app.before_request
+def start_background_jobs():
+    # Once per process (a no-op after the first request), also in forked WSGI
+    # workers where the __main__ block never runs
+    reminder_scheduler.start()
+
+@app.teardown_request
+def release_db_connection(exc):
+    # Return any connection a handler forgot to close back to the pool
+    db_pool.release_current()
+
+@app.route('/api/system/db-pool', methods=['GET'])
+def get_db_pool_stats():
+    """Connection pool size and checkout/checkin metrics"""
+    return jsonify(db_pool.stats()), 200
 
 
 def init_db():
+    """Bring the database schema up to date (a no-op once it is current; see migrations.py)"""
     conn = get_db_connection()
-    c = conn.cursor()
-
-    # Create User table
-    c.execute('''CREATE TABLE IF NOT EXISTS User
-                (user_id TEXT PRIMARY KEY,
-                username TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                password TEXT NOT NULL,
-                role INTEGER)''')
-
-    # Create Profile table
-    c.execute('''CREATE TABLE IF NOT EXISTS Profile
-                (profile_id TEXT PRIMARY KEY,
-                user_id TEXT UNIQUE NOT NULL,
-                full_name TEXT,
-                age INTEGER,
-                gender TEXT,
-                height REAL,
-                weight REAL,
-                bmi REAL,
-                location TEXT,
-                FOREIGN KEY (user_id) REFERENCES User(user_id))''')
-
-    # Create Goal table
-    c.execute('''CREATE TABLE IF NOT EXISTS Goal
-                (goal_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                workout_plan TEXT,
-                diet_plan TEXT,
-                goal_type TEXT,
-                target_value REAL,
-                current_value REAL,
-                status TEXT,
-                FOREIGN KEY (user_id) REFERENCES User(user_id))''')
-
-
-    # Create MealScans table
-    c.execute('''CREATE TABLE IF NOT EXISTS MealScans
-                (meal_scan_id TEXT PRIMARY KEY,
-                user_id TEXT,
-                food_name TEXT,
-                calories INTEGER,
-                nutrients TEXT,
-                image_path TEXT,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES User(user_id))''')
-    
-    # Create Feedback table
-    c.execute('''CREATE TABLE IF NOT EXISTS Feedback (
-                feedback_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                submitted_at DATE,
-                category TEXT,
-                feedback_text TEXT,
-                status TEXT,
-                FOREIGN KEY (user_id) REFERENCES User(user_id)
-            )''')
-                
-    conn.commit()
+    migrate(conn)
     conn.close()
 
 
-def generate_user_id():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT user_id FROM User ORDER BY user_id DESC LIMIT 1")
-    last = c.fetchone()
-    conn.close()
-    if last and last['user_id']:
-        last_num = int(last['user_id'][1:])
-        new_num = last_num + 1
-    else:
-        new_num = 1
-    return f"U{new_num:03d}"
+def generate_user_id(conn):
+    return next_id(conn, 'user')
 
-def generate_profile_id():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT profile_id FROM Profile ORDER BY profile_id DESC LIMIT 1")
-    last_id_row = c.fetchone()
-    conn.close()
-    if last_id_row:
-        last_id = last_id_row['profile_id']
-        numeric_part = int(last_id[1:]) + 1
-        return f'P{numeric_part:03d}'
-    else:
-        return 'P001'
+def generate_profile_id(conn):
+    return next_id(conn, 'profile')
 
-def generate_goal_id():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT goal_id FROM Goal ORDER BY goal_id DESC LIMIT 1")
-    last_id_row = c.fetchone()
-    conn.close()
-    if last_id_row:
-        last_id = last_id_row['goal_id']
-        numeric_part = int(last_id[1:]) + 1
-        return f'G{numeric_part:03d}'
-    else:
-        return 'G001'
+def generate_goal_id(conn):
+    return next_id(conn, 'goal')
 
 
-def generate_feedback_id():
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT feedback_id FROM Feedback ORDER BY feedback_id DESC LIMIT 1")
-    last_id_row = c.fetchone()
-    conn.close()
-    if last_id_row:
-        last_id = last_id_row['feedback_id']
-        numeric_part = int(last_id[1:]) + 1
-        return f'F{numeric_part:03d}'
-    else:
-        return 'F001'
+def generate_feedback_id(conn):
+    return next_id(conn, 'feedback')
 
-def generate_log_id(): #
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT log_id FROM SystemLog ORDER BY log_id DESC LIMIT 1")
-    last_id_row = c.fetchone()
-    conn.close()
-    if last_id_row:
-        last_id = last_id_row['log_id']
-        numeric_part = int(last_id[1:]) + 1
-        return f'L{numeric_part:03d}'
-    else:
-        return 'L001'
+def generate_log_id(conn):
+    return next_id(conn, 'log')
     
-def generate_diet_pref_id():
+def generate_diet_pref_id(conn):
     """Generate unique diet preference ID"""
-    conn = get_db_connection()
-    c = conn.cursor()
-    c.execute("SELECT diet_pref_id FROM UserDietPreference ORDER BY diet_pref_id DESC LIMIT 1")
-    last_id_row = c.fetchone()
-    conn.close()
-    if last_id_row:
-        last_id = last_id_row['diet_pref_id']
-        numeric_part = int(last_id[2:]) + 1
-        return f'DP{numeric_part:03d}'
-    else:
-        return 'DP001'
+    return next_id(conn, 'diet_pref')
 
 @app.route('/validate-allergies', methods=['POST'])
 def validate_allergies():
@@ -302,7 +248,7 @@ def signup():
         if c.fetchone():
             return jsonify({'error': 'Email already registered. Please use a different email address.'}), 409
 
-        new_user_id = generate_user_id()
+        new_user_id = generate_user_id(conn)
 
         # Insert user
         c.execute("INSERT INTO User (user_id, username, email, password, role) VALUES (?, ?, ?, ?, ?)",
@@ -317,21 +263,21 @@ def signup():
                 bmi = None
 
         # Insert into Profile table
-        profile_id = generate_profile_id()
+        profile_id = generate_profile_id(conn)
         c.execute("""
             INSERT INTO Profile (profile_id, user_id, full_name, age, gender, height, weight, bmi)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, (profile_id, new_user_id, username, int(age), gender, float(height), float(weight), bmi))
 
         # Insert into Goal table
-        goal_id = generate_goal_id()
+        goal_id = generate_goal_id(conn)
         c.execute("""
             INSERT INTO Goal (goal_id, user_id, goal_type, target_value, current_value, status)
             VALUES (?, ?, ?, ?, ?, ?)
         """, (goal_id, new_user_id, main_goal, float(target_weight), float(weight), 'In Progress'))
 
         # Insert into UserDietPreference table
-        diet_pref_id = generate_diet_pref_id()
+        diet_pref_id = generate_diet_pref_id(conn)
         allergy_text = allergy if allergy else None
         c.execute("""
             INSERT INTO UserDietPreference (diet_pref_id, user_id, dietary_goal, allergies)
@@ -376,7 +322,7 @@ def login():
         
         # Log login attempt
         try:
-            log_id = generate_log_id()
+            log_id = generate_log_id(conn)
             action = "Logged In"
             timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             c.execute(
@@ -384,7 +330,7 @@ def login():
                 (log_id, user_id, action, timestamp)
             )
         except Exception as e:
-            print(f"Error logging login activity: {e}")
+            logger.error("Error logging login activity: %s", e)
             # Still allow login to proceed
 
         # Auto-update progress for all workout plans of this user
@@ -405,17 +351,19 @@ def login():
                 # Get today's workout exercises for that plan
                 today_exercises = []
                 if latest_plan_id:
-                    c.execute("""
-                        SELECT e.Exercise_ID, e.name, e.primaryMuscles, e.instructions
-                        FROM WorkoutPlanExercise wpe
-                        JOIN Exercise e ON e.Exercise_ID = wpe.Exercise_ID
-                        WHERE wpe.plan_id = ? AND wpe.date = ?
-                    """, (latest_plan_id, today))
-                    today_exercises = [dict(row) for row in c.fetchall()]
+                    rule = ScheduleRule.from_plan_row(latest_plan)
+                    for ex_id in plan_exercise_ids_on(c, latest_plan_id, today, rule):
+                        c.execute("""
+                            SELECT Exercise_ID, name, primaryMuscles, instructions
+                            FROM Exercise WHERE Exercise_ID = ?
+                        """, (ex_id,))
+                        row = c.fetchone()
+                        if row:
+                            today_exercises.append(dict(row))
 
                 # Return with login response
             except Exception as e:
-                print(f"❌ Error fetching today's workout: {e}")
+                logger.error("Error fetching today's workout: %s", e)
                 today_exercises = []
                 latest_plan_id = None
 
@@ -473,7 +421,7 @@ def reset_password():
         return jsonify({'message': 'Password has been successfully updated'}), 200
     except Exception as e:
         conn.rollback()
-        print(f"Error updating password: {e}")
+        logger.error("Error updating password: %s", e)
         return jsonify({'error': 'Internal server error during password update'}), 500
     finally:
         conn.close()
@@ -526,12 +474,12 @@ def profile_reset_password():
         return jsonify({'message': 'Password reset successfully!'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in profile_reset_password: {e}")
+        logger.error("Database error in profile_reset_password: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in profile_reset_password: {e}")
+        logger.exception("An unexpected error occurred in profile_reset_password: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
@@ -572,7 +520,7 @@ def save_profile():
             WHERE user_id=?
         """, (full_name, age, gender, height, weight, bmi, location, user_id))
     else:
-        profile_id = generate_profile_id()
+        profile_id = generate_profile_id(conn)
         cur.execute("""
             INSERT INTO Profile (profile_id, user_id, full_name, age, gender, height, weight, bmi, location, )
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -585,181 +533,113 @@ def save_profile():
 
 @app.route('/exercise-images/<folder>/<filename>')
 def serve_exercise_image(folder, filename):
-    return send_from_directory(os.path.join(IMAGE_DIR, folder), filename)
+    # ?v=<hash> (as in the catalog's image_urls) makes the response immutable;
+    # ?size=<px>&format=webp|jpeg serves a cached, resized variant (see image_derivatives.py)
+    relpath = f"{folder}/{filename}"
+    requested_version = request.args.get('v')
+    size = request.args.get('size')
+    image_format = request.args.get('format')
+    if not size and not image_format:
+        return exercise_assets.send(relpath, requested_version)
+
+    version = exercise_assets.version(relpath)
+    if version is None:
+        return jsonify({'error': 'Image not found'}), 404
+    source_path = safe_join(IMAGE_DIR, folder, filename)
+    try:
+        path, mimetype = image_derivatives.derive(source_path, size or DERIVATIVE_SIZES[-1], image_format)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except (OSError, Image.DecompressionBombError) as e:
+        logger.error("Could not derive %s: %s", source_path, e)
+        return jsonify({'error': 'Image could not be processed'}), 422
+    return set_cache_headers(send_file(path, mimetype=mimetype, conditional=True),
+                             requested_version == version)
 
 @app.route('/search')
 def search_exercises():
-    query = request.args.get('q', '').lower()
+    query = request.args.get('q', '')
+    try:
+        limit = min(max(int(request.args.get('limit', 10)), 1), 50)
+        page = max(int(request.args.get('page', 1)), 1)
+    except ValueError:
+        return jsonify({'error': 'limit and page must be numbers'}), 400
+
+    # Ranked FTS5 prefix search, paginated in SQL
     conn = get_db_connection()
-    cur = conn.cursor()
-    
-    cur.execute("SELECT * FROM Exercise WHERE LOWER(name) LIKE ?", ('%' + query + '%',))
-    rows = cur.fetchall()
+    rows = search_exercise_rows(conn, query, limit=limit, offset=(page - 1) * limit)
     conn.close()
 
-    exercises = []
-    for row in rows[:10]:  # limit to first 10 results
-        ex = dict(row)
-        
-        # Handle image URLs (assuming folder naming is like '3_4_Sit-up')
-        folder_name = ex['name'].replace('/', '_').replace(' ', '_')
-        image_dir = os.path.join(EXERCISE_FOLDER, folder_name)
-        image_urls = []
-        if os.path.exists(image_dir):
-            for filename in sorted(os.listdir(image_dir)):
-                if filename.endswith('.jpg'):
-                    image_urls.append(f'/exercise-images/{folder_name}/{filename}')
-        ex['image_urls'] = image_urls
-
-        # Convert instruction from string to list if necessary
-        if isinstance(ex['instructions'], str):
-            ex['instructions'] = [step.strip() for step in ex['instructions'].split('.') if step.strip()]
-
-        exercises.append(ex)
+    # Image URLs and instruction steps come from the in-memory catalog
+    exercises = [exercise_catalog.decorate(row) for row in rows]
 
     return jsonify({'exercises': exercises})
 
-@app.route('/exercises')
-def get_exercises():
-
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 10))
-    offset = (page - 1) * per_page
-
-    # Get filter parameters
-    level = request.args.get('level')
-    mechanic = request.args.get('mechanic')
-    equipment = request.args.get('equipment')
-    primary_muscle = request.args.get('primaryMuscle')
-    category = request.args.get('category')
-
-    query = "SELECT * FROM Exercise WHERE 1=1"
-    params = []
-
-    # Add filters dynamically
-    if level:
-        query += " AND level = ?"
-        params.append(level)
-    if mechanic:
-        query += " AND mechanic = ?"
-        params.append(mechanic)
-    if equipment:
-        query += " AND equipment = ?"
-        params.append(equipment)
-    if primary_muscle:
-        query += " AND primaryMuscles LIKE ?"
-        params.append(f"%{primary_muscle}%")
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-
-    # Add pagination
-    query += " LIMIT ? OFFSET ?"
-    params.extend([per_page, offset])
+def exercise_page_response():
+    """Shared body of /exercises and /exercise-library: filtered, keyset-paginated listing"""
+    cursor = request.args.get('cursor')  # Exercise_ID of the last item already shown
+    try:
+        per_page = max(int(request.args.get('per_page', 10)), 1)
+        page = max(int(request.args.get('page', 1)), 1)
+        cursor = int(cursor) if cursor is not None else None
+    except ValueError:
+        return jsonify({'error': 'per_page, page and cursor must be numbers'}), 400
 
     conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
+    rows, next_cursor = page_exercises(conn, exercise_filters(request.args), per_page=per_page,
+                                       cursor=cursor, page=page)
     conn.close()
 
-    exercises = []
-    for row in rows:
-        ex = dict(row)
-
-        # Generate image URLs
-        folder_name = ex['name'].replace('/', '_').replace(' ', '_')
-        image_dir = os.path.join(EXERCISE_FOLDER, folder_name)
-        image_urls = []
-        if os.path.exists(image_dir):
-            for filename in sorted(os.listdir(image_dir)):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    image_urls.append(f'/exercise-images/{folder_name}/{filename}')
-        ex['image_urls'] = image_urls
+    # Image URLs and instruction steps come from the in-memory catalog
+    exercises = [exercise_catalog.decorate(row) for row in rows]
 
-        # Convert instructions string to list
-        if isinstance(ex['instructions'], str):
-            ex['instructions'] = [step.strip() for step in ex['instructions'].split('.') if step.strip()]
+    return jsonify({'exercises': exercises, 'next_cursor': next_cursor})
 
-        exercises.append(ex)
-
-    return jsonify({'exercises': exercises})
+@app.route('/exercises')
+def get_exercises():
+    return exercise_page_response()
 
 #customize-exercise-libray
 @app.route('/exercise-library', methods=['GET'])
 def get_exercise_library():
-    page = int(request.args.get('page', 1))
-    per_page = int(request.args.get('per_page', 10))
-    offset = (page - 1) * per_page
-
-    # Filters
-    level = request.args.get('level')
-    mechanic = request.args.get('mechanic')
-    equipment = request.args.get('equipment')
-    primary_muscle = request.args.get('primaryMuscle')
-    category = request.args.get('category')
-
-    query = "SELECT * FROM Exercise WHERE 1=1"
-    params = []
-
-    if level:
-        query += " AND level = ?"
-        params.append(level)
-    if mechanic:
-        query += " AND mechanic = ?"
-        params.append(mechanic)
-    if equipment:
-        query += " AND equipment = ?"
-        params.append(equipment)
-    if primary_muscle:
-        query += " AND primaryMuscles LIKE ?"
-        params.append(f"%{primary_muscle}%")
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-
-    query += " LIMIT ? OFFSET ?"
-    params.extend([per_page, offset])
-
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute(query, params)
-    rows = cur.fetchall()
-    conn.close()
-
-    exercises = []
-    for row in rows:
-        ex = dict(row)
-        folder_name = ex['name'].replace('/', '_').replace(' ', '_')
-        image_dir = os.path.join(EXERCISE_FOLDER, folder_name)
-        image_urls = []
+    return exercise_page_response()
 
-        if os.path.exists(image_dir):
-            for filename in sorted(os.listdir(image_dir)):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    image_urls.append(f'/exercise-images/{folder_name}/{filename}')
-        ex['image_urls'] = image_urls
+@app.route('/exercises/<int:exercise_id>/substitutes')
+def get_exercise_substitutes(exercise_id):
+    """Most similar exercises (muscles, equipment, mechanic, level, force), optionally filtered"""
+    try:
+        k = min(max(int(request.args.get('k', 5)), 1), 50)
+    except ValueError:
+        return jsonify({'error': 'k must be a number'}), 400
+    filters = exercise_filters(request.args)
 
-        # Convert instructions to list
-        if isinstance(ex['instructions'], str):
-            ex['instructions'] = [s.strip() for s in ex['instructions'].split('.') if s.strip()]
+    candidates = None
+    if filters:
+        conn = get_db_connection()
+        candidates = [row['Exercise_ID'] for row in find_exercises(conn, filters)]
+        conn.close()
 
-        exercises.append(ex)
+    try:
+        matches = exercise_similarity.similar(exercise_id, k=k, candidates=candidates)
+    except KeyError:
+        return jsonify({'error': 'Exercise not found'}), 404
 
-    return jsonify({'exercises': exercises})
+    substitutes = []
+    for match_id, score in matches:
+        exercise = exercise_catalog.get(match_id)
+        if exercise is not None:
+            exercise['similarity'] = round(score, 4)
+            substitutes.append(exercise)
+    return jsonify({'exercise_id': exercise_id, 'substitutes': substitutes})
 
 @app.route('/generate-plan', methods=['POST'])
 def generate_workout_plan():
     data = request.get_json()
 
     user_id = str(data.get('user_id'))
-    level = data.get('level')
-    mechanic = data.get('mechanic')
-    equipment = data.get('equipment')
-    primaryMuscle = data.get('primaryMuscle')
-    category = data.get('category')
     duration_months = data.get('duration', 3)
     start_date_str = data.get('start_date')  # Optional: "2025-06-23"
+    storage = data.get('storage', PLAN_STORAGE_MATERIALIZED)  # 'rule' stores only the rotation
 
     if user_id.isdigit():
         user_id = f"U{int(user_id):03d}"
@@ -767,119 +647,125 @@ def generate_workout_plan():
     if not user_id:
         return jsonify({'error': 'user_id is required'}), 400
 
-    query = "SELECT * FROM Exercise WHERE 1=1"
-    params = []
-
-    if level:
-        query += " AND level = ?"
-        params.append(level)
-    if mechanic:
-        query += " AND mechanic = ?"
-        params.append(mechanic)
-    if equipment:
-        if equipment == 'null':
-            query += " AND equipment IS NULL"
-        else:
-            query += " AND equipment = ?"
-            params.append(equipment)
-    if primaryMuscle:
-        query += " AND primaryMuscles LIKE ?"
-        params.append(f"%{primaryMuscle}%")
-    if category:
-        query += " AND category = ?"
-        params.append(category)
-
+    filters = exercise_filters(data)
     conn = get_db_connection()
     cur = conn.cursor()
-    print("Running query:", query)
-    print("With parameters:", params)
-    cur.execute(query, params)
-    rows = cur.fetchall()
+    logger.debug("Filtering exercises with: %s", filters)
+    rows = find_exercises(conn, filters)
 
     if not rows:
         conn.close()
         return jsonify({'error': 'No exercises found for the selected preferences.'}), 404
 
-    exercises = [dict(row) for row in rows]
-    random.shuffle(exercises)
-
-    total_workout_days = duration_months * 4 * 3  # 3 days/week × 4 weeks/month
-    exercises_per_day = 3
-    total_exercises_needed = total_workout_days * exercises_per_day
-
-    plan = []
-    while len(plan) < total_exercises_needed:
-        plan.extend(exercises)
-    plan = plan[:total_exercises_needed]
+    # Order the rotation so each workout day hits different muscle groups
+    exercises = {row['Exercise_ID']: dict(row) for row in rows}
+    rotation = exercise_similarity.balanced_rotation(list(exercises), EXERCISES_PER_DAY)
+    exercises = [exercises[exercise_id] for exercise_id in rotation]
 
     # Set the start date
     if start_date_str:
         try:
             start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
         except ValueError:
+            conn.close()
             return jsonify({'error': 'Invalid start_date format. Use %Y-%m-%d'}), 400
     else:
         start_date = datetime.today()
 
-    # Insert into WorkoutPlan
-    cur.execute(
-        "INSERT INTO WorkoutPlan (user_id, duration_months) VALUES (?, ?)",
-        (user_id, duration_months)
-    )
-    plan_id = cur.lastrowid
-
-    # Insert into WorkoutPlanExercise with actual dates
-    plan_by_dates = {}
-    for day_index in range(total_workout_days):
-        workout_date = start_date + timedelta(days=day_index * 2)  # every 2 days
-        formatted_date = workout_date.strftime("%Y-%m-%d")
-
-        for j in range(exercises_per_day):
-            exercise_index = day_index * exercises_per_day + j
-            ex = plan[exercise_index]
-
-            cur.execute('''
-                INSERT INTO WorkoutPlanExercise (plan_id, Exercise_ID, date)
-                VALUES (?, ?, ?)
-            ''', (plan_id, ex['Exercise_ID'], formatted_date))
-
-            plan_by_dates[formatted_date] = plan_by_dates.get(formatted_date, []) + [ex]
+    # Compute the whole schedule in memory, then write it in one transaction
+    schedule = build_schedule(exercises, start_date, duration_months)
 
-    # Create today's reminder if today has exercises in plan
-    today_str = datetime.today().strftime("%Y-%m-%d")
-    created_today_reminder = False
-
-    print("Generated plan dates:", list(plan_by_dates.keys()))
-    print("Today is:", today_str)
-
-    if today_str in plan_by_dates:
-        for ex in plan_by_dates[today_str]:
-            details = f"Don't forget your workout for plan {plan_id} today! 🏋️‍♀️"
-            cur.execute('''
-                INSERT INTO notifications (plan_id, user_id, type, details, checked, exercise_id, date)
-                VALUES (?, ?, 'daily reminder', ?, 0, ?, ?)
-            ''', (plan_id, user_id, details, ex['Exercise_ID'], today_str))
-            created_today_reminder = True
-        print(f"✅ Reminder created for today: {today_str}")
+    # Insert into WorkoutPlan, then either the rows or just the rotation rule
+    if storage == PLAN_STORAGE_RULE:
+        rule = ScheduleRule([ex['Exercise_ID'] for ex in exercises], start_date.date(), duration_months)
+        plan_id = insert_rule_plan(cur, user_id, rule)
     else:
-        print(f"❌ No exercises scheduled for today ({today_str}) in the plan.")
+        cur.execute(
+            "INSERT INTO WorkoutPlan (user_id, duration_months, start_date) VALUES (?, ?, ?)",
+            (user_id, duration_months, start_date.strftime("%Y-%m-%d"))
+        )
+        plan_id = cur.lastrowid
+
+        # Insert into WorkoutPlanExercise with actual dates
+        materialize_schedule(cur, plan_id, schedule, exercise_id=lambda ex: ex['Exercise_ID'])
 
     conn.commit()
     conn.close()
 
-    return jsonify({
+    # Create today's reminder if today has exercises in plan
+    today_reminder_queued = queue_today_reminders(user_id, plan_id, schedule)
+
+    return plan_response({
         'message': 'Workout plan generated and saved with dates',
         'plan_id': plan_id,
-        'created_today_reminder': created_today_reminder,
-        'plan': plan_by_dates
-    })
+        'today_reminder_queued': today_reminder_queued
+    }, schedule, stream=wants_streamed_plan(data))
+
+def queue_today_reminders(user_id, plan_id, schedule):
+    """
+    Queue today's daily reminders for a freshly created (and committed) plan on
+    the scheduler thread. Returns True if the plan has exercises today and the
+    reminders were queued (they are written shortly after the response).
+    """
+    today_str = datetime.today().strftime("%Y-%m-%d")
+    if not any(items for workout_date, items in schedule if workout_date == today_str):
+        logger.warning("No exercises scheduled for today (%s) in the plan.", today_str)
+        return False
+
+    reminder_scheduler.submit(create_daily_reminders, today_str, user_id, plan_id)
+    logger.info("Reminder queued for today: %s", today_str)
+    return True
+
+def insert_rule_plan(cursor, user_id, rule, created_at=None):
+    """Insert a WorkoutPlan that stores its schedule as a rule instead of WorkoutPlanExercise rows"""
+    columns = rule.to_columns()
+    columns.update({'user_id': user_id, 'duration_months': rule.duration_months})
+    if created_at:
+        columns['created_at'] = created_at
+    names = ', '.join(columns)
+    placeholders = ', '.join('?' for _ in columns)
+    cursor.execute(f"INSERT INTO WorkoutPlan ({names}) VALUES ({placeholders})", tuple(columns.values()))
+    return cursor.lastrowid
+
+def get_plan_rule(cursor, plan_id):
+    """ScheduleRule for a rule-stored plan, None for materialized (or unknown) plans"""
+    cursor.execute("SELECT * FROM WorkoutPlan WHERE plan_id = ?", (plan_id,))
+    plan = cursor.fetchone()
+    return ScheduleRule.from_plan_row(plan) if plan else None
+
+def plan_exercise_ids_on(cursor, plan_id, date_str, rule=None):
+    """Exercise IDs scheduled for a plan on a date, whichever way the plan is stored"""
+    if rule is None:
+        rule = get_plan_rule(cursor, plan_id)
+    if rule is not None:
+        return rule.exercises_on(date_str)
+    cursor.execute('''
+        SELECT Exercise_ID FROM WorkoutPlanExercise
+        WHERE plan_id = ? AND date = ?
+    ''', (plan_id, date_str))
+    return [row['Exercise_ID'] for row in cursor.fetchall()]
+
+def wants_streamed_plan(data):
+    """Plan endpoints stream their JSON when asked with ?stream=1 or {"stream": true}"""
+    return request.args.get('stream') == '1' or bool((data or {}).get('stream'))
+
+def plan_response(payload, schedule, stream=False):
+    if stream:
+        return Response(iter_plan_json(payload, schedule), mimetype='application/json')
+    payload['plan'] = schedule_to_dict(schedule)
+    return jsonify(payload)
 
 @app.route('/get-plans/<user_id>', methods=['GET'])
 def get_plans(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ?', (user_id,))
+    # Optional ?status=Active|Completed (set by the nightly plan_lifecycle job)
+    status = request.args.get('status')
+    if status:
+        cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ? AND status = ?', (user_id, status))
+    else:
+        cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ?', (user_id,))
     plans = cursor.fetchall()
     conn.close()
 
@@ -891,7 +777,12 @@ def get_user_plans(user_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ?', (user_id,))
+    # Optional ?status=Active|Completed (set by the nightly plan_lifecycle job)
+    status = request.args.get('status')
+    if status:
+        cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ? AND status = ?', (user_id, status))
+    else:
+        cursor.execute('SELECT * FROM WorkoutPlan WHERE user_id = ?', (user_id,))
     plans = cursor.fetchall()
     conn.close()
 
@@ -902,6 +793,11 @@ def get_plan_dates(plan_id):
     conn = get_db_connection()
     cursor = conn.cursor()
 
+    rule = get_plan_rule(cursor, plan_id)
+    if rule is not None:
+        conn.close()
+        return jsonify({'dates': rule.dates()})
+
     cursor.execute('''
         SELECT DISTINCT date
         FROM WorkoutPlanExercise
@@ -925,36 +821,53 @@ def get_plan_date(plan_id, date_str):
     try:
         datetime.strptime(date_str, "%Y-%m-%d")
     except ValueError:
+        conn.close()
         return jsonify({"error": "Invalid date format. Use %Y-%m-%d"}), 400
 
-    cursor.execute('''
-        SELECT w.Workout_id, w.exercise_id, w.date, e.*
-        FROM WorkoutPlanExercise w
-        JOIN Exercise e ON w.exercise_id = e.Exercise_ID
-        WHERE w.plan_id = ? AND w.date = ?
-    ''', (plan_id, date_str))
-
-    exercises = cursor.fetchall()
-    result = []
-    for ex in exercises:
-        exercise_dict = dict(ex)
-        exercise_dict['instructions'] = [s.strip() for s in exercise_dict['instructions'].split('.') if s.strip()]
-
-        folder = exercise_dict['name'].replace('/', '_').replace(' ', '_')
-        image_dir = os.path.join(EXERCISE_FOLDER, folder)
-        if os.path.exists(image_dir):
-            exercise_dict['image_urls'] = [
-                f"/exercise-images/{folder}/{img}" for img in sorted(os.listdir(image_dir))
-                if img.lower().endswith(('.jpg', '.jpeg', '.png'))
-            ]
-        else:
-            exercise_dict['image_urls'] = []
+    rule = get_plan_rule(cursor, plan_id)
+    if rule is not None:
+        # Rule plans have no WorkoutPlanExercise rows (and so no Workout_id to edit)
+        result = []
+        for ex_id in rule.exercises_on(date_str):
+            exercise = exercise_catalog.get(ex_id)
+            if exercise is not None:
+                result.append({'Workout_id': None, 'date': date_str, **exercise})
+    else:
+        cursor.execute('''
+            SELECT w.Workout_id, w.exercise_id, w.date, e.*
+            FROM WorkoutPlanExercise w
+            JOIN Exercise e ON w.exercise_id = e.Exercise_ID
+            WHERE w.plan_id = ? AND w.date = ?
+        ''', (plan_id, date_str))
 
-        result.append(exercise_dict)
+        # Image URLs and instruction steps come from the in-memory catalog
+        result = [exercise_catalog.decorate(ex) for ex in cursor.fetchall()]
 
     conn.close()
     return jsonify({'exercises': result})
 
+@app.route('/materialize-plan/<int:plan_id>', methods=['POST'])
+def materialize_plan(plan_id):
+    """
+    Expand a rule-stored plan into WorkoutPlanExercise rows (for analytics,
+    or before editing individual entries) and switch it to materialized storage.
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+
+    rule = get_plan_rule(cursor, plan_id)
+    if rule is None:
+        conn.close()
+        return jsonify({'message': 'Plan is already materialized', 'plan_id': plan_id}), 200
+
+    schedule = rule.schedule()
+    materialize_schedule(cursor, plan_id, schedule)
+    cursor.execute("UPDATE WorkoutPlan SET storage = ? WHERE plan_id = ?", (PLAN_STORAGE_MATERIALIZED, plan_id))
+    conn.commit()
+    conn.close()
+
+    return jsonify({'message': 'Plan materialized', 'plan_id': plan_id, 'rows': rule.slot_count()}), 200
+
 @app.route('/add-exercise', methods=['POST'])
 def add_exercise():
     data = request.get_json()
@@ -983,6 +896,7 @@ def add_exercise():
     exercise_id = cursor.lastrowid
     conn.commit()
     conn.close()
+    exercise_catalog.invalidate()
 
     return jsonify({'message': 'Exercise added successfully', 'id': exercise_id})
 
@@ -995,12 +909,18 @@ def update_exercise_plan():
     new_date = data.get('date')  # Optional
 
     if not workout_id or not new_exercise_id:
-        print("Incoming data:", data)
+        logger.debug("Incoming data: %s", data)
         return jsonify({'error': 'Missing workout_id or exercise_id'}), 400
         
     conn = get_db_connection()
     cur = conn.cursor()
 
+    # The entry may move to (or change on) a day already checked for overdue exercises
+    cur.execute('SELECT plan_id FROM WorkoutPlanExercise WHERE Workout_id = ?', (workout_id,))
+    entry = cur.fetchone()
+    if entry:
+        reset_watermark(conn, entry['plan_id'])
+
     # Build the update query
     if new_date:
         cur.execute('''
@@ -1018,6 +938,11 @@ def update_exercise_plan():
     conn.commit()
     conn.close()
 
+    # The entry may now be due today
+    if entry:
+        reminder_scheduler.submit(create_daily_reminders, datetime.now().strftime('%Y-%m-%d'),
+                                  None, entry['plan_id'])
+
     return jsonify({'message': 'Workout updated successfully'})
 
 #delete exercise in plan
@@ -1041,7 +966,7 @@ def delete_exercise_plan():
 @app.route('/update-exercise/<int:exercise_id>', methods=['PUT'])
 def update_exercise(exercise_id):
     data = request.json
-    print('RECEIVED primaryMuscles:', data['primaryMuscles'], type(data['primaryMuscles']))
+    logger.debug("RECEIVED primaryMuscles: %s %s", data['primaryMuscles'], type(data['primaryMuscles']))
     conn = get_db_connection()
     cur = conn.cursor()
 
@@ -1065,11 +990,12 @@ def update_exercise(exercise_id):
 
     conn.commit()
     conn.close()
+    exercise_catalog.invalidate()
     return jsonify({'message': 'Exercise updated'}), 200
 
 def upload_exercise_images(exercise_id):
     import os
-    from werkzeug.utils import secure_filename
+    from werkzeug.utils import safe_join, secure_filename
 
     conn = get_db_connection()
     cur = conn.cursor()
@@ -1081,7 +1007,7 @@ def upload_exercise_images(exercise_id):
         return jsonify({'error': 'Exercise not found'}), 404
 
     exercise_name = row['name']
-    folder_name = exercise_name.replace('/', '_').replace(' ', '_')
+    folder_name = exercise_folder_name(exercise_name)
     save_dir = os.path.join(EXERCISE_FOLDER, folder_name)
     os.makedirs(save_dir, exist_ok=True)
 
@@ -1094,6 +1020,7 @@ def upload_exercise_images(exercise_id):
             file_path = os.path.join(save_dir, f"{i}.png")
             file.save(file_path)
 
+    exercise_catalog.invalidate()
     return jsonify({'message': 'Images uploaded successfully'}), 200
 
 @app.route('/delete-exercise/<int:exercise_id>', methods=['DELETE'])
@@ -1110,17 +1037,23 @@ def delete_exercise(exercise_id):
         return jsonify({'error': 'Exercise not found'}), 404
 
     exercise_name = row['name']
-    folder_name = exercise_name.replace('/', '_').replace(' ', '_')
+    folder_name = exercise_folder_name(exercise_name)
     folder_path = os.path.join(EXERCISE_FOLDER, folder_name)
 
-    # Delete from DB
-    cur.execute("DELETE FROM Exercise WHERE Exercise_ID = ?", (exercise_id,))
-    conn.commit()
+    # Delete from DB (foreign keys are enforced, so exercises used in a plan are kept)
+    try:
+        cur.execute("DELETE FROM Exercise WHERE Exercise_ID = ?", (exercise_id,))
+        conn.commit()
+    except sqlite3.IntegrityError:
+        conn.rollback()
+        conn.close()
+        return jsonify({'error': f'Exercise {exercise_name} is used in a workout plan and cannot be deleted'}), 409
     conn.close()
 
     # Delete image folder if exists
     if os.path.exists(folder_path):
         shutil.rmtree(folder_path)
+    exercise_catalog.invalidate()
 
     return jsonify({'message': f'Exercise {exercise_name} deleted successfully'}), 200
 
@@ -1132,6 +1065,7 @@ def save_custom_plan():
     exercise_ids = data.get('exercise_ids', [])
     duration_months = data.get('duration', 3)
     start_date_str = data.get('start_date')
+    storage = data.get('storage', PLAN_STORAGE_MATERIALIZED)  # 'rule' stores only the rotation
 
     if not user_id or not exercise_ids or not start_date_str:
         return jsonify({"error": "Missing user_id, exercise_ids or start_date"}), 400
@@ -1143,80 +1077,42 @@ def save_custom_plan():
         except ValueError:
             return jsonify({'error': 'Invalid start_date format. Use YYYY-MM-DD'}), 400
 
-        # Workout plan logic
-        exercises_per_day = 3
-        total_workout_days = duration_months * 4 * 3  # 3 workout days/week × 4 weeks/month
-
-        total_exercises_needed = total_workout_days * exercises_per_day
-
-        # Repeat selected exercises if not enough
-        repeated_exercises = []
-        while len(repeated_exercises) < total_exercises_needed:
-            repeated_exercises.extend(exercise_ids)
-        repeated_exercises = repeated_exercises[:total_exercises_needed]
+        # Compute the whole schedule in memory, then write it in one transaction
+        schedule = build_schedule(exercise_ids, start_date, duration_months)
 
         # DB setup
         conn = get_db_connection()
         cursor = conn.cursor()
 
         # Insert WorkoutPlan
-        cursor.execute('''
-            INSERT INTO WorkoutPlan (user_id, duration_months, created_at)
-            VALUES (?, ?, ?)
-        ''', (user_id, duration_months, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        conn.commit()
-        plan_id = cursor.lastrowid
-
-        # Distribute across days
-        plan_by_dates = {}
-        for day_index in range(total_workout_days):
-            workout_date = start_date + timedelta(days=day_index * 2)  # every 2 days
-            formatted_date = workout_date.strftime("%Y-%m-%d")
-
-            for i in range(exercises_per_day):
-                exercise_index = day_index * exercises_per_day + i
-                exercise_id = repeated_exercises[exercise_index]
-
-                cursor.execute('''
-                    INSERT INTO WorkoutPlanExercise (plan_id, Exercise_ID, date)
-                    VALUES (?, ?, ?)
-                ''', (plan_id, exercise_id, formatted_date))
-
-                if formatted_date not in plan_by_dates:
-                    plan_by_dates[formatted_date] = []
-                plan_by_dates[formatted_date].append(exercise_id)
-
-        # Daily reminder logic for today
-        today_str = datetime.today().strftime("%Y-%m-%d")
-        created_today_reminder = False
-
-        print("Generated plan dates:", list(plan_by_dates.keys()))
-        print("Today is:", today_str)
-
-        if today_str in plan_by_dates:
-            for exercise_id in plan_by_dates[today_str]:
-                details = f"Don't forget your workout for plan {plan_id} today! 🏋️‍♀️"
-                cursor.execute('''
-                    INSERT INTO notifications (plan_id, user_id, type, details, checked, exercise_id, date)
-                    VALUES (?, ?, 'daily reminder', ?, 0, ?, ?)
-                ''', (plan_id, user_id, details, exercise_id, today_str))
-            created_today_reminder = True
-            print(f"✅ Reminder created for today: {today_str}")
+        created_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if storage == PLAN_STORAGE_RULE:
+            plan_id = insert_rule_plan(cursor, user_id, ScheduleRule(exercise_ids, start_date, duration_months),
+                                       created_at=created_at)
         else:
-            print(f"❌ No exercises scheduled for today ({today_str}) in the plan.")
+            cursor.execute('''
+                INSERT INTO WorkoutPlan (user_id, duration_months, created_at, start_date)
+                VALUES (?, ?, ?, ?)
+            ''', (user_id, duration_months, created_at, start_date_str))
+            plan_id = cursor.lastrowid
+
+            # Distribute across days
+            materialize_schedule(cursor, plan_id, schedule)
 
         conn.commit()
         conn.close()
 
-        return jsonify({
+        # Daily reminder logic for today
+        today_reminder_queued = queue_today_reminders(user_id, plan_id, schedule)
+
+        return plan_response({
             'message': '✅ Custom plan saved successfully.',
             'plan_id': plan_id,
-            'created_today_reminder': created_today_reminder,
-            'plan': plan_by_dates
-        })
+            'today_reminder_queued': today_reminder_queued
+        }, schedule, stream=wants_streamed_plan(data))
 
     except Exception as e:
-        print("❌ Error saving custom plan:", e)
+        logger.error("Error saving custom plan: %s", e)
         return jsonify({"error": str(e)}), 500
     
 #delete plan
@@ -1225,6 +1121,8 @@ def delete_plan(plan_id):
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM WorkoutPlanExercise WHERE plan_id = ?', (plan_id,))
+    cursor.execute('DELETE FROM ExerciseStatus WHERE plan_id = ?', (plan_id,))
+    reset_watermark(conn, plan_id)
     cursor.execute('DELETE FROM WorkoutPlan WHERE plan_id = ?', (plan_id,))
     conn.commit()
     conn.close()
@@ -1233,58 +1131,21 @@ def delete_plan(plan_id):
 #check percentage of progress
 @app.route('/check_workout_progress/<int:plan_id>', methods=['POST'])
 def check_workout_progress(plan_id):
+    # Counters and WorkoutPlan.progress are kept current by triggers whenever
+    # exercises are scheduled or statuses recorded (see workout_stats)
     conn = get_db_connection()
-    cursor = conn.cursor()
-
-    # 1. Get WorkoutPlan info (start date and duration)
-    cursor.execute('''
-        SELECT created_at, duration_months
-        FROM WorkoutPlan
-        WHERE plan_id = ?
-    ''', (plan_id,))
-    plan = cursor.fetchone()
+    plan = read_plan_progress(conn, plan_id)
+    conn.close()
 
     if not plan:
-        conn.close()
         return jsonify({'error': '❌ WorkoutPlan not found'}), 404
 
-    created_at = plan['created_at']
-    duration_months = plan['duration_months']
-
-    try:
-        start_date = datetime.strptime(created_at, '%Y-%m-%d %H:%M:%S')
-    except ValueError:
-        # In case DB stores it in a shorter format
-        start_date = datetime.strptime(created_at, '%Y-%m-%d')
-
-    end_date = start_date + relativedelta(months=duration_months)
-    total_days = (end_date - start_date).days
-
-    # 2. Count checked daily reminder notifications for that plan
-    cursor.execute('''
-        SELECT COUNT(*) AS completed_days
-        FROM notifications
-        WHERE plan_id = ? AND type = 'daily reminder' AND checked = 1
-    ''', (plan_id,))
-    completed_days = cursor.fetchone()['completed_days']
-
-    # 3. Calculate progress
-    progress = int((completed_days / total_days) * 100) if total_days > 0 else 0
-
-    # 4. Update the WorkoutPlan progress
-    cursor.execute('''
-        UPDATE WorkoutPlan
-        SET progress = ?
-        WHERE plan_id = ?
-    ''', (progress, plan_id))
-    conn.commit()
-    conn.close()
-
     return jsonify({
-        'message': f'✅ Progress updated to {progress}%',
-        'progress': progress,
-        'completed_days': completed_days,
-        'total_days': total_days
+        'message': f"✅ Progress updated to {plan['progress']}%",
+        'progress': plan['progress'],
+        'completed_exercises': plan['completed_exercises'],
+        'overdue_exercises': plan['overdue_exercises'],
+        'total_exercises': plan['total_exercises']
     }), 200
 
 from datetime import datetime
@@ -1399,10 +1260,10 @@ def get_all_users():
 
         return jsonify(users_list), 200
     except sqlite3.Error as e:
-        print(f"Database error in get_all_users: {e}")
+        logger.error("Database error in get_all_users: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_all_users: {e}")
+        logger.exception("An unexpected error occurred in get_all_users: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1430,10 +1291,10 @@ def get_total_users_count():
         return jsonify({'total_users': total_users}), 200 # 200 OK
     except sqlite3.Error as e:
         # Handle database errors
-        print(f"Database error in get_total_users_count: {e}")
+        logger.error("Database error in get_total_users_count: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500 # 500 Internal Server Error
     except Exception as e:
-        print(f"An unexpected error occurred in get_total_users_count: {e}")
+        logger.exception("An unexpected error occurred in get_total_users_count: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1455,10 +1316,10 @@ def get_pending_feedbacks_count():
         pending_feedbacks = cursor.fetchone()[0]
         return jsonify({'pending_feedbacks': pending_feedbacks}), 200
     except sqlite3.Error as e:
-        print(f"Database error in get_pending_feedbacks_count: {e}")
+        logger.error("Database error in get_pending_feedbacks_count: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_pending_feedbacks_count: {e}")
+        logger.exception("An unexpected error occurred in get_pending_feedbacks_count: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1480,10 +1341,10 @@ def get_reports_count():
         reports_generated = cursor.fetchone()[0]
         return jsonify({'reports_generated': reports_generated}), 200
     except sqlite3.Error as e:
-        print(f"Database error in get_reports_count: {e}")
+        logger.error("Database error in get_reports_count: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_reports_count: {e}")
+        logger.exception("An unexpected error occurred in get_reports_count: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1534,11 +1395,11 @@ def update_user_role(user_id):
         return jsonify({'message': f'User {user_id} role updated to {new_role}'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in update_user_role: {e}")
+        logger.error("Database error in update_user_role: %s", e)
         conn.rollback()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in update_user_role: {e}")
+        logger.exception("An unexpected error occurred in update_user_role: %s", e)
         conn.rollback()
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
@@ -1585,14 +1446,19 @@ def delete_user(user_id):
         # Start a transaction for atomicity
         conn.execute("BEGIN TRANSACTION;")
 
-        # Tables with user_id as foreign key, ordered for dependency
+        # Child rows that reference the user's plans/preferences but carry no user_id
+        cursor.execute("DELETE FROM MealPlan WHERE diet_plan_id IN (SELECT diet_plan_id FROM DietPlan WHERE user_id = ?)", (user_id,))
+        cursor.execute("DELETE FROM DietPreferenceIngredient WHERE diet_pref_id IN (SELECT diet_pref_id FROM UserDietPreference WHERE user_id = ?)", (user_id,))
+        cursor.execute("DELETE FROM WorkoutPlanExercise WHERE plan_id IN (SELECT plan_id FROM WorkoutPlan WHERE user_id = ?)", (user_id,))
+        cursor.execute("DELETE FROM ReminderWatermark WHERE plan_id IN (SELECT plan_id FROM WorkoutPlan WHERE user_id = ?)", (user_id,))
+
+        # Tables with user_id as foreign key, children before parents (foreign keys are enforced)
         tables_to_delete_from = [
-            "ChatbotInteraction", "DietPlan", "ExerciseStatus", "Feedback",
-            "FeedbackResponse", "Goal", "LoggedMeal", "Reminder",
-            "MealScans", "notifications", "ProgressLog", "Report", "SystemLog", 
-            "UserDietPlanProgress", "UserDietPreference", "WorkoutPlan", "VoiceLog", "Profile",
+            "ChatbotInteraction", "ExerciseStatus", "FeedbackResponse", "Feedback",
+            "Goal", "LoggedMeal", "UserDietPlanProgress", "Reminder",
+            "MealScans", "notifications", "ProgressLog", "Report", "SystemLog",
+            "DietPlan", "UserDietPreference", "WorkoutPlan", "VoiceLog", "Profile",
             # RecipeLibrary does not seem to have a direct user_id FK, assuming it's managed differently
-            # Reminder might be associated, if so add it here
         ]
 
         for table in tables_to_delete_from:
@@ -1602,11 +1468,11 @@ def delete_user(user_id):
                 columns = [col[1] for col in cursor.fetchall()]
                 if 'user_id' in columns:
                     cursor.execute(f"DELETE FROM {table} WHERE user_id = ?", (user_id,))
-                    print(f"Deleted {cursor.rowcount} records from {table} for user {user_id}")
+                    logger.debug("Deleted %s records from %s for user %s", cursor.rowcount, table, user_id)
                 else:
-                    print(f"Table {table} does not have a user_id column. Skipping.")
+                    logger.debug("Table %s does not have a user_id column. Skipping.", table)
             except sqlite3.OperationalError as e:
-                print(f"Warning: Could not delete from {table}. Table might not exist or column missing: {e}")
+                logger.warning("Could not delete from %s. Table might not exist or column missing: %s", table, e)
 
         # Finally, delete from the User table
         cursor.execute("DELETE FROM User WHERE user_id = ?", (user_id,))
@@ -1618,12 +1484,12 @@ def delete_user(user_id):
         return jsonify({'message': f'User {user_id} and all associated data deleted successfully.'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in delete_user: {e}")
+        logger.error("Database error in delete_user: %s", e)
         if conn:
             conn.rollback() # Rollback on error
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in delete_user: {e}")
+        logger.exception("An unexpected error occurred in delete_user: %s", e)
         if conn:
             conn.rollback() # Rollback on unexpected error
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
@@ -1654,10 +1520,10 @@ def get_system_logs():
             })
         return jsonify(log_list), 200
     except sqlite3.Error as e:
-        print(f"Database error in get_system_logs: {e}")
+        logger.error("Database error in get_system_logs: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_system_logs: {e}")
+        logger.exception("An unexpected error occurred in get_system_logs: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1705,10 +1571,10 @@ def get_all_feedback():
             })
         return jsonify(feedback_list), 200
     except sqlite3.Error as e:
-        print(f"Database error in get_all_feedback: {e}")
+        logger.error("Database error in get_all_feedback: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_all_feedback: {e}")
+        logger.exception("An unexpected error occurred in get_all_feedback: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -1733,7 +1599,7 @@ def submit_feedback():
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        feedback_id = generate_feedback_id()
+        feedback_id = generate_feedback_id(conn)
         submitted_at = datetime.now().strftime('%Y-%m-%d')
         status = "Pending"
 
@@ -1750,11 +1616,11 @@ def submit_feedback():
             'status': status
         }), 201 # 201 Created
     except sqlite3.Error as e:
-        print(f"Database error in submit_feedback: {e}")
+        logger.error("Database error in submit_feedback: %s", e)
         conn.rollback()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in submit_feedback: {e}")
+        logger.exception("An unexpected error occurred in submit_feedback: %s", e)
         conn.rollback()
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
@@ -1917,6 +1783,7 @@ def scan_meal():
             'calories': calories,
             'nutrients': nutrients,
             'image_path': file_path,
+            'image_url': upload_assets.url('/api/images', unique_filename),
             'alternatives': alternatives,
             'success': True
         }), 201
@@ -1957,6 +1824,7 @@ def get_meal_scans(user_id):
                 'calories': row[3],
                 'nutrients': json.loads(row[4]) if row[4] else {},
                 'image_path': row[5],
+                'image_url': upload_assets.url('/api/images', os.path.basename(row[5])) if row[5] else None,
                 'timestamp': row[6]
             })
         
@@ -2007,7 +1875,7 @@ def update_meal_scan(meal_scan_id):
 
         # 2. Handle food_name update and conditional nutrition re-fetch
         if new_food_name is not None and new_food_name != current_food_name:
-            print(f"Food name changed from '{current_food_name}' to '{new_food_name}'. Re-fetching nutrition...")
+            logger.info("Food name changed from '%s' to '%s'. Re-fetching nutrition...", current_food_name, new_food_name)
             fetched_nutrition = food_recognizer.get_nutrition_info(new_food_name)
 
             if not fetched_nutrition:
@@ -2061,10 +1929,10 @@ def update_meal_scan(meal_scan_id):
         }), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in update_meal_scan: {e}")
+        logger.error("Database error in update_meal_scan: %s", e)
         return jsonify({'success': False, 'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in update_meal_scan: {e}")
+        logger.exception("An unexpected error occurred in update_meal_scan: %s", e)
         return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
     finally:
         if conn:
@@ -2098,25 +1966,25 @@ def delete_meal_scan(meal_scan_id):
         if os.path.exists(image_filepath):
             try:
                 os.remove(image_filepath)
-                print(f"Deleted image file: {image_filepath}")
+                logger.info("Deleted image file: %s", image_filepath)
             except OSError as file_err:
-                print(f"Error deleting image file {image_filepath}: {file_err}")
+                logger.error("Error deleting image file %s: %s", image_filepath, file_err)
                 return jsonify({
                     'success': True,
                     'message': 'Meal scan database record deleted, but failed to delete image file.',
                     'file_error': str(file_err)
                 }), 200 
         else:
-            print(f"Image file not found for deletion: {image_filepath}")
+            logger.warning("Image file not found for deletion: %s", image_filepath)
 
 
         return jsonify({'success': True, 'message': 'Meal scan and associated image deleted successfully'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error during meal scan deletion: {e}")
+        logger.error("Database error during meal scan deletion: %s", e)
         return jsonify({'success': False, 'error': f'Database error: {str(e)}'}), 500
     except Exception as e:
-        print(f"An unexpected error occurred during meal scan deletion: {e}")
+        logger.exception("An unexpected error occurred during meal scan deletion: %s", e)
         return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
     finally:
         if conn:
@@ -2186,9 +2054,9 @@ def search_food():
 
 @app.route('/api/images/<filename>')
 def get_image(filename):
-    """Serve uploaded images"""
+    """Serve uploaded images (immutable when requested with the current ?v=<hash>)"""
     try:
-        return send_from_directory(UPLOAD_FOLDER, filename)
+        return upload_assets.send(filename, request.args.get('v'))
     except Exception as e:
         return jsonify({'error': 'Image not found'}), 404
 
@@ -2265,7 +2133,7 @@ Now, please respond to the user's question about fitness, nutrition, or wellness
         
         return jsonify({'reply': reply, 'success': True})
     except Exception as e:
-        print(f"Error in /api/chatbot: {e}")
+        logger.error("Error in /api/chatbot: %s", e)
         return jsonify({'reply': 'Sorry, something went wrong. Please try asking about your fitness or nutrition goals!', 'success': False}), 500
 
 @app.route('/api/analytics/user_engagement', methods=['GET'])
@@ -2401,10 +2269,10 @@ def get_user_engagement_analytics():
         }), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in get_user_engagement_analytics: {e}")
+        logger.error("Database error in get_user_engagement_analytics: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e), 'success': False}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_user_engagement_analytics: {e}")
+        logger.exception("An unexpected error occurred in get_user_engagement_analytics: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e), 'success': False}), 500
     finally:
         if conn:
@@ -2420,60 +2288,18 @@ def global_workout_analytics():
     cur.execute("SELECT COUNT(*) AS total_users FROM User WHERE role = 0")
     total_users = cur.fetchone()['total_users']
 
-    # Count total workout plans
-    cur.execute("SELECT COUNT(*) AS total_plans FROM WorkoutPlan")
-    total_plans = cur.fetchone()['total_plans']
-
-    # Count completed and overdue exercises
-    cur.execute("SELECT status, COUNT(*) AS count FROM ExerciseStatus GROUP BY status")
-    status_counts = {row['status']: row['count'] for row in cur.fetchall()}
-    completed = status_counts.get('completed', 0)
-    overdue = status_counts.get('overdue', 0)
-
-    # Average progress across all users
-    cur.execute("SELECT plan_id, user_id FROM WorkoutPlan")
-    plans = cur.fetchall()
-    total_progress = 0
-    counted = 0
-
-    for plan in plans:
-        plan_id = plan['plan_id']
-        user_id = plan['user_id']
-
-        cur.execute("SELECT COUNT(*) AS total FROM WorkoutPlanExercise WHERE plan_id = ?", (plan_id,))
-        total_ex = cur.fetchone()['total']
-
-        cur.execute("SELECT COUNT(*) AS done FROM ExerciseStatus WHERE user_id = ? AND plan_id = ? AND status = 'completed'", (user_id, plan_id))
-        done_ex = cur.fetchone()['done']
-
-        if total_ex > 0:
-            progress = (done_ex / total_ex) * 100
-            total_progress += progress
-            counted += 1
-
-    avg_progress = round(total_progress / counted, 1) if counted > 0 else 0
-
-    # Most chosen exercise
-    cur.execute("SELECT Exercise_ID FROM WorkoutPlanExercise")
-    all_ex_ids = [row['Exercise_ID'] for row in cur.fetchall()]
-    most_common = Counter(all_ex_ids).most_common(1)
-
-    most_chosen_exercise = None
-    if most_common:
-        top_ex_id, _ = most_common[0]
-        cur.execute("SELECT name FROM Exercise WHERE Exercise_ID = ?", (top_ex_id,))
-        name_row = cur.fetchone()
-        most_chosen_exercise = name_row['name'] if name_row else None
-
+    # Plans, exercise counts, average progress and the most chosen exercise
+    # come from the counters in workout_stats (kept current by triggers)
+    stats = read_workout_stats(conn)
     conn.close()
 
     return jsonify({
         'total_users': total_users,
-        'total_plans': total_plans,
-        'completed_exercises': completed,
-        'overdue_exercises': overdue,
-        'average_progress_percent': avg_progress,
-        'most_chosen_exercise': most_chosen_exercise
+        'total_plans': stats['total_plans'],
+        'completed_exercises': stats['completed_exercises'],
+        'overdue_exercises': stats['overdue_exercises'],
+        'average_progress_percent': stats['average_progress_percent'],
+        'most_chosen_exercise': stats['most_chosen_exercise']
     })
 
 @app.route('/logout', methods=['POST'])
@@ -2495,7 +2321,7 @@ def logout():
         c = conn.cursor()
 
         # Log successful logout
-        log_id = generate_log_id()
+        log_id = generate_log_id(conn)
         action = "Logged Out"
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
@@ -2506,12 +2332,12 @@ def logout():
         return jsonify({'message': 'Logout activity logged successfully', 'success': True}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error logging logout activity: {e}")
+        logger.error("Database error logging logout activity: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Database error during logout logging', 'success': False}), 500
     except Exception as e:
-        print(f"An unexpected error occurred during logout logging: {e}")
+        logger.exception("An unexpected error occurred during logout logging: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Internal server error during logout logging', 'success': False}), 500
@@ -2545,12 +2371,12 @@ def disable_system():
         return jsonify({'message': 'System disabled: All regular users temporarily set to role 3.'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in disable_system: {e}")
+        logger.error("Database error in disable_system: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in disable_system: {e}")
+        logger.exception("An unexpected error occurred in disable_system: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
@@ -2584,12 +2410,12 @@ def enable_system():
         return jsonify({'message': 'System enabled: All temporarily disabled users set back to role 1.'}), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in enable_system: {e}")
+        logger.error("Database error in enable_system: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in enable_system: {e}")
+        logger.exception("An unexpected error occurred in enable_system: %s", e)
         if conn:
             conn.rollback()
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
@@ -2608,7 +2434,7 @@ def get_notifications(user_id):
         ORDER BY date DESC
     """, (user_id,))
     rows = cursor.fetchall()
-    print(f"Fetched notifications for user {user_id}: {rows}")
+    logger.debug("Fetched notifications for user %s: %s", user_id, rows)
     conn.close()
 
     notifications = [{
@@ -2640,114 +2466,24 @@ def mark_notification_checked(notification_id):
 #check the daily reminders and overdue exercise
 @app.route('/reminders/check/<user_id>', methods=['POST'])
 def check_reminders_route(user_id):
-    check_reminders(user_id)
+    # Today's reminders and overdue statuses are written by the scheduler's
+    # nightly jobs; nothing is computed on the request
     return jsonify({'status': 'checked'})
 
-def check_reminders(user_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    today = datetime.now().strftime('%Y-%m-%d')
-
-    cursor.execute('SELECT plan_id, created_at, duration_months FROM WorkoutPlan WHERE user_id = ?', (user_id,))
-    plans = cursor.fetchall()
-
-    for plan in plans:
-        plan_id = plan['plan_id']
-        start_date = datetime.strptime(plan['created_at'].split()[0], '%Y-%m-%d')  # fixes timestamp issue
-
-        current_date = start_date
-        while current_date <= datetime.today():
-            formatted_date = current_date.strftime('%Y-%m-%d')
-
-            cursor.execute('''
-                SELECT Exercise_ID FROM WorkoutPlanExercise
-                WHERE plan_id = ? AND date = ?
-            ''', (plan_id, formatted_date))
-            exercises = cursor.fetchall()
-
-            for ex in exercises:
-                exercise_id = ex['Exercise_ID']
-
-                cursor.execute('''
-                    SELECT 1 FROM ExerciseStatus
-                    WHERE user_id = ? AND plan_id = ? AND Exercise_ID = ? AND date = ?
-                ''', (user_id, plan_id, exercise_id, formatted_date))
-                exists = cursor.fetchone()
-
-                if not exists and formatted_date < today:
-                    cursor.execute('''
-                        INSERT INTO ExerciseStatus (user_id, Exercise_ID, plan_id, date, status)
-                        VALUES (?, ?, ?, ?, 'overdue')
-                    ''', (user_id, exercise_id, plan_id, formatted_date))
-
-            current_date += timedelta(days=1)
-        insert_daily_reminder_if_due(user_id, plan_id)
-
-    conn.commit()
-    conn.close()
-
-#daily reminder helper for exercise
-def insert_daily_reminder_if_due(user_id, plan_id):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    today = datetime.now().strftime('%Y-%m-%d')
-
-    # Get all uncompleted exercises scheduled for today in this plan
-    cursor.execute('''
-        SELECT wpe.Exercise_ID
-        FROM WorkoutPlanExercise wpe
-        LEFT JOIN ExerciseStatus es ON
-            wpe.Exercise_ID = es.exercise_id AND
-            wpe.plan_id = es.plan_id AND
-            es.user_id = ? AND
-            es.date = ?
-        WHERE wpe.plan_id = ?
-          AND wpe.date = ?
-          AND es.status IS NULL
-    ''', (user_id, today, plan_id, today))
-
-    pending_exercises = cursor.fetchall()
-
-    for ex in pending_exercises:
-        exercise_id = ex['Exercise_ID']
-
-        # Check if reminder for this exercise already exists
-        cursor.execute("""
-            SELECT 1 FROM notifications
-            WHERE user_id = ? AND plan_id = ? AND date = ? AND exercise_id = ? AND type = 'daily reminder'
-        """, (user_id, plan_id, today, exercise_id))
-        exists = cursor.fetchone()
-
-        if not exists:
-            details = f"Don't forget your workout for plan {plan_id} today! 🏋️‍♀️"
-            cursor.execute("""
-                INSERT INTO notifications (user_id, plan_id, type, details, checked, exercise_id, date)
-                VALUES (?, ?, 'daily reminder', ?, 0, ?, ?)
-            """, (user_id, plan_id, details, exercise_id, today))
-
-    conn.commit()
-    conn.close()
-
 @app.route('/insert-all-reminders/<user_id>', methods=['POST'])
 def insert_all_due_reminders(user_id):
     today = datetime.now().strftime('%Y-%m-%d')
-    conn = get_db_connection()
-    cursor = conn.cursor()
 
-    # 🔁 Get all plans with exercises scheduled today for this user
-    cursor.execute('''
-        SELECT DISTINCT plan_id
-        FROM WorkoutPlanExercise
-        WHERE user_id = ? AND date = ?
-    ''', (user_id, today))
-
-    plans = cursor.fetchall()
+    # Reminders are created by the nightly job; report what today has
+    conn = get_db_connection()
+    row = conn.execute('''
+        SELECT COUNT(DISTINCT plan_id) AS plans
+        FROM notifications
+        WHERE user_id = ? AND date = ? AND type = 'daily reminder'
+    ''', (user_id, today)).fetchone()
     conn.close()
 
-    for plan in plans:
-        insert_daily_reminder_if_due(user_id, plan['plan_id'])
-
-    return jsonify({'message': f'Daily reminders inserted for {len(plans)} plans.'}), 200
+    return jsonify({'message': f"Daily reminders inserted for {row['plans']} plans."}), 200
 
 #admin send notifications
 @app.route('/admin/send-notification', methods=['POST'])
@@ -2892,7 +2628,7 @@ def update_profile(user_id):
                 cur.execute(profile_update_query, tuple(profile_update_values))
         else:
             # If profile does not exist, insert it (should not happen for existing users)
-            profile_id = generate_profile_id()
+            profile_id = generate_profile_id(conn)
             cur.execute("""
                 INSERT INTO Profile (profile_id, user_id, full_name, age, height, weight, bmi, location)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -2919,7 +2655,7 @@ def update_profile(user_id):
                 cur.execute(diet_pref_update_query, tuple(diet_pref_update_values))
         else:
             # If diet preference does not exist, insert it
-            diet_pref_id = generate_diet_pref_id()
+            diet_pref_id = generate_diet_pref_id(conn)
             cur.execute("""
                 INSERT INTO UserDietPreference (diet_pref_id, user_id, dietary_goal, allergies)
                 VALUES (?, ?, ?, ?)
@@ -2946,7 +2682,7 @@ def update_profile(user_id):
                 cur.execute(goal_update_query, tuple(goal_update_values))
         else:
             # If goal does not exist, insert it (assuming a default status/target if needed)
-            goal_id = generate_goal_id()
+            goal_id = generate_goal_id(conn)
             cur.execute("""
                 INSERT INTO Goal (goal_id, user_id, goal_type, current_value, status)
                 VALUES (?, ?, ?, ?, ?)
@@ -2958,11 +2694,11 @@ def update_profile(user_id):
 
     except sqlite3.Error as e:
         conn.rollback()
-        print(f"Database error during profile update: {e}")
+        logger.error("Database error during profile update: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
         conn.rollback()
-        print(f"An unexpected error occurred during profile update: {e}")
+        logger.exception("An unexpected error occurred during profile update: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         conn.close()
@@ -3015,10 +2751,10 @@ def get_user_profile(user_id):
         return jsonify(response_data), 200
 
     except sqlite3.Error as e:
-        print(f"Database error in get_user_profile: {e}")
+        logger.error("Database error in get_user_profile: %s", e)
         return jsonify({'error': 'Database error', 'message': str(e)}), 500
     except Exception as e:
-        print(f"An unexpected error occurred in get_user_profile: {e}")
+        logger.exception("An unexpected error occurred in get_user_profile: %s", e)
         return jsonify({'error': 'Server error', 'message': str(e)}), 500
     finally:
         if conn:
@@ -3026,12 +2762,8 @@ def get_user_profile(user_id):
 
 #report generation
 # Generate a new report_id like RP001, RP002, ...
-def generate_report_id():
-    conn = get_db_connection()
-    cur = conn.execute("SELECT COUNT(*) AS count FROM Report")
-    count = cur.fetchone()["count"]
-    conn.close()
-    return f"RP{(count + 1):03d}"
+def generate_report_id(conn):
+    return next_id(conn, 'report')
     
 def format_user_id(numeric_id):
     return f"U{int(numeric_id):03d}"   
@@ -3050,15 +2782,7 @@ def log_report_generation():
     conn = get_db_connection()
     cursor = conn.cursor()
 
-    # Get latest report ID
-    cursor.execute("SELECT report_id FROM Report ORDER BY report_id DESC LIMIT 1")
-    last = cursor.fetchone()
-    if last:
-        last_num = int(last['report_id'][2:])
-        new_num = last_num + 1
-    else:
-        new_num = 1
-    new_report_id = f"RP{new_num:03d}"
+    new_report_id = generate_report_id(conn)
 
     created_at = datetime.now().strftime('%Y-%m-%d')
 
@@ -3080,6 +2804,11 @@ if __name__ == '__main__':
     
     # Initialize database
     init_db()
+    logger.info("Hashed %s exercise images and %s uploads",
+                exercise_assets.build(), upload_assets.build())
+    exercise_catalog.load()
+    exercise_catalog.start_watcher()  # picks up image folders added outside the API
+    reminder_scheduler.start()  # nightly reminders/overdue jobs, catches up missed runs
     diet_system = DietPlanSystem(get_db_connection)
     diet_system.init_diet_plan_tables()
     setup_diet_plan_routes(app, diet_system)
@@ -3087,10 +2816,10 @@ if __name__ == '__main__':
     # Set max file size
     app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
     
-    print("\nStarting NextGenFitness API...")
-    print(f"Upload folder: {UPLOAD_FOLDER}")
-    print(f"Exercise images folder: {EXERCISE_FOLDER}")
-    print(f"Max file size: {MAX_FILE_SIZE / (1024*1024)}MB")
+    logger.info("Starting NextGenFitness API...")
+    logger.info("Upload folder: %s", UPLOAD_FOLDER)
+    logger.info("Exercise images folder: %s", EXERCISE_FOLDER)
+    logger.info("Max file size: %sMB", MAX_FILE_SIZE / (1024*1024))
 
 # Run the Flask app
 app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,89 @@
+# Logging setup for NextGenFitness
+#
+# Modules log through logging.getLogger(__name__) with %-style arguments, so
+# messages below the active level are never formatted. Records go through a
+# QueueHandler to a single QueueListener thread that does the actual stream
+# I/O, so a request thread never blocks on a shared stdout.
+#
+# Levels come from two environment variables:
+#   NEXTGEN_LOG_LEVEL   default level (INFO)
+#   NEXTGEN_LOG_LEVELS  per-module overrides, e.g.
+#                       "diet_plan_system=WARNING,NextGenFItness=DEBUG"
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from collections import Counter
+
+LOG_FORMAT = '%(asctime)s %(levelname)s [%(name)s] %(message)s'
+
+_listener = None
+_setup_lock = threading.Lock()
+
+
+def parse_levels(spec):
+    """'module=LEVEL,other=LEVEL' -> {'module': 'LEVEL', ...}; malformed entries are ignored"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, sep, level = item.partition('=')
+        if sep and name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def setup_logging(default_level=None, module_levels=None, stream=None):
+    """
+    Route the root logger through a queue to one background writer.
+    Safe to call more than once; only the first call installs handlers.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            return
+
+        default_level = default_level or os.environ.get('NEXTGEN_LOG_LEVEL', 'INFO')
+        if module_levels is None:
+            module_levels = parse_levels(os.environ.get('NEXTGEN_LOG_LEVELS'))
+
+        output = logging.StreamHandler(stream)
+        output.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        log_queue = queue.SimpleQueue()
+        root = logging.getLogger()
+        root.addHandler(logging.handlers.QueueHandler(log_queue))
+        root.setLevel(default_level.upper())
+        for name, level in module_levels.items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+class DiagnosticCounters:
+    """Thread-safe named counters, for events that used to be printed one line each"""
+
+    def __init__(self):
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def update(self, counts):
+        with self._lock:
+            self._counts.update(counts)
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
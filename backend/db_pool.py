@@ -0,0 +1,200 @@
+# SQLite connection pool for NextGenFitness
+
+import sqlite3
+import threading
+import time
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """Raised when no pooled connection became free within the checkout timeout"""
+
+
+class PooledConnection(sqlite3.Connection):
+    """
+    sqlite3 connection that is handed back to its pool on close().
+    Existing code keeps calling conn.close() as before; the physical
+    connection stays open and is reused by the next checkout.
+    """
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.checkin(self)
+
+    def close_physical(self):
+        """Really close the underlying SQLite handle"""
+        super().close()
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections with per-thread affinity.
+
+    A thread that checks out a connection while it already holds one gets
+    the same connection back (nested helpers such as ID generators and
+    progress updates therefore share the caller's transaction instead of
+    opening a second connection and fighting it for the write lock).
+    The connection only returns to the idle list when the outermost
+    checkout is closed.
+
+    Connection-level PRAGMAs are applied once, when the connection is created.
+    """
+
+    def __init__(self, db_path, max_connections=8, timeout=30.0,
+                 cache_size_kb=16384, mmap_size=64 * 1024 * 1024):
+        self.db_path = db_path
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+
+        self._local = threading.local()
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self._metrics = {
+            'checkouts': 0,
+            'reentrant_checkouts': 0,
+            'checkins': 0,
+            'connections_created': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'timeouts': 0,
+            'rollbacks_on_checkin': 0,
+            'forced_releases': 0,
+        }
+
+    def _connect(self):
+        """Open a new physical connection and apply the connection PRAGMAs"""
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout,
+                               check_same_thread=False, factory=PooledConnection)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA cache_size = -{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.pool = self
+        return conn
+
+    def checkout(self):
+        """Get a connection for the current thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            self._local.depth += 1
+            with self._cond:
+                self._metrics['reentrant_checkouts'] += 1
+            return conn
+
+        started = time.perf_counter()
+        deadline = started + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._created < self.max_connections:
+                    self._created += 1
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._metrics['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            self._metrics['checkouts'] += 1
+            if waited:
+                self._metrics['waits'] += 1
+                self._metrics['wait_time_ms'] += (time.perf_counter() - started) * 1000
+
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._metrics['connections_created'] += 1
+
+        self._local.conn = conn
+        self._local.depth = 1
+        return conn
+
+    def checkin(self, conn):
+        """Return a connection; only the outermost close() releases it"""
+        if getattr(self._local, 'conn', None) is not conn:
+            # Already released (double close) or never checked out by this thread
+            return
+
+        self._local.depth -= 1
+        if self._local.depth > 0:
+            return
+        self._release(conn)
+
+    def release_current(self):
+        """
+        Force the current thread's connection back into the pool.
+        Called at the end of every request so an early return that forgot
+        conn.close() cannot leak a pooled connection.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        with self._cond:
+            self._metrics['forced_releases'] += 1
+        self._release(conn)
+
+    def _release(self, conn):
+        self._local.conn = None
+        self._local.depth = 0
+
+        healthy = True
+        try:
+            # close() used to discard uncommitted work; keep that behaviour
+            if conn.in_transaction:
+                conn.rollback()
+                with self._cond:
+                    self._metrics['rollbacks_on_checkin'] += 1
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            healthy = False
+
+        with self._cond:
+            self._metrics['checkins'] += 1
+            if healthy:
+                self._idle.append(conn)
+            else:
+                self._created -= 1
+            self._cond.notify()
+
+        if not healthy:
+            try:
+                conn.close_physical()
+            except sqlite3.Error:
+                pass
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for conn in idle:
+            conn.close_physical()
+
+    def stats(self):
+        """Snapshot of the pool size and checkout/checkin metrics"""
+        with self._cond:
+            snapshot = dict(self._metrics)
+            snapshot['wait_time_ms'] = round(snapshot['wait_time_ms'], 2)
+            snapshot['max_connections'] = self.max_connections
+            snapshot['open_connections'] = self._created
+            snapshot['idle_connections'] = len(self._idle)
+            snapshot['in_use_connections'] = self._created - len(self._idle)
+        return snapshot
@@ -19,6 +19,9 @@ def init_diet_plan_tables(get_db_connection):
     c.execute('DROP TABLE IF EXISTS DietPlan')
     c.execute('DROP TABLE IF EXISTS DietPlan')
     c.execute('DROP TABLE IF EXISTS UserDietPreference')
+    # The tables are rebuilt below without their indexes; have the app's
+    # schema migrations run again on its next start
+    c.execute('PRAGMA user_version = 0')
 
     # # DietPlan table
     # c.execute('''CREATE TABLE DietPlan (
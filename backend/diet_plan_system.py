@@ -1,151 +1,76 @@
 # Diet Plan Management System for NextGenFitness
 
 import json
+import logging
 import sqlite3
-import random
-import math
-import uuid
 import re
-import random
 from datetime import datetime, date, timedelta
 from collections import defaultdict, Counter
-from flask import request, jsonify
+from flask import Response, request, jsonify
+from app_logging import DiagnosticCounters
+from dietary_rollups import read_dietary_rollups, read_preference_rollups
+from id_sequence import allocate_ids, next_id
+from meal_ledger import HISTORY_DAYS, MAX_HISTORY_DAYS, MealLedger, MealNotFound, iter_history_json
+from meal_planner import MealPlanner
+from migrations import migrate
+from recipe_index import DIET_RESTRICTIONS, RecipeIndex, classify_meal_type, fits_fitness_goal
+
+logger = logging.getLogger(__name__)
 
 class DietPlanSystem:
     """Main class for handling diet plan operations"""
     
     def __init__(self, db_connection_func):
-        """Initialize with database connection function"""
+        """
+        Initialize with database connection function.
+        The app passes its pooled get_db_connection, so conn.close() here
+        hands the connection back to the pool instead of closing it.
+        """
         self.get_db_connection = db_connection_func
+        # Compiled recipes/ingredients for plan generation, rebuilt after admin edits
+        self.recipe_index = RecipeIndex(db_connection_func)
+        # Why recipes were skipped during plan generation, by reason
+        self.recipe_rejections = DiagnosticCounters()
+        # Meal log/edit/delete, each one transaction with its progress update
+        self.meal_ledger = MealLedger(db_connection_func)
 
     
     
-    def generate_diet_plan_id(self):
+    def generate_diet_plan_id(self, conn):
         """Generate unique diet plan ID"""
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT diet_plan_id FROM DietPlan ORDER BY diet_plan_id DESC LIMIT 1")
-        last_id_row = c.fetchone()
-        conn.close()
-        if last_id_row:
-            last_id = last_id_row['diet_plan_id']
-            numeric_part = int(last_id[3:]) + 1
-            return f'DPL{numeric_part:03d}'
-        else:
-            return 'DPL001'
+        return next_id(conn, 'diet_plan')
     
-    def generate_meal_plan_id(self):
+    def generate_meal_plan_id(self, conn):
         """Generate unique meal plan ID"""
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT meal_plan_id FROM MealPlan ORDER BY meal_plan_id DESC LIMIT 1")
-        last_id_row = c.fetchone()
-        conn.close()
-        if last_id_row:
-            last_id = last_id_row['meal_plan_id']
-            numeric_part = int(last_id[2:]) + 1
-            return f'MP{numeric_part:03d}'
-        else:
-            return 'MP001'
+        return next_id(conn, 'meal_plan')
+
+    def generate_meal_plan_ids(self, conn, count):
+        """Reserve a block of meal plan IDs for a whole plan in one round trip"""
+        return allocate_ids(conn, 'meal_plan', count)
     
-    def generate_diet_pref_id(self):
+    def generate_diet_pref_id(self, conn):
         """Generate unique diet preference ID"""
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT diet_pref_id FROM UserDietPreference ORDER BY diet_pref_id DESC LIMIT 1")
-        last_id_row = c.fetchone()
-        conn.close()
-        if last_id_row:
-            last_id = last_id_row['diet_pref_id']
-            numeric_part = int(last_id[2:]) + 1
-            return f'DP{numeric_part:03d}'
-        else:
-            return 'DP001'
+        return next_id(conn, 'diet_pref')
         
-    def generate_progress_id(self):
+    def generate_progress_id(self, conn):
         """
         Generate a unique and sequential progress ID (e.g., PRG001, PRG002).
         """
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        try:
-            c.execute("SELECT progress_id FROM UserDietPlanProgress ORDER BY progress_id DESC LIMIT 1")
-            last_id_row = c.fetchone()
-            
-            if last_id_row:
-                last_id = last_id_row['progress_id']
-                # Extract numeric part, convert to int, increment
-                numeric_part = int(last_id[3:]) + 1
-            else:
-                # If no existing progress IDs, start from 1
-                numeric_part = 1
-            
-            # Format to PRG001, PRG002 etc.
-            return f'PRG{numeric_part:03d}'
-        except Exception as e:
-            print(f"Error generating progress ID: {e}")
-            return f"PRG{int(uuid.uuid4().hex[:8], 16):08d}" 
-        finally:
-            conn.close()
+        return next_id(conn, 'progress')
 
-    def generate_logged_meal_id(self):
+    def generate_logged_meal_id(self, conn):
         """
         Generate a unique and sequential logged meal ID (e.g., LM001, LM002).
         """
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        try:
-            c.execute("SELECT meal_id FROM LoggedMeal ORDER BY meal_id DESC LIMIT 1")
-            last_id_row = c.fetchone()
-            
-            if last_id_row:
-                last_id = last_id_row['meal_id']
-                # Extract numeric part, convert to int, increment
-                numeric_part = int(last_id[2:]) + 1
-            else:
-                # If no existing meal IDs, start from 1
-                numeric_part = 1
-            
-            # Format to LM001, LM002 etc.
-            return f'LM{numeric_part:03d}'
-        except Exception as e:
-            print(f"Error generating logged meal ID: {e}")
-            # Fallback or re-raise. Using UUID as fallback to prevent blocking
-            return f"LM{uuid.uuid4().hex[:8]}"
-        finally:
-            conn.close()
+        return next_id(conn, 'logged_meal')
 
-    def generate_ingredient_id(self):
+    def generate_ingredient_id(self, conn):
         """Generate a unique and sequential ingredient ID (e.g., ING001)."""
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        try:
-            c.execute("SELECT ingredient_id FROM Ingredient ORDER BY ingredient_id DESC LIMIT 1")
-            last_id_row = c.fetchone()
-            if last_id_row:
-                last_id = last_id_row['ingredient_id']
-                numeric_part = int(re.search(r'\d+', last_id).group()) + 1
-                return f'ING{numeric_part:03d}'
-            else:
-                return 'ING001'
-        finally:
-            conn.close()
+        return next_id(conn, 'ingredient')
     
-    def generate_recipe_id(self):
+    def generate_recipe_id(self, conn):
         """Generate a unique and sequential recipe ID (e.g., RCP001)."""
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        try:
-            c.execute("SELECT recipe_id FROM RecipeLibrary ORDER BY recipe_id DESC LIMIT 1")
-            last_id_row = c.fetchone()
-            if last_id_row:
-                last_id = last_id_row['recipe_id']
-                numeric_part = int(re.search(r'\d+', last_id).group()) + 1
-                return f'RCP{numeric_part:03d}'
-            else:
-                return 'RCP001'
-        finally:
-            conn.close()
+        return next_id(conn, 'recipe')
 
     def get_all_ingredients(self):
         conn = self.get_db_connection()
@@ -155,13 +80,14 @@ class DietPlanSystem:
     
     def create_ingredient(self, data):
         conn = self.get_db_connection()
-        new_id = self.generate_ingredient_id()
         try:
+            new_id = self.generate_ingredient_id(conn)
             conn.execute('''
                 INSERT INTO Ingredient (ingredient_id, name, category, nutritional_value, allergen_info)
                 VALUES (?, ?, ?, ?, ?)
             ''', (new_id, data['name'], data.get('category'), data.get('nutritional_value'), data.get('allergen_info')))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True, 'ingredient_id': new_id}
         except sqlite3.IntegrityError:
              return {'success': False, 'error': 'Ingredient with this name may already exist.'}
@@ -177,6 +103,7 @@ class DietPlanSystem:
                 WHERE ingredient_id = ?
             ''', (data['name'], data.get('category'), data.get('nutritional_value'), data.get('allergen_info'), ingredient_id))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True}
         finally:
             conn.close()
@@ -186,7 +113,11 @@ class DietPlanSystem:
         try:
             conn.execute('DELETE FROM Ingredient WHERE ingredient_id = ?', (ingredient_id,))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True}
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return {'success': False, 'error': 'Ingredient is referenced by user preferences and cannot be deleted.'}
         finally:
             conn.close()
 
@@ -198,8 +129,8 @@ class DietPlanSystem:
     
     def create_recipe(self, data):
         conn = self.get_db_connection()
-        new_id = self.generate_recipe_id()
         try:
+            new_id = self.generate_recipe_id(conn)
             conn.execute('''
                 INSERT INTO RecipeLibrary (recipe_id, title, description, ingredients, instructions, nutrition_info, image_url)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
@@ -208,6 +139,7 @@ class DietPlanSystem:
                 data.get('instructions'), data.get('nutrition_info'), data.get('image_url')
             ))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True, 'recipe_id': new_id}
         finally:
             conn.close()
@@ -224,6 +156,7 @@ class DietPlanSystem:
                 data.get('instructions'), data.get('nutrition_info'), data.get('image_url'), recipe_id
             ))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True}
         finally:
             conn.close()
@@ -233,7 +166,11 @@ class DietPlanSystem:
         try:
             conn.execute('DELETE FROM RecipeLibrary WHERE recipe_id = ?', (recipe_id,))
             conn.commit()
+            self.recipe_index.invalidate()
             return {'success': True}
+        except sqlite3.IntegrityError:
+            conn.rollback()
+            return {'success': False, 'error': 'Recipe is used in a meal plan and cannot be deleted.'}
         finally:
             conn.close()
         
@@ -241,225 +178,53 @@ class DietPlanSystem:
         """Logs a user's meal and syncs it with their daily progress"""
         try:
             user_id = data['user_id']
-            diet_plan_id = data.get('diet_plan_id')
-            meal_type = data['meal_type']
-            meal_name = data['meal_name']
-            calories = float(data['calories'])
-            notes = data.get('notes', '')
-            log_date = date.today().isoformat()  # Use today's date for logging
-
             if user_id.isdigit():
                 user_id = f"U{int(user_id):03d}"
 
-            conn = self.get_db_connection()
-            c = conn.cursor()
-
-            # Determine diet_plan_id ---
-            diet_plan_id = data.get('diet_plan_id') # Try to get from the request 
-            if not diet_plan_id:
-                # If not provided by frontend, fetch the user's latest (active) diet plan
-                c.execute("SELECT diet_plan_id FROM DietPlan WHERE user_id = ? ORDER BY created_at DESC LIMIT 1", (user_id,))
-                latest_diet_plan = c.fetchone()
-                if latest_diet_plan:
-                    diet_plan_id = latest_diet_plan['diet_plan_id']
-                else:
-                    # If no diet plan is found, return an error as it's a NOT NULL constraint
-                    return {'success': False, 'error': 'No active diet plan found for this user. Please create a diet plan first.'}
-
-            # Ensure there's a progress row for today for the given user and diet_plan
-            c.execute("""
-                SELECT progress_id, calories_consumed, meals_completed FROM UserDietPlanProgress
-                WHERE user_id = ? AND diet_plan_id = ? AND date = ?
-            """, (user_id, diet_plan_id, log_date))
-
-            progress = c.fetchone()
-
-            if progress:
-                progress_id = progress['progress_id']
-                new_calories = progress['calories_consumed'] + calories
-                new_meals = progress['meals_completed'] + 1
-
-                c.execute("""
-                    UPDATE UserDietPlanProgress
-                    SET calories_consumed = ?, meals_completed = ?
-                    WHERE progress_id = ?
-                """, (new_calories, new_meals, progress_id))
-            else:
-                progress_id = self.generate_progress_id()
-                c.execute("""
-                    INSERT INTO UserDietPlanProgress (progress_id, user_id, diet_plan_id, date, calories_consumed, meals_completed)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (progress_id, user_id, diet_plan_id, log_date, calories, 1))
-
-            # Log the meal
-            meal_id = self.generate_logged_meal_id()
-            c.execute("""
-                INSERT INTO LoggedMeal (meal_id, user_id, diet_plan_id, progress_id, meal_type, meal_name, calories, notes)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (meal_id, user_id, diet_plan_id, progress_id, meal_type, meal_name, calories, notes))
-
-            conn.commit()
-            conn.close()
-
+            meal_id, progress_id = self.meal_ledger.log(
+                user_id, data['meal_type'], data['meal_name'], float(data['calories']),
+                notes=data.get('notes', ''), diet_plan_id=data.get('diet_plan_id')
+            )
             return {
                 'success': True,
                 'message': 'Meal logged and progress updated successfully',
                 'meal_id': meal_id,
                 'progress_id': progress_id
             }
-
-        except Exception as e:
-            conn.rollback()
-            print(f"Error logging meal: {e}")
+        except ValueError as e:
             return {'success': False, 'error': str(e)}
-        
-    def _update_daily_progress(self, user_id, log_date):
-        """
-        Recalculates total calories for a given user and date,
-        and updates UserDietPlanProgress.
-        log_date should be in 'YYYY-MM-DD' format.
-        """
-        conn = self.get_db_connection()
-        c = conn.cursor()
-
-        try:
-            # Calculate total calories from all meals logged for this user on this date
-            c.execute("""
-                SELECT SUM(calories) AS total_calories, COUNT(meal_id) AS total_meals
-                FROM LoggedMeal
-                WHERE user_id = ? AND date(created_at) = ?
-            """, (user_id, log_date))
-            
-            result = c.fetchone()
-            new_total_calories = result['total_calories'] if result and result['total_calories'] is not None else 0
-            new_total_meals = result['total_meals'] if result and result['total_meals'] is not None else 0
-
-            # Get or create progress entry for the date
-            c.execute("SELECT progress_id FROM UserDietPlanProgress WHERE user_id = ? AND date = ?",
-                      (user_id, log_date))
-            progress_entry = c.fetchone()
-
-            if progress_entry:
-                # Update existing progress entry
-                c.execute("""
-                    UPDATE UserDietPlanProgress
-                    SET calories_consumed = ?, meals_completed = ?
-                    WHERE progress_id = ?
-                """, (new_total_calories, new_total_meals, progress_entry['progress_id']))
-                print(f"Updated progress for {user_id} on {log_date} to {new_total_calories} calories.")
-            else:
-                # Handle if a meal is added to a day without a progress record.
-                # Find an existing diet plan for the user or default
-                c.execute("SELECT diet_plan_id FROM DietPlan WHERE user_id = ? ORDER BY created_at DESC LIMIT 1", (user_id,))
-                diet_plan_id_row = c.fetchone()
-                
-                if not diet_plan_id_row:
-                    raise Exception("No active diet plan found for user. Cannot update progress.")
-                
-                diet_plan_id = diet_plan_id_row['diet_plan_id']
-                progress_id = self.generate_progress_id()
-
-                c.execute("""
-                    INSERT INTO UserDietPlanProgress (progress_id, user_id, diet_plan_id, date, calories_consumed, meals_completed)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (progress_id, user_id, diet_plan_id, log_date, new_total_calories, new_total_meals))
-                print(f"Created new progress entry for {user_id} on {log_date} with {new_total_calories} calories and {new_total_meals} meals.")
-
-            conn.commit()
-            return True
         except Exception as e:
-            conn.rollback()
-            print(f"Error updating daily progress for {user_id} on {log_date}: {e}")
-            raise # Re-raise the exception to be caught by the route handler
-        finally:
-            conn.close()
+            logger.error("Error logging meal: %s", e)
+            return {'success': False, 'error': str(e)}
 
     def delete_logged_meal(self, meal_id):
         """
         Deletes a logged meal entry and updates daily progress.
         """
-        conn = self.get_db_connection()
-        c = conn.cursor()
         try:
-            # Get meal details before deleting to update progress
-            c.execute("SELECT user_id, date(created_at) AS log_date FROM LoggedMeal WHERE meal_id = ?", (meal_id,))
-            meal_info = c.fetchone()
-
-            if not meal_info:
-                return {'success': False, 'error': 'Meal not found.'}
-
-            user_id = meal_info['user_id']
-            log_date = meal_info['log_date']
-
-            c.execute("DELETE FROM LoggedMeal WHERE meal_id = ?", (meal_id,))
-            conn.commit()
-
-            # Update the user's daily progress for that date
-            self._update_daily_progress(user_id, log_date)
-
+            self.meal_ledger.delete(meal_id)
             return {'success': True, 'message': 'Meal deleted successfully.'}
+        except MealNotFound:
+            return {'success': False, 'error': 'Meal not found.'}
         except Exception as e:
-            conn.rollback()
-            print(f"Error deleting meal {meal_id}: {e}")
+            logger.error("Error deleting meal %s: %s", meal_id, e)
             return {'success': False, 'error': f'Failed to delete meal: {str(e)}'}
-        finally:
-            conn.close()
 
     def update_logged_meal(self, meal_id, updated_data):
         """
-        Updates an existing logged meal entry and recalculates daily progress.
+        Updates an existing logged meal entry and adjusts daily progress.
         updated_data can contain meal_type, meal_name, calories, notes.
         """
-        conn = self.get_db_connection()
-        c = conn.cursor()
         try:
-            # Get original meal info to determine if date changed
-            # Get user_id and old_calories for progress update context
-            c.execute("SELECT user_id, calories, date(created_at) AS log_date FROM LoggedMeal WHERE meal_id = ?", (meal_id,))
-            original_meal_info = c.fetchone()
-
-            if not original_meal_info:
-                return {'success': False, 'error': 'Meal not found.'}
-
-            user_id = original_meal_info['user_id']
-            original_log_date = original_meal_info['log_date']
-
-            # Build update query dynamically
-            set_clauses = []
-            values = []
-            
-            if 'meal_type' in updated_data:
-                set_clauses.append("meal_type = ?")
-                values.append(updated_data['meal_type'])
-            if 'meal_name' in updated_data:
-                set_clauses.append("meal_name = ?")
-                values.append(updated_data['meal_name'])
-            if 'calories' in updated_data:
-                set_clauses.append("calories = ?")
-                values.append(updated_data['calories'])
-            if 'notes' in updated_data:
-                set_clauses.append("notes = ?")
-                values.append(updated_data['notes'])
-            
-            if not set_clauses:
-                return {'success': False, 'error': 'No fields to update provided.'}
-
-            query = f"UPDATE LoggedMeal SET {', '.join(set_clauses)} WHERE meal_id = ?"
-            values.append(meal_id)
-
-            c.execute(query, tuple(values))
-            conn.commit()
-
-            # Recalculate and update the user's daily progress for the original date
-            self._update_daily_progress(user_id, original_log_date)
-
+            self.meal_ledger.edit(meal_id, updated_data)
             return {'success': True, 'message': 'Meal updated successfully.'}
+        except MealNotFound:
+            return {'success': False, 'error': 'Meal not found.'}
+        except ValueError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
-            conn.rollback()
-            print(f"Error updating meal {meal_id}: {e}")
+            logger.error("Error updating meal %s: %s", meal_id, e)
             return {'success': False, 'error': f'Failed to update meal: {str(e)}'}
-        finally:
-            conn.close()
 
     def get_user_progress_for_date(self, user_id, target_date):
         """
@@ -550,13 +315,11 @@ class DietPlanSystem:
                 end_date_obj = datetime.strptime(active_plan['end_date'], '%Y-%m-%d').date()
                 today = date.today()
                 
-                # Check if the plan has expired
+                # An expired plan is reported as no active plan; the nightly
+                # plan_lifecycle job marks it Completed (this read never writes)
                 if today >= end_date_obj:
-                    # If the plan has expired, set active_plan to None in the summary
                     summary['active_plan'] = None
-                    c.execute("UPDATE DietPlan SET status = 'Completed' WHERE diet_plan_id = ?", (active_plan['diet_plan_id'],))
-                    conn.commit()
-                    return {'success': True, 'summary': summary} # Return immediately if plan expired
+                    return {'success': True, 'summary': summary}
                 
                 # Ensure today is not before start_date, if it is, set day 0 or 1
                 if today < start_date_obj:
@@ -599,7 +362,7 @@ class DietPlanSystem:
                 SELECT meal_id, meal_type, meal_name, calories, notes, created_at
                 FROM LoggedMeal
                 WHERE user_id = ?
-                ORDER BY created_at DESC LIMIT 1
+                ORDER BY log_date DESC, created_at DESC LIMIT 1
             """, (user_id,))
             last_meal = c.fetchone()
             if last_meal:
@@ -608,10 +371,10 @@ class DietPlanSystem:
             return {'success': True, 'summary': summary}
 
         except sqlite3.Error as e:
-            print(f"Database error fetching diet summary: {e}")
+            logger.error("Database error fetching diet summary: %s", e)
             return {'success': False, 'error': f'Database error: {str(e)}'}
         except Exception as e:
-            print(f"An unexpected error occurred fetching diet summary: {e}")
+            logger.exception("An unexpected error occurred fetching diet summary: %s", e)
             return {'success': False, 'error': f'An unexpected error occurred: {str(e)}'}
         finally:
             conn.close()
@@ -678,21 +441,9 @@ class DietPlanSystem:
 
 
             # 3. Average Daily Calories Per User & Calorie Adherence Over Time
-            cursor.execute("""
-                SELECT
-                    dpp.user_id,
-                    p.full_name,
-                    SUM(dpp.calories_consumed) AS total_calories,
-                    COUNT(DISTINCT dpp.date) AS total_days_logged
-                FROM UserDietPlanProgress dpp
-                JOIN User u ON dpp.user_id = u.user_id
-                LEFT JOIN Profile p ON u.user_id = p.user_id
-                WHERE dpp.date BETWEEN ? AND ?
-                GROUP BY dpp.user_id
-            """, (start_date_str, end_date_str))
-
-            user_calorie_data = cursor.fetchall()
-            for row in user_calorie_data:
+            # (calorie, meal and scan figures come from the daily rollups)
+            rollups = read_dietary_rollups(conn, start_date_str, end_date_str)
+            for row in rollups["per_user"]:
                 user_id = row["user_id"]
                 full_name = row["full_name"] if row["full_name"] else user_id # Use full_name if available
                 total_calories = row["total_calories"]
@@ -702,28 +453,11 @@ class DietPlanSystem:
                     analytics_data["average_daily_calories_per_user"][full_name] = round(avg_daily_calories, 2)
 
             # Calorie adherence over time (aggregate daily averages)
-            cursor.execute("""
-                SELECT
-                    date,
-                    AVG(calories_consumed) AS average_calories,
-                    AVG(meals_completed) AS average_meals_completed
-                FROM UserDietPlanProgress
-                WHERE date BETWEEN ? AND ?
-                GROUP BY date
-                ORDER BY date
-            """, (start_date_str, end_date_str))
-            analytics_data["calorie_adherence_over_time"] = [dict(row) for row in cursor.fetchall()]
+            analytics_data["calorie_adherence_over_time"] = [dict(row) for row in rollups["adherence"]]
 
 
             # 4. Meal Type Distribution & Top Logged Meals
-            cursor.execute("""
-                SELECT meal_type, COUNT(*) AS count
-                FROM LoggedMeal
-                WHERE created_at BETWEEN ? AND ?
-                GROUP BY meal_type
-                ORDER BY count DESC
-            """, (start_date_str + ' 00:00:00', end_date_str + ' 23:59:59'))
-            meal_type_counts = cursor.fetchall()
+            meal_type_counts = rollups["meal_types"]
             total_logged_meals_count = sum(row["count"] for row in meal_type_counts)
             for row in meal_type_counts:
                 analytics_data["meal_type_distribution"][row["meal_type"]] = {
@@ -731,25 +465,12 @@ class DietPlanSystem:
                     "percentage": round((row["count"] / total_logged_meals_count) * 100, 2) if total_logged_meals_count > 0 else 0
                 }
 
-            cursor.execute("""
-                SELECT meal_name, COUNT(*) AS count
-                FROM LoggedMeal
-                WHERE created_at BETWEEN ? AND ?
-                GROUP BY meal_name
-                ORDER BY count DESC
-                LIMIT 10
-            """, (start_date_str + ' 00:00:00', end_date_str + ' 23:59:59'))
-            analytics_data["top_logged_meals"] = [dict(row) for row in cursor.fetchall()]
+            analytics_data["top_logged_meals"] = [dict(row) for row in rollups["top_meals"]]
 
 
-            # 5. Dietary Goal Distribution
-            cursor.execute("""
-                SELECT dietary_goal, COUNT(*) AS count
-                FROM UserDietPreference
-                GROUP BY dietary_goal
-                ORDER BY count DESC
-            """)
-            goal_counts = cursor.fetchall()
+            # 5. Dietary Goal Distribution (goal and allergy counts are rolled up too)
+            preferences = read_preference_rollups(conn)
+            goal_counts = preferences["goals"]
             total_goals = sum(row["count"] for row in goal_counts)
             for row in goal_counts:
                 analytics_data["dietary_goal_distribution"][row["dietary_goal"]] = {
@@ -758,29 +479,11 @@ class DietPlanSystem:
                 }
 
             # 6. Allergy Distribution
-            cursor.execute("""
-                SELECT allergies FROM UserDietPreference WHERE allergies IS NOT NULL AND allergies != ''
-            """)
-            all_allergies = []
-            for row in cursor.fetchall():
-                # Allergies are stored as comma-separated string
-                allergies_list = [a.strip() for a in row["allergies"].split(',') if a.strip()]
-                all_allergies.extend(allergies_list)
-
-            allergy_counts = Counter(all_allergies)
-            analytics_data["allergy_distribution"] = dict(allergy_counts)
+            analytics_data["allergy_distribution"] = {row["allergy"]: row["count"] for row in preferences["allergies"]}
 
 
             # 7. Top Scanned Foods
-            cursor.execute("""
-                SELECT food_name, COUNT(*) AS count
-                FROM MealScans
-                WHERE timestamp BETWEEN ? AND ?
-                GROUP BY food_name
-                ORDER BY count DESC
-                LIMIT 10
-            """, (start_date_str + ' 00:00:00', end_date_str + ' 23:59:59'))
-            analytics_data["top_scanned_foods"] = [dict(row) for row in cursor.fetchall()]
+            analytics_data["top_scanned_foods"] = [dict(row) for row in rollups["top_scans"]]
 
             # 8. Average BMI by Dietary Goal
             cursor.execute("""
@@ -800,7 +503,7 @@ class DietPlanSystem:
                     "user_count": row["user_count"]
                 }
         except Exception as e:
-            print(f"Error fetching dietary habit analytics: {e}")
+            logger.error("Error fetching dietary habit analytics: %s", e)
             # Return an error state or partial data
             return {'error': str(e)}
         finally:
@@ -808,31 +511,13 @@ class DietPlanSystem:
         return analytics_data
     
     def load_allergen_map(self):
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT name, allergen_info FROM Ingredient")
-        rows = c.fetchall()
-        conn.close()
-        
-        allergen_map = {}
-        for name, allergen_info in rows:
-            if allergen_info and allergen_info.strip().lower() != "none":
-                allergen_map[name.strip()] = allergen_info.strip()
-        return allergen_map
+        """Ingredient name -> allergen, from the recipe index"""
+        return self.recipe_index.allergen_map()
     
     def is_diet_compatible(self, ingredients, dietary_preference, fitness_goal=None, recipe_nutrition=None):
         """Check if recipe is compatible with dietary and fitness goals"""
-        restricted_ingredients = {
-            'vegetarian': {"chicken breast", "beef", "turkey breast", "salmon", "cod", "shrimp"},
-            'vegan': {"chicken breast", "beef", "turkey breast", "salmon", "cod", "shrimp",
-                    "milk", "cheese", "egg", "greek yogurt", "mayonnaise", "butter", "yogurt"},
-            'pescatarian': {"chicken breast", "beef", "turkey breast"},
-            'halal': {"pork", "bacon", "ham", "lard", "gelatin (non-halal)"},
-            'kosher': {"pork", "shellfish", "shrimp", "bacon", "ham", "lobster"}
-        }
-
         # Normalize ingredients
-        restricted = restricted_ingredients.get(dietary_preference.lower(), set())
+        restricted = DIET_RESTRICTIONS.get(dietary_preference.lower(), set())
         for ingredient in ingredients:
             normalized = ingredient.strip().lower()
             if normalized in restricted:
@@ -840,15 +525,8 @@ class DietPlanSystem:
 
         # Fitness goal filtering based on macros
         if recipe_nutrition and fitness_goal:
-            cal = recipe_nutrition.get('calories', 0)
-            protein = recipe_nutrition.get('protein', 0)
-
-            if fitness_goal == "weight loss" and cal > 600:
-                return False  # skip high-calorie meals
-            elif fitness_goal == "muscle gain" and protein < 20:
-                return False  # skip low-protein meals
-            elif fitness_goal == "maintenance" and cal > 800:
-                return False
+            return fits_fitness_goal(fitness_goal, recipe_nutrition.get('calories', 0),
+                                     recipe_nutrition.get('protein', 0))
 
         return True
 
@@ -888,7 +566,7 @@ class DietPlanSystem:
             return daily_calories
 
         except Exception as e:
-            print(f"[calculate_daily_calories ERROR] {e}")
+            logger.error("calculate_daily_calories failed: %s", e)
             return 2000
 
     
@@ -920,269 +598,66 @@ class DietPlanSystem:
             return 0
     
     def get_suitable_recipes(self, meal_type, calories_per_meal, preferences):
-        conn = self.get_db_connection()
-        c = conn.cursor()
-        c.execute("SELECT * FROM RecipeLibrary")
-        rows = c.fetchall()
-        conn.close()
-
-        suitable_recipes = []
-        allergies = preferences.get('allergies', [])
-        dietary_preference = preferences.get('dietary_preference', 'none').lower()
-        fitness_goal = preferences.get('dietary_goal', 'maintenance').lower()
-        ingredient_preferences = preferences.get('ingredient_preferences', {})
-
-        allergen_map = self.load_allergen_map()
-
-        for row in rows:
-            title = row[1]
-            ingredients = [i.strip() for i in row[3].split(',')]
-            nutrition = json.loads(row[5])
-            recipe_calories = nutrition.get("calories", 0)
-
-            # Check calories range
-            calories_ok = abs(recipe_calories - calories_per_meal) <= 400
-
-            # Check allergens using allergen_map
-            allergen_ok = True
-            for ingredient in ingredients:
-                allergen = allergen_map.get(ingredient)
-                if allergen and allergen in allergies:
-                    allergen_ok = False
-                    break
-
-            # Check diet compatibility
-            diet_ok = self.is_diet_compatible(ingredients, dietary_preference, fitness_goal, nutrition)
-
-
-            # Check ingredient dislikes
-            ingredient_ok = True
-            for ingredient in ingredients:
-                pref = ingredient_preferences.get(ingredient.lower())
-                if pref and pref.lower() == 'dislike':
-                    ingredient_ok = False
-                    break
-
-            # If all checks pass, add to suitable recipes
-            if calories_ok and allergen_ok and diet_ok and ingredient_ok:
-                recipe_dict = dict(row)
-                recipe_dict['calories'] = recipe_calories
-                suitable_recipes.append(recipe_dict)
-            else:
-                print(f"Skipping {title}:")
-                if not calories_ok:
-                    print(f"  ❌ Calories off target: {recipe_calories} vs {calories_per_meal}")
-                if not allergen_ok:
-                    print(f"  ❌ Contains allergens: {[allergen_map.get(i) for i in ingredients if allergen_map.get(i) in allergies]}")
-                if not diet_ok:
-                    print(f"  ❌ Does not meet dietary preference: {dietary_preference}")
-                if not ingredient_ok:
-                    print(f"  ❌ Contains disliked ingredients: {[i for i in ingredients if ingredient_preferences.get(i.lower()) == 'dislike']}")
+        """
+        Recipes that fit the user's calories per meal, allergies, diet and dislikes.
+        meal_type=None returns every eligible recipe (each once); otherwise only
+        recipes classified as that meal type.
+        """
+        rejections = Counter()
+        suitable_recipes = self.recipe_index.eligible(calories_per_meal, preferences, rejections)
+        if meal_type:
+            suitable_recipes = [r for r in suitable_recipes if r['meal_type'] == meal_type.lower()]
 
+        self.recipe_rejections.update(rejections)
+        logger.debug("Skipped recipes: %s", rejections)
         return suitable_recipes
 
 
-    def create_balanced_meal_plan(self, suitable_recipes, daily_calories, duration_days=7):
-        """Create a balanced meal plan for specified duration"""
-        meals_per_day = 3  # Breakfast, Lunch, Dinner
-        calories_per_meal = daily_calories // meals_per_day
-        
-        meal_plan = []
-        
+    def macro_targets(self, daily_calories):
+        """Daily calorie and macro gram targets stored with a diet plan"""
+        return {
+            'calories': daily_calories,
+            'protein': int(daily_calories * 0.25 / 4),  # 25% of calories from protein
+            'carbs': int(daily_calories * 0.45 / 4),    # 45% of calories from carbs
+            'fat': int(daily_calories * 0.30 / 9),      # 30% of calories from fat
+        }
+
+    def create_balanced_meal_plan(self, suitable_recipes, daily_calories, duration_days=7, seed=None):
+        """
+        Create a balanced meal plan for specified duration.
+        Pass a seed to get the same plan for the same inputs.
+        """
         # Categorize recipes by meal type
         breakfast_recipes = []
         lunch_recipes = []
         dinner_recipes = []
         
+        buckets = {'breakfast': breakfast_recipes, 'lunch': lunch_recipes, 'dinner': dinner_recipes}
         for recipe in suitable_recipes:
-            title_lower = recipe['title'].lower()
-            ingredients_lower = recipe['ingredients'].lower() if 'ingredients' in recipe else ''
-            
-            # Enhanced meal categorization using title and ingredients
-            if any(word in title_lower for word in [
-                'breakfast', 'omelette', 'pancake', 'cereal', 'yogurt', 'parfait',
-                'toast', 'scramble', 'oatmeal', 'oats', 'banana', 'muffin', 'smoothie',
-                'burrito', 'walnut', 'honey', 'wrap', 'egg salad']):
-                breakfast_recipes.append(recipe)
-
-            elif any(word in title_lower for word in [
-                'salad', 'soup', 'sandwich', 'wrap', 'bowl', 'quinoa', 'stir fry', 'lentil']):
-                lunch_recipes.append(recipe)
-
-            elif any(word in title_lower for word in [
-                'stew', 'pasta', 'rice', 'curry', 'grilled', 'roasted', 'dinner',
-                'alfredo', 'risotto', 'stuffed', 'baked', 'parmesan']):
-                dinner_recipes.append(recipe)
-
-            else:
-                # Use calorie-based fallback
-                calories = recipe.get('calories', 0)
-                if calories < 300:
-                    breakfast_recipes.append(recipe)
-                elif calories < 500:
-                    lunch_recipes.append(recipe)
-                else:
-                    dinner_recipes.append(recipe)
+            # Classified once by the recipe index (title keywords, then calories)
+            meal_type = recipe.get('meal_type') or classify_meal_type(recipe['title'], recipe.get('calories', 0))
+            buckets[meal_type].append(recipe)
         
         # Ensure we have recipes for each meal type
         if not breakfast_recipes:
-            breakfast_recipes = [r for r in suitable_recipes if r['calories'] < 400]
+            breakfast_recipes = [r for r in suitable_recipes if r.get('calories', 0) < 400]
         if not lunch_recipes:
-            lunch_recipes = [r for r in suitable_recipes if 300 <= r['calories'] <= 600]
+            lunch_recipes = [r for r in suitable_recipes if 300 <= r.get('calories', 0) <= 600]
         if not dinner_recipes:
-            dinner_recipes = [r for r in suitable_recipes if r['calories'] >= 400]
-        
-        # Generate meal plan
-        for day in range(1, duration_days + 1):
-            day_meals = []
-            
-            # Select breakfast
-            if breakfast_recipes:
-                breakfast = random.choice(breakfast_recipes)
-                day_meals.append({
-                    'meal_type': 'Breakfast',
-                    'recipe': breakfast,
-                    'day': day
-                })
-            
-            # Select lunch
-            if lunch_recipes:
-                lunch = random.choice(lunch_recipes)
-                day_meals.append({
-                    'meal_type': 'Lunch',
-                    'recipe': lunch,
-                    'day': day
-                })
-            
-            # Select dinner
-            if dinner_recipes:
-                dinner = random.choice(dinner_recipes)
-                day_meals.append({
-                    'meal_type': 'Dinner',
-                    'recipe': dinner,
-                    'day': day
-                })
-            
-            meal_plan.extend(day_meals)
+            dinner_recipes = [r for r in suitable_recipes if r.get('calories', 0) >= 400]
         
-        return meal_plan
+        # Pick the recipes that bring each day closest to the calorie and macro targets
+        planner = MealPlanner(self.macro_targets(daily_calories), seed=seed)
+        return planner.plan([
+            ('Breakfast', breakfast_recipes),
+            ('Lunch', lunch_recipes),
+            ('Dinner', dinner_recipes),
+        ], duration_days)
     
     def init_diet_plan_tables(self):
-        """Initialize diet plan related tables"""
+        """Initialize diet plan related tables (they are part of the schema migrations)"""
         conn = self.get_db_connection()
-        c = conn.cursor()
-        
-        # Update DietPlan table
-        c.execute('''CREATE TABLE IF NOT EXISTS DietPlan
-                    (diet_plan_id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    plan_name TEXT,
-                    description TEXT,
-                    start_date DATE,
-                    end_date DATE,
-                    daily_calories INTEGER,
-                    protein_grams INTEGER,
-                    carbs_grams INTEGER,
-                    fat_grams INTEGER,
-                    fiber_grams INTEGER,
-                    duration_days INTEGER DEFAULT 7,
-                    status TEXT DEFAULT 'Active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
-        
-        # Create MealPlan table
-        c.execute('''CREATE TABLE IF NOT EXISTS MealPlan
-                    (meal_plan_id TEXT PRIMARY KEY,
-                    diet_plan_id TEXT NOT NULL,
-                    day_number INTEGER NOT NULL,
-                    meal_type TEXT NOT NULL,
-                    recipe_id TEXT NOT NULL,
-                    serving_size REAL DEFAULT 1.0,
-                    calories INTEGER,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id),
-                    FOREIGN KEY (recipe_id) REFERENCES RecipeLibrary(recipe_id))''')
-        
-        
-        # Create UserDietPlanProgress table
-        c.execute('''CREATE TABLE IF NOT EXISTS UserDietPlanProgress
-                    (progress_id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    diet_plan_id TEXT NOT NULL,
-                    date DATE NOT NULL,
-                    calories_consumed INTEGER DEFAULT 0,
-                    meals_completed INTEGER DEFAULT 0,
-                    weight REAL,
-                    notes TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES User(user_id),
-                    FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id))''')
-
-        # Create LoggedMeal table
-        c.execute('''CREATE TABLE IF NOT EXISTS LoggedMeal (
-                        meal_id TEXT PRIMARY KEY,
-                        user_id TEXT NOT NULL,
-                        diet_plan_id TEXT,
-                        progress_id TEXT,
-                        meal_type TEXT NOT NULL,
-                        meal_name TEXT NOT NULL,
-                        calories REAL NOT NULL,
-                        notes TEXT,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES User(user_id),
-                        FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id),
-                        FOREIGN KEY (progress_id) REFERENCES UserDietPlanProgress(progress_id)
-                    );''')
-        
-        # Create UserDietPreference table
-        c.execute('''CREATE TABLE IF NOT EXISTS UserDietPreference
-                    (diet_pref_id TEXT PRIMARY KEY,
-                    user_id TEXT NOT NULL,
-                    diet_type TEXT,
-                    dietary_goal TEXT,
-                    allergies TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
-
-        # Create Ingredient table
-        c.execute('''CREATE TABLE IF NOT EXISTS Ingredient (
-                    ingredient_id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL UNIQUE,
-                    category TEXT,
-                    nutritional_value TEXT,
-                    allergen_info TEXT)''')
-
-        # Create RecipeLibrary table
-        c.execute('''CREATE TABLE IF NOT EXISTS RecipeLibrary (
-                    recipe_id TEXT PRIMARY KEY,
-                    title TEXT NOT NULL,
-                    description TEXT,
-                    ingredients TEXT,
-                    instructions TEXT,
-                    nutrition_info TEXT,
-                    image_url TEXT)''')
-        
-        # Create DietPreferenceIngredient table
-        c.execute('''CREATE TABLE IF NOT EXISTS DietPreferenceIngredient (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    diet_pref_id TEXT NOT NULL,
-                    ingredient_id TEXT NOT NULL,
-                    preference_type TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (diet_pref_id) REFERENCES UserDietPreference(diet_pref_id),
-                    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id))''')
-        
-        # Indexes for performance
-        c.execute('CREATE INDEX IF NOT EXISTS idx_diet_plan_user ON DietPlan(user_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_meal_plan_diet ON MealPlan(diet_plan_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_progress_user_date ON UserDietPlanProgress(user_id, date)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_progress_diet_plan ON UserDietPlanProgress(diet_plan_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_diet_pref_user ON UserDietPreference(user_id)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_recipe_title ON RecipeLibrary(title)')
-        c.execute('CREATE INDEX IF NOT EXISTS idx_logged_meal_user ON LoggedMeal(user_id)')
-        
-        conn.commit()
+        migrate(conn)
         conn.close()
     
 
@@ -1271,24 +746,15 @@ def setup_diet_plan_routes(app, diet_system):
             daily_calories = diet_system.calculate_daily_calories(user_prefs)
             calories_per_meal = daily_calories // 3
 
-            # Get suitable recipes for all meal types
-            breakfast_recipes = diet_system.get_suitable_recipes("breakfast", calories_per_meal, user_prefs)
-            lunch_recipes = diet_system.get_suitable_recipes("lunch", calories_per_meal, user_prefs)
-            dinner_recipes = diet_system.get_suitable_recipes("dinner", calories_per_meal, user_prefs)
-
-            # Combine all suitable recipes
-            suitable_recipes = breakfast_recipes + lunch_recipes + dinner_recipes
+            # Get suitable recipes once; create_balanced_meal_plan splits them by meal type
+            suitable_recipes = diet_system.get_suitable_recipes(None, calories_per_meal, user_prefs)
 
             
             if not suitable_recipes:
-                print("⚠ No recipes matched filters. Adding fallback.")
-                conn = diet_system.get_db_connection()  # ✅ Add this
-                cursor = conn.cursor()
-                cursor.execute("SELECT * FROM RecipeLibrary WHERE recipe_id = 'RCP001'")
-                fallback = cursor.fetchone()
-                conn.close()  # ✅ Don't forget to close!
+                logger.warning("No recipes matched filters. Adding fallback.")
+                fallback = diet_system.recipe_index.get('RCP001')
                 if fallback:
-                    suitable_recipes.append(dict(fallback))  # optional: convert Row to dict
+                    suitable_recipes.append(fallback)
 
 
             if not suitable_recipes:
@@ -1298,17 +764,17 @@ def setup_diet_plan_routes(app, diet_system):
                 }), 400
             
             # Create meal plan
-            meal_plan = diet_system.create_balanced_meal_plan(suitable_recipes, daily_calories, duration_days)
+            meal_plan = diet_system.create_balanced_meal_plan(suitable_recipes, daily_calories, duration_days,
+                                                              seed=data.get('seed'))
             
-            # Generate IDs
-            diet_plan_id = diet_system.generate_diet_plan_id()
-            starting_meal_id = diet_system.generate_meal_plan_id()
-            start_num = int(starting_meal_id[2:])
-
             # Save to database
             conn = diet_system.get_db_connection()
             c = conn.cursor()
 
+            # Generate IDs inside the same transaction as the inserts
+            diet_plan_id = diet_system.generate_diet_plan_id(conn)
+            meal_plan_ids = diet_system.generate_meal_plan_ids(conn, len(meal_plan))
+
             # Mark existing ongoing plan as replaced
             c.execute("""
                 SELECT * FROM DietPlan 
@@ -1339,9 +805,10 @@ def setup_diet_plan_routes(app, diet_system):
             start_date = date.today()
             end_date = start_date + timedelta(days=duration_days)
 
-            protein_target = int(daily_calories * 0.25 / 4)  # 25% of calories from protein
-            carbs_target = int(daily_calories * 0.45 / 4)    # 45% of calories from carbs
-            fat_target = int(daily_calories * 0.30 / 9)      # 30% of calories from fat
+            targets = diet_system.macro_targets(daily_calories)
+            protein_target = targets['protein']
+            carbs_target = targets['carbs']
+            fat_target = targets['fat']
 
             # Insert into DietPlan
             c.execute("""
@@ -1350,15 +817,14 @@ def setup_diet_plan_routes(app, diet_system):
             """, (diet_plan_id, user_id, plan_name, description, start_date, end_date, daily_calories, protein_target, carbs_target, fat_target, 25, duration_days, 'Active', date.today()))
 
             # Insert meals
-            for i, meal in enumerate(meal_plan):
-                meal_plan_id = f"MP{start_num + i:03d}"
-                c.execute("""
-                    INSERT INTO MealPlan (meal_plan_id, diet_plan_id, day_number, meal_type, recipe_id, calories)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
-                    meal_plan_id, diet_plan_id, meal['day'], meal['meal_type'],
-                    meal['recipe']['recipe_id'], meal['recipe']['calories']
-                ))
+            c.executemany("""
+                INSERT INTO MealPlan (meal_plan_id, diet_plan_id, day_number, meal_type, recipe_id, calories)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (meal_plan_id, diet_plan_id, meal['day'], meal['meal_type'],
+                 meal['recipe']['recipe_id'], meal['recipe']['calories'])
+                for meal_plan_id, meal in zip(meal_plan_ids, meal_plan)
+            ])
             
             conn.commit()
             conn.close()
@@ -1570,7 +1036,7 @@ def setup_diet_plan_routes(app, diet_system):
                     c.execute(query, update_values)
             else:
                 # Create new preferences
-                diet_pref_id = diet_system.generate_diet_pref_id()
+                diet_pref_id = diet_system.generate_diet_pref_id(conn)
                 c.execute("""
                     INSERT INTO UserDietPreference (diet_pref_id, user_id, diet_type, dietary_goal, allergies)
                     VALUES (?, ?, ?, ?, ?)
@@ -1627,7 +1093,7 @@ def setup_diet_plan_routes(app, diet_system):
             conn = diet_system.get_db_connection()
             c = conn.cursor()
 
-            progress_id = diet_system.generate_progress_id()
+            progress_id = diet_system.generate_progress_id(conn)
             current_date = datetime.now().date()
             
             c.execute("""
@@ -1749,66 +1215,34 @@ def setup_diet_plan_routes(app, diet_system):
 
     @app.route('/api/logged-meals/<user_id>', methods=['GET'])
     def get_logged_meals_route(user_id):
-        """Get user's logged meal history, grouped by date"""
+        """
+        Get user's logged meal history, grouped by date, newest first.
+        ?from=&to= (YYYY-MM-DD) bound the dates, ?limit= caps the days per
+        page and ?cursor= (the previous page's next_cursor) continues it.
+        The JSON is streamed one day at a time.
+        """
         try:
             # Normalize user_id: handle int or string
             if isinstance(user_id, int) or (isinstance(user_id, str) and user_id.isdigit()):
                 user_id = f"U{int(user_id):03d}"
 
-            conn = diet_system.get_db_connection()
-            c = conn.cursor()
-
-            c.execute("""
-            SELECT meal_id, diet_plan_id, meal_type, meal_name, calories, notes, created_at
-            FROM LoggedMeal
-            WHERE user_id = ?
-            ORDER BY created_at DESC
-        """, (user_id,))
-
-            rows = c.fetchall()
-            conn.close()
-
-            # Group by date
-            history = {}
-            for row in rows:
-                raw_created_at = row['created_at']
-            
-                dt_object = None
-                try:
-                    # Try parsing with milliseconds first
-                    dt_object = datetime.strptime(raw_created_at, '%Y-%m-%d %H:%M:%S.%f')
-                except ValueError:
-                    try:
-                        # If that fails, try parsing without milliseconds
-                        dt_object = datetime.strptime(raw_created_at, '%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        print(f"ERROR: Could not parse datetime string: {raw_created_at}")
-                        continue # Skip this row if it cannot be parsed
-
-                if dt_object: # Only proceed if parsing was successful
-                    # Use the date part of the actual meal creation timestamp for grouping
-                    log_date = dt_object.date().isoformat()
-
-                    if log_date not in history:
-                        history[log_date] = []
-
-                    history[log_date].append({
-                        'meal_id': row['meal_id'],
-                        'diet_plan_id': row['diet_plan_id'],
-                        'meal_type': row['meal_type'],
-                        'meal_name': row['meal_name'],
-                        'calories': row['calories'],
-                        'notes': row['notes'],
-                        'logged_at': raw_created_at
-                    })
+            date_from = request.args.get('from')
+            date_to = request.args.get('to')
+            cursor = request.args.get('cursor')
+            try:
+                for value in (date_from, date_to, cursor):
+                    if value:
+                        datetime.strptime(value, '%Y-%m-%d')
+                limit = min(max(int(request.args.get('limit', HISTORY_DAYS)), 1), MAX_HISTORY_DAYS)
+            except ValueError:
+                return jsonify({'success': False, 'error': 'Dates must be YYYY-MM-DD and limit a number'}), 400
 
-            return jsonify({
-                'success': True,
-                'logged_meals': history
-            })
+            days, next_cursor = diet_system.meal_ledger.history(user_id, date_from, date_to, limit, cursor)
+            payload = {'success': True, 'next_cursor': next_cursor}
+            return Response(iter_history_json(payload, days), mimetype='application/json')
 
         except Exception as e:
-            print(f"Error fetching logged meals: {e}")
+            logger.error("Error fetching logged meals: %s", e)
             return jsonify({'success': False, 'error': f'Failed to fetch logged meals: {str(e)}'}), 500
 
     @app.route('/api/logged-meal/<meal_id>', methods=['DELETE'])
@@ -1842,7 +1276,7 @@ def setup_diet_plan_routes(app, diet_system):
             return jsonify(result), 200 if result.get('success') else 500
 
         except Exception as e:
-            print(f"Error fetching user progress by date: {e}")
+            logger.error("Error fetching user progress by date: %s", e)
             return jsonify({'success': False, 'error': f'Failed to fetch user progress: {str(e)}'}), 500
         
     @app.route('/api/user-diet-summary/<user_id>', methods=['GET'])
@@ -1855,7 +1289,7 @@ def setup_diet_plan_routes(app, diet_system):
             result = diet_system.get_user_diet_summary(user_id)
             return jsonify(result), 200 if result.get('success') else 500
         except Exception as e:
-            print(f"Error fetching diet summary: {e}")
+            logger.error("Error fetching diet summary: %s", e)
             return jsonify({'success': False, 'error': f'Failed to fetch diet summary: {str(e)}'}), 500
 
     @app.route('/api/admin/dietary-analytics', methods=['GET'])
@@ -1871,9 +1305,14 @@ def setup_diet_plan_routes(app, diet_system):
                 return jsonify({'success': False, 'error': result['error']}), 500
             return jsonify({'success': True, 'data': result}), 200
         except Exception as e:
-            print(f"Error fetching admin dietary analytics: {e}")
+            logger.error("Error fetching admin dietary analytics: %s", e)
             return jsonify({'success': False, 'error': f'Failed to fetch dietary analytics: {str(e)}'}), 500
 
+    @app.route('/api/admin/recipe-rejections', methods=['GET'])
+    def get_recipe_rejections_route():
+        """Counts of recipes skipped during diet plan generation, by reason (since startup)"""
+        return jsonify({'success': True, 'data': diet_system.recipe_rejections.snapshot()}), 200
+
 # Integration helper function
 def integrate_diet_system_with_app(app, get_db_connection_func):
     """
@@ -0,0 +1,240 @@
+# Daily rollups behind the admin dietary analytics for NextGenFitness
+#
+# The analytics endpoint used to aggregate UserDietPlanProgress, LoggedMeal,
+# MealScans and UserDietPreference in full on every call. These tables hold
+# the same aggregates (per day where the report has a period), so a report
+# over N days reads O(N) rows (O(N x active users) for the per-user averages):
+#   DietDayRollup       progress rows, calories and meals per day
+#   DietUserDayRollup   the same per user and day
+#   MealTypeDayRollup   logged meals per day and meal type
+#   MealNameDayRollup   logged meals per day and meal name
+#   ScanFoodDayRollup   meal scans per day and recognised food
+#   DietGoalRollup      users per dietary goal
+#   AllergyRollup       mentions of each allergy (the comma-separated
+#                       UserDietPreference.allergies, split in SQL)
+# Triggers on the source tables apply each insert, update and delete as a
+# delta in the same transaction. compact_dietary_rollups() runs nightly: it
+# drops rows whose counts fell to zero and re-derives the last few days from
+# the source tables, so any drift (e.g. rows edited with triggers bypassed)
+# cannot outlive a day.
+
+from datetime import date, datetime, timedelta
+
+# (rollup table, source table, key columns, value columns, row condition)
+# Expressions use {row}, which becomes new/old in triggers and the source
+# table in rebuilds. The first value column counts source rows.
+ROLLUPS = [
+    ('DietDayRollup', 'UserDietPlanProgress',
+     [('day', '{row}.date')],
+     [('progress_rows', '1', 'INTEGER'),
+      ('calories', 'COALESCE({row}.calories_consumed, 0)', 'REAL'),
+      ('meals', 'COALESCE({row}.meals_completed, 0)', 'INTEGER')],
+     '{row}.date IS NOT NULL'),
+    ('DietUserDayRollup', 'UserDietPlanProgress',
+     [('day', '{row}.date'), ('user_id', '{row}.user_id')],
+     [('progress_rows', '1', 'INTEGER'),
+      ('calories', 'COALESCE({row}.calories_consumed, 0)', 'REAL'),
+      ('meals', 'COALESCE({row}.meals_completed, 0)', 'INTEGER')],
+     '{row}.date IS NOT NULL'),
+    ('MealTypeDayRollup', 'LoggedMeal',
+     [('day', '{row}.log_date'), ('meal_type', '{row}.meal_type')],
+     [('meals', '1', 'INTEGER')],
+     '{row}.log_date IS NOT NULL'),
+    ('MealNameDayRollup', 'LoggedMeal',
+     [('day', '{row}.log_date'), ('meal_name', '{row}.meal_name')],
+     [('meals', '1', 'INTEGER')],
+     '{row}.log_date IS NOT NULL'),
+    ('ScanFoodDayRollup', 'MealScans',
+     [('day', 'date({row}.timestamp)'), ('food_name', "COALESCE({row}.food_name, '')")],
+     [('scans', '1', 'INTEGER')],
+     '{row}.timestamp IS NOT NULL'),
+]
+
+# Source columns whose update moves a row between (or within) rollup rows
+SOURCE_COLUMNS = {
+    'UserDietPlanProgress': 'user_id, date, calories_consumed, meals_completed',
+    'LoggedMeal': 'log_date, meal_type, meal_name',
+    'MealScans': 'timestamp, food_name',
+}
+
+RECONCILE_DAYS = 3  # days re-derived from the source tables by the nightly compaction
+
+# JSON array of a UserDietPreference row's allergies, for json_each (quotes,
+# backslashes and tab/newline characters escaped first)
+ALLERGY_LIST = r"""'["' || replace(replace(replace(replace(replace(replace({row}.allergies,
+    '\', '\\'), '"', '\"'), char(9), '\t'), char(10), '\n'), char(13), '\r'), ',', '","') || '"]'"""
+# Characters str.strip() removes around each allergy
+ALLERGY_TRIM = "' ' || char(9, 10, 11, 12, 13)"
+
+
+def _bump(rollup, row, sign):
+    """Trigger statement adding (sign '') or removing (sign '-') one source row"""
+    table, _, keys, values, condition = rollup
+    columns = ', '.join(name for name, _ in keys) + ', ' + ', '.join(name for name, _, _ in values)
+    selected = ', '.join(expr.format(row=row) for _, expr in keys) + ', ' + \
+        ', '.join(f"{sign}({expr.format(row=row)})" for _, expr, _ in values)
+    updates = ', '.join(f"{name} = {name} + excluded.{name}" for name, _, _ in values)
+    return (f"INSERT INTO {table} ({columns}) SELECT {selected} WHERE {condition.format(row=row)} "
+            f"ON CONFLICT({', '.join(name for name, _ in keys)}) DO UPDATE SET {updates};")
+
+
+def _bump_preferences(row, sign):
+    """Trigger statements adding or removing one UserDietPreference row's goal and allergies"""
+    return f'''
+        INSERT INTO DietGoalRollup (dietary_goal, users)
+        SELECT COALESCE({row}.dietary_goal, ''), {sign}1 WHERE 1
+        ON CONFLICT(dietary_goal) DO UPDATE SET users = users + excluded.users;
+        INSERT INTO AllergyRollup (allergy, mentions)
+        SELECT trim(value, {ALLERGY_TRIM}), {sign}COUNT(*) FROM json_each({ALLERGY_LIST.format(row=row)})
+        WHERE {row}.allergies IS NOT NULL AND trim(value, {ALLERGY_TRIM}) <> '' GROUP BY trim(value, {ALLERGY_TRIM})
+        ON CONFLICT(allergy) DO UPDATE SET mentions = mentions + excluded.mentions;'''
+
+
+def create_dietary_rollups(cursor):
+    """Create the rollup tables and their triggers, and fill them from the source tables"""
+    for table, source, keys, values, _ in ROLLUPS:
+        columns = [f"{name} TEXT NOT NULL" for name, _ in keys]
+        columns += [f"{name} {kind} NOT NULL DEFAULT 0" for name, _, kind in values]
+        primary_key = ', '.join(name for name, _ in keys)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(columns)}, "
+                       f"PRIMARY KEY ({primary_key})) WITHOUT ROWID")
+
+    for source, watched in SOURCE_COLUMNS.items():
+        rollups = [rollup for rollup in ROLLUPS if rollup[1] == source]
+        added = '\n'.join(_bump(rollup, 'new', '') for rollup in rollups)
+        removed = '\n'.join(_bump(rollup, 'old', '-') for rollup in rollups)
+        for suffix in ('ai', 'ad', 'au'):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {source}_rollup_{suffix}")
+        cursor.execute(f"CREATE TRIGGER {source}_rollup_ai AFTER INSERT ON {source} BEGIN {added} END")
+        cursor.execute(f"CREATE TRIGGER {source}_rollup_ad AFTER DELETE ON {source} BEGIN {removed} END")
+        cursor.execute(f"CREATE TRIGGER {source}_rollup_au AFTER UPDATE OF {watched} ON {source} "
+                       f"BEGIN {removed} {added} END")
+
+    rebuild_dietary_rollups(cursor)
+
+
+def rebuild_dietary_rollups(cursor, since=None):
+    """Recompute the rollups from the source tables, for every day or only days >= since"""
+    for table, source, keys, values, condition in ROLLUPS:
+        day = keys[0][1].format(row=source)
+        cursor.execute(f"DELETE FROM {table}" + (" WHERE day >= ?" if since else ''),
+                       (since,) if since else ())
+        key_exprs = ', '.join(expr.format(row=source) for _, expr in keys)
+        cursor.execute(f'''
+            INSERT INTO {table} ({', '.join(name for name, _ in keys)}, {', '.join(name for name, _, _ in values)})
+            SELECT {key_exprs}, {', '.join(f"SUM({expr.format(row=source)})" for _, expr, _ in values)}
+            FROM {source}
+            WHERE {condition.format(row=source)}{f" AND {day} >= ?" if since else ''}
+            GROUP BY {key_exprs}
+        ''', (since,) if since else ())
+
+
+def create_preference_rollups(cursor):
+    """Create the dietary goal and allergy count tables and their triggers, and fill them"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS DietGoalRollup (
+                    dietary_goal TEXT PRIMARY KEY,
+                    users INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS AllergyRollup (
+                    allergy TEXT PRIMARY KEY,
+                    mentions INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID''')
+    for suffix in ('ai', 'ad', 'au'):
+        cursor.execute(f"DROP TRIGGER IF EXISTS UserDietPreference_rollup_{suffix}")
+    cursor.execute(f"CREATE TRIGGER UserDietPreference_rollup_ai AFTER INSERT ON UserDietPreference "
+                   f"BEGIN {_bump_preferences('new', '')} END")
+    cursor.execute(f"CREATE TRIGGER UserDietPreference_rollup_ad AFTER DELETE ON UserDietPreference "
+                   f"BEGIN {_bump_preferences('old', '-')} END")
+    cursor.execute(f"CREATE TRIGGER UserDietPreference_rollup_au AFTER UPDATE OF dietary_goal, allergies "
+                   f"ON UserDietPreference BEGIN {_bump_preferences('old', '-')} {_bump_preferences('new', '')} END")
+
+    rebuild_preference_rollups(cursor)
+
+
+def rebuild_preference_rollups(cursor):
+    """Recompute the dietary goal and allergy counts (one source row per user, so always in full)"""
+    cursor.execute("DELETE FROM DietGoalRollup")
+    cursor.execute('''
+        INSERT INTO DietGoalRollup (dietary_goal, users)
+        SELECT COALESCE(dietary_goal, ''), COUNT(*) FROM UserDietPreference GROUP BY 1
+    ''')
+    cursor.execute("DELETE FROM AllergyRollup")
+    cursor.execute(f'''
+        INSERT INTO AllergyRollup (allergy, mentions)
+        SELECT trim(j.value, {ALLERGY_TRIM}), COUNT(*)
+        FROM UserDietPreference, json_each({ALLERGY_LIST.format(row='UserDietPreference')}) j
+        WHERE UserDietPreference.allergies IS NOT NULL AND trim(j.value, {ALLERGY_TRIM}) <> ''
+        GROUP BY 1
+    ''')
+
+
+def compact_dietary_rollups(conn, today=None):
+    """
+    Nightly job: drop rollup rows whose source rows are all gone and
+    re-derive the last RECONCILE_DAYS days (and the goal/allergy counts).
+    Returns the rows pruned.
+    """
+    today = datetime.strptime(today, '%Y-%m-%d').date() if today else date.today()
+    pruned = 0
+    for table, _, _, values, _ in ROLLUPS:
+        pruned += conn.execute(f"DELETE FROM {table} WHERE {values[0][0]} <= 0").rowcount
+    pruned += conn.execute("DELETE FROM DietGoalRollup WHERE users <= 0").rowcount
+    pruned += conn.execute("DELETE FROM AllergyRollup WHERE mentions <= 0").rowcount
+    cursor = conn.cursor()
+    rebuild_dietary_rollups(cursor, since=(today - timedelta(days=RECONCILE_DAYS)).isoformat())
+    rebuild_preference_rollups(cursor)
+    return {'pruned_rows': pruned}
+
+
+def read_dietary_rollups(conn, start_date, end_date, top=10):
+    """Calorie, meal and scan aggregates for days start_date..end_date ('YYYY-MM-DD', inclusive)"""
+    period = (start_date, end_date)
+    per_user = conn.execute('''
+        SELECT r.user_id, p.full_name, SUM(r.calories) AS total_calories, COUNT(*) AS total_days_logged
+        FROM DietUserDayRollup r
+        JOIN User u ON r.user_id = u.user_id
+        LEFT JOIN Profile p ON u.user_id = p.user_id
+        WHERE r.day BETWEEN ? AND ? AND r.progress_rows > 0
+        GROUP BY r.user_id
+    ''', period).fetchall()
+    adherence = conn.execute('''
+        SELECT day AS date,
+               calories * 1.0 / progress_rows AS average_calories,
+               meals * 1.0 / progress_rows AS average_meals_completed
+        FROM DietDayRollup
+        WHERE day BETWEEN ? AND ? AND progress_rows > 0
+        ORDER BY day
+    ''', period).fetchall()
+    meal_types = conn.execute('''
+        SELECT meal_type, SUM(meals) AS count FROM MealTypeDayRollup
+        WHERE day BETWEEN ? AND ?
+        GROUP BY meal_type HAVING count > 0 ORDER BY count DESC, meal_type
+    ''', period).fetchall()
+    top_meals = conn.execute('''
+        SELECT meal_name, SUM(meals) AS count FROM MealNameDayRollup
+        WHERE day BETWEEN ? AND ?
+        GROUP BY meal_name HAVING count > 0 ORDER BY count DESC, meal_name LIMIT ?
+    ''', period + (top,)).fetchall()
+    top_scans = conn.execute('''
+        SELECT NULLIF(food_name, '') AS food_name, SUM(scans) AS count FROM ScanFoodDayRollup
+        WHERE day BETWEEN ? AND ?
+        GROUP BY food_name HAVING count > 0 ORDER BY count DESC, food_name LIMIT ?
+    ''', period + (top,)).fetchall()
+    return {
+        'per_user': per_user,
+        'adherence': adherence,
+        'meal_types': meal_types,
+        'top_meals': top_meals,
+        'top_scans': top_scans,
+    }
+
+
+def read_preference_rollups(conn):
+    """Users per dietary goal and mentions per allergy, most common first"""
+    goals = conn.execute('''
+        SELECT NULLIF(dietary_goal, '') AS dietary_goal, users AS count FROM DietGoalRollup
+        WHERE users > 0 ORDER BY users DESC, dietary_goal
+    ''').fetchall()
+    allergies = conn.execute('''
+        SELECT allergy, mentions AS count FROM AllergyRollup
+        WHERE mentions > 0 ORDER BY mentions DESC, allergy
+    ''').fetchall()
+    return {'goals': goals, 'allergies': allergies}
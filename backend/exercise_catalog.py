@@ -0,0 +1,205 @@
+# In-memory exercise catalog for NextGenFitness
+#
+# The exercise routes used to stat and list exercises/<folder> for every row
+# they returned and re-split the instructions on each request. The catalog
+# reads the Exercise table and the image folder tree once, keeps the image
+# URL lists and parsed instructions per exercise, and is rebuilt only when an
+# exercise or its images change (or, optionally, when the folder tree does).
+
+import json
+import os
+import sqlite3
+import threading
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+THUMBNAIL_QUERY = 'size=256&format=webp'  # list-sized variant served by /exercise-images
+
+
+def exercise_folder_name(name):
+    """Image folder of an exercise, e.g. '3/4 Sit-Up' -> '3_4_Sit-Up'"""
+    return name.replace('/', '_').replace(' ', '_')
+
+
+def parse_instructions(instructions):
+    """
+    Steps of the stored instructions: a JSON array (as the dataset and the
+    importer write it), or legacy plain text split on '.'
+    """
+    if not isinstance(instructions, str):
+        return instructions
+    if instructions.lstrip().startswith('['):
+        try:
+            steps = json.loads(instructions)
+        except ValueError:
+            steps = None
+        if isinstance(steps, list):
+            return [str(step).strip() for step in steps if str(step).strip()]
+    return [step.strip() for step in instructions.split('.') if step.strip()]
+
+
+class ExerciseCatalog:
+    """
+    Exercise rows plus their image URLs and parsed instructions, held in memory.
+
+    get_connection: callable returning a DB connection (the app's pool checkout)
+    exercise_folder: directory holding one image folder per exercise
+    asset_version: optional callable 'folder/file' -> content hash, appended to
+                   image URLs as ?v= so clients can cache them indefinitely
+    """
+
+    def __init__(self, get_connection, exercise_folder, url_prefix='/exercise-images',
+                 thumbnail_query=THUMBNAIL_QUERY, asset_version=None):
+        self.get_connection = get_connection
+        self.exercise_folder = exercise_folder
+        self.url_prefix = url_prefix
+        self.thumbnail_query = thumbnail_query
+        self.asset_version = asset_version
+
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._generation = 0  # bumped by invalidate(), so a load racing an edit is not kept as fresh
+        # Swapped as a whole on reload so readers never mix two generations:
+        # (Exercise_ID -> row dict, folder -> sorted image names,
+        #  Exercise_ID -> image URLs, Exercise_ID -> instruction steps)
+        self._state = ({}, {}, {}, {})
+        self._tree_mtime = None
+        self._watcher = None
+        self._stop_watching = threading.Event()
+        self._listeners = []
+        self.loads = 0
+
+    def _scan_folders(self):
+        """List every exercise image folder once"""
+        folder_images = {}
+        try:
+            entries = list(os.scandir(self.exercise_folder))
+        except FileNotFoundError:
+            return folder_images, None
+
+        for entry in entries:
+            if not entry.is_dir():
+                continue
+            with os.scandir(entry.path) as files:
+                folder_images[entry.name] = sorted(
+                    f.name for f in files if f.name.lower().endswith(IMAGE_EXTENSIONS)
+                )
+        return folder_images, os.stat(self.exercise_folder).st_mtime
+
+    def load(self):
+        """(Re)build the catalog from the database and the image folder tree"""
+        generation = self._generation
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("SELECT * FROM Exercise ORDER BY Exercise_ID").fetchall()
+            steps = self._imported_steps(conn)
+        finally:
+            conn.close()
+        folder_images, tree_mtime = self._scan_folders()
+
+        exercises, image_urls, instructions = {}, {}, {}
+        for row in rows:
+            ex = dict(row)
+            ex_id = ex['Exercise_ID']
+            exercises[ex_id] = ex
+            image_urls[ex_id] = self._urls_for(folder_images, ex['name'])
+            instructions[ex_id] = steps.get(ex_id) or parse_instructions(ex['instructions'])
+
+        with self._lock:
+            self._state = (exercises, folder_images, image_urls, instructions)
+            self._tree_mtime = tree_mtime
+            self._loaded = generation == self._generation
+            self.loads += 1
+
+    def _imported_steps(self, conn):
+        """Exercise_ID -> steps written by exercise_importer.py (used instead of re-splitting the text)"""
+        steps = {}
+        try:
+            rows = conn.execute("SELECT Exercise_ID, text FROM ExerciseInstruction ORDER BY Exercise_ID, step")
+        except sqlite3.OperationalError:
+            return steps  # database not migrated yet
+        for exercise_id, text in rows:
+            steps.setdefault(exercise_id, []).append(text)
+        return steps
+
+    def _urls_for(self, folder_images, name):
+        folder = exercise_folder_name(name or '')
+        urls = []
+        for filename in folder_images.get(folder, []):
+            url = f"{self.url_prefix}/{folder}/{filename}"
+            version = self.asset_version(f"{folder}/{filename}") if self.asset_version else None
+            urls.append(f"{url}?v={version}" if version else url)
+        return urls
+
+    def _snapshot(self):
+        if not self._loaded:
+            self.load()
+        return self._state
+
+    def invalidate(self):
+        """Drop the cached data; the next lookup reloads it"""
+        with self._lock:
+            self._loaded = False
+            self._generation += 1
+        for listener in self._listeners:
+            listener()
+
+    def on_invalidate(self, listener):
+        """Call listener() whenever the catalog is invalidated (for caches derived from it)"""
+        self._listeners.append(listener)
+
+    def decorate(self, row):
+        """
+        Route-ready dict for an Exercise row (or a join that includes its columns):
+        adds 'image_urls' (plus 'thumbnail_urls' for list views) and turns
+        'instructions' into a list of steps.
+        """
+        exercises, folder_images, image_urls, instructions = self._snapshot()
+        ex = dict(row)
+        ex_id = ex.get('Exercise_ID')
+        cached = exercises.get(ex_id)
+
+        # Rows edited since the last load still resolve from the in-memory folder index
+        if cached is not None and cached['name'] == ex.get('name'):
+            ex['image_urls'] = list(image_urls[ex_id])
+        else:
+            ex['image_urls'] = self._urls_for(folder_images, ex.get('name'))
+        ex['thumbnail_urls'] = [url + ('&' if '?' in url else '?') + self.thumbnail_query
+                                for url in ex['image_urls']]
+
+        if cached is not None and cached['instructions'] == ex.get('instructions'):
+            ex['instructions'] = list(instructions[ex_id])
+        else:
+            ex['instructions'] = parse_instructions(ex.get('instructions'))
+        return ex
+
+    def get(self, exercise_id):
+        """Decorated exercise by ID, or None"""
+        cached = self._snapshot()[0].get(exercise_id)
+        return self.decorate(cached) if cached is not None else None
+
+    def __len__(self):
+        return len(self._snapshot()[0])
+
+    def start_watcher(self, interval=5.0):
+        """
+        Poll the exercise folder and invalidate when it changes (folders added
+        or removed outside the API). Uploads through the API invalidate directly.
+        """
+        if self._watcher is not None:
+            return
+
+        def watch():
+            while not self._stop_watching.wait(interval):
+                try:
+                    mtime = os.stat(self.exercise_folder).st_mtime
+                except FileNotFoundError:
+                    mtime = None
+                if self._loaded and mtime != self._tree_mtime:
+                    self.invalidate()
+
+        self._watcher = threading.Thread(target=watch, name='exercise-catalog-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop_watching.set()
+        self._watcher = None
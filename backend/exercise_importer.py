@@ -0,0 +1,225 @@
+# Bulk importer for the exercises/*.json dataset
+#
+# Each exercises/<id>.json file describes one exercise (force, muscles,
+# instruction steps, image paths). The Exercise table only kept a subset, with
+# the lists flattened into strings. The importer streams the files one at a
+# time and writes them in batches with executemany: the Exercise row itself
+# (matched by the file's id, or by name on the first import), its secondary
+# muscles in ExerciseMuscle, its steps in ExerciseInstruction and its images
+# in ExerciseImage. ExerciseSource remembers the mtime, size and sha256 of
+# every imported file, so a re-run only parses files that actually changed.
+#
+#   python exercise_importer.py [--force] [--db path] [--folder path]
+#
+# A running app picks the new data up when its exercise catalog next reloads
+# (on restart, or after any exercise is edited through the API).
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+
+from migrations import migrate
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'NextGenFitness.db')
+DEFAULT_FOLDER = os.path.join(BASE_DIR, 'exercises')
+BATCH_SIZE = 200
+
+
+def scan_dataset(folder):
+    """(source id, path, stat) for every JSON file in the folder, in name order"""
+    with os.scandir(folder) as entries:
+        files = sorted(entry.name for entry in entries
+                       if entry.is_file() and entry.name.endswith('.json'))
+    for filename in files:
+        path = os.path.join(folder, filename)
+        yield filename[:-len('.json')], path, os.stat(path)
+
+
+def parse_exercise(raw):
+    """Decoded dataset record; raises ValueError if it is not a named exercise"""
+    record = json.loads(raw)
+    if not isinstance(record, dict) or not record.get('name'):
+        raise ValueError("not an exercise record")
+    return record
+
+
+def _list(record, key):
+    value = record.get(key) or []
+    return [value] if isinstance(value, str) else list(value)
+
+
+class ExerciseImporter:
+    """
+    Imports the dataset folder into one database connection.
+    force: re-import every file even if it is unchanged since the last run
+    """
+
+    def __init__(self, conn, folder=DEFAULT_FOLDER, force=False, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.folder = folder
+        self.force = force
+        self.batch_size = batch_size
+        self.counts = {'imported': 0, 'added': 0, 'unchanged': 0, 'failed': 0}
+
+        # source id -> (Exercise_ID, mtime_ns, size, sha256) as of the last import
+        self._state = {
+            row[0]: tuple(row[1:]) for row in conn.execute(
+                "SELECT source_id, Exercise_ID, mtime_ns, size, sha256 FROM ExerciseSource")
+        }
+        # Exercises imported before ExerciseSource existed are matched by name once
+        self._by_name = {
+            name.lower(): exercise_id for exercise_id, name in conn.execute(
+                "SELECT Exercise_ID, name FROM Exercise WHERE name IS NOT NULL")
+        }
+
+    def run(self):
+        """Import every new or changed file. Returns the counts."""
+        batch, touched = [], []
+        for source_id, path, stat in scan_dataset(self.folder):
+            known = self._state.get(source_id)
+            if not self.force and known and known[1:3] == (stat.st_mtime_ns, stat.st_size):
+                self.counts['unchanged'] += 1
+                continue
+
+            with open(path, 'rb') as f:
+                raw = f.read()
+            digest = hashlib.sha256(raw).hexdigest()
+            if not self.force and known and known[3] == digest:
+                # Touched but not edited: remember the new mtime so it is skipped next time
+                touched.append((stat.st_mtime_ns, stat.st_size, source_id))
+                self.counts['unchanged'] += 1
+                continue
+
+            try:
+                record = parse_exercise(raw)
+            except ValueError as e:
+                logger.warning("Skipping %s: %s", path, e)
+                self.counts['failed'] += 1
+                continue
+
+            batch.append((source_id, stat, digest, record))
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+
+        if batch:
+            self._write(batch)
+        if touched:
+            self.conn.executemany(
+                "UPDATE ExerciseSource SET mtime_ns = ?, size = ? WHERE source_id = ?", touched)
+            self.conn.commit()
+        return self.counts
+
+    def _exercise_id(self, source_id, record):
+        known = self._state.get(source_id)
+        if known:
+            return known[0]
+        return self._by_name.get(record['name'].lower())
+
+    def _write(self, batch):
+        """Upsert one batch of records and their child rows in a single transaction"""
+        exercise_rows, sources = [], []
+        instructions, images, muscles = [], [], []
+        try:
+            for source_id, stat, digest, record in batch:
+                columns = (
+                    record['name'], record.get('force'), record.get('level'), record.get('mechanic'),
+                    record.get('equipment'), json.dumps(_list(record, 'primaryMuscles')),
+                    json.dumps(_list(record, 'instructions')), record.get('category'),
+                    json.dumps(_list(record, 'images')),
+                )
+                exercise_id = self._exercise_id(source_id, record)
+                if exercise_id is None:
+                    # New exercises need their ID before the child rows can be written
+                    exercise_id = self.conn.execute('''
+                        INSERT INTO Exercise (name, force, level, mechanic, equipment,
+                                              primaryMuscles, instructions, category, images)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', columns).lastrowid
+                    self._by_name[record['name'].lower()] = exercise_id
+                    self.counts['added'] += 1
+                else:
+                    exercise_rows.append(columns + (exercise_id,))
+
+                sources.append((source_id, exercise_id, stat.st_mtime_ns, stat.st_size, digest))
+                instructions.extend((exercise_id, step, text.strip())
+                                    for step, text in enumerate(_list(record, 'instructions'), 1))
+                images.extend((exercise_id, position, path)
+                              for position, path in enumerate(_list(record, 'images')))
+                muscles.extend((muscle.lower(), exercise_id)
+                               for muscle in _list(record, 'secondaryMuscles'))
+
+            self.conn.executemany('''
+                UPDATE Exercise
+                SET name = ?, force = ?, level = ?, mechanic = ?, equipment = ?,
+                    primaryMuscles = ?, instructions = ?, category = ?, images = ?
+                WHERE Exercise_ID = ?
+            ''', exercise_rows)
+
+            # Child rows are replaced wholesale (primary muscles follow the
+            # Exercise row through its triggers)
+            ids = [(source[1],) for source in sources]
+            self.conn.executemany("DELETE FROM ExerciseInstruction WHERE Exercise_ID = ?", ids)
+            self.conn.executemany("DELETE FROM ExerciseImage WHERE Exercise_ID = ?", ids)
+            self.conn.executemany(
+                "DELETE FROM ExerciseMuscle WHERE Exercise_ID = ? AND role = 'secondary'", ids)
+            self.conn.executemany(
+                "INSERT INTO ExerciseInstruction (Exercise_ID, step, text) VALUES (?, ?, ?)", instructions)
+            self.conn.executemany(
+                "INSERT INTO ExerciseImage (Exercise_ID, position, path) VALUES (?, ?, ?)", images)
+            self.conn.executemany('''
+                INSERT OR IGNORE INTO ExerciseMuscle (muscle, Exercise_ID, role)
+                VALUES (?, ?, 'secondary')
+            ''', muscles)
+
+            self.conn.executemany('''
+                INSERT INTO ExerciseSource (source_id, Exercise_ID, mtime_ns, size, sha256)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(source_id) DO UPDATE SET
+                    Exercise_ID = excluded.Exercise_ID, mtime_ns = excluded.mtime_ns,
+                    size = excluded.size, sha256 = excluded.sha256, imported_at = CURRENT_TIMESTAMP
+            ''', sources)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+
+        for source_id, exercise_id, mtime_ns, size, digest in sources:
+            self._state[source_id] = (exercise_id, mtime_ns, size, digest)
+        self.counts['imported'] += len(sources)
+
+
+def import_exercises(db_path=DEFAULT_DB, folder=DEFAULT_FOLDER, force=False):
+    """Migrate the database if needed and import the dataset; returns the counts"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("PRAGMA foreign_keys = ON")
+        migrate(conn)
+        return ExerciseImporter(conn, folder, force=force).run()
+    finally:
+        conn.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import the exercises/*.json dataset into the database")
+    parser.add_argument('--db', default=DEFAULT_DB, help="database file (default: %(default)s)")
+    parser.add_argument('--folder', default=DEFAULT_FOLDER, help="dataset folder (default: %(default)s)")
+    parser.add_argument('--force', action='store_true', help="re-import files that have not changed")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    counts = import_exercises(args.db, args.folder, force=args.force)
+    print(f"Imported {counts['imported']} exercises ({counts['added']} new), "
+          f"{counts['unchanged']} unchanged, {counts['failed']} failed")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+# Filtered exercise queries for NextGenFitness
+#
+# One filter builder shared by the exercise listings and plan generation.
+# Listings page by keyset (Exercise_ID > last seen ID) instead of OFFSET, the
+# level/equipment/category filters are served by a composite index, and the
+# muscle filter goes through ExerciseMuscle, a normalized copy of the
+# primaryMuscles JSON list kept in sync by triggers. exercise_importer.py
+# also stores secondary muscles there (role 'secondary'), which the filter
+# ignores; they only feed the similarity index.
+
+EXERCISE_FILTERS = ('level', 'mechanic', 'equipment', 'primaryMuscle', 'category')
+
+
+def create_exercise_indexes(cursor):
+    """Create the composite filter index and the ExerciseMuscle table with its sync triggers"""
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_exercise_level_equipment_category
+                    ON Exercise (level, equipment, category)''')
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ExerciseMuscle'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseMuscle (
+                    muscle TEXT NOT NULL,
+                    Exercise_ID INTEGER NOT NULL,
+                    role TEXT NOT NULL DEFAULT 'primary',
+                    PRIMARY KEY (muscle, Exercise_ID, role)) WITHOUT ROWID''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_exercise_muscle_exercise
+                    ON ExerciseMuscle (Exercise_ID)''')
+
+    insert_muscles = '''
+        INSERT OR IGNORE INTO ExerciseMuscle (muscle, Exercise_ID, role)
+        SELECT LOWER(value), new.Exercise_ID, 'primary'
+        FROM json_each(CASE WHEN json_valid(new.primaryMuscles) THEN new.primaryMuscles ELSE '[]' END);'''
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS Exercise_muscle_ai AFTER INSERT ON Exercise BEGIN
+                        {insert_muscles}
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS Exercise_muscle_au AFTER UPDATE OF primaryMuscles ON Exercise BEGIN
+                        DELETE FROM ExerciseMuscle WHERE Exercise_ID = old.Exercise_ID AND role = 'primary';
+                        {insert_muscles}
+                    END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS Exercise_muscle_ad AFTER DELETE ON Exercise BEGIN
+                        DELETE FROM ExerciseMuscle WHERE Exercise_ID = old.Exercise_ID;
+                    END''')
+
+    if not exists:
+        cursor.execute('''
+            INSERT OR IGNORE INTO ExerciseMuscle (muscle, Exercise_ID, role)
+            SELECT LOWER(m.value), e.Exercise_ID, 'primary'
+            FROM Exercise e, json_each(e.primaryMuscles) m
+            WHERE json_valid(e.primaryMuscles)
+        ''')
+
+
+def create_exercise_detail_tables(cursor):
+    """
+    Per-step instructions, image paths and import state filled by
+    exercise_importer.py. Rows follow their Exercise row on delete, and an
+    edited instructions column drops its (now stale) steps.
+    """
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseInstruction (
+                    Exercise_ID INTEGER NOT NULL,
+                    step INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    PRIMARY KEY (Exercise_ID, step)) WITHOUT ROWID''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseImage (
+                    Exercise_ID INTEGER NOT NULL,
+                    position INTEGER NOT NULL,
+                    path TEXT NOT NULL,
+                    PRIMARY KEY (Exercise_ID, position)) WITHOUT ROWID''')
+
+    # One row per dataset file: which exercise it feeds and the file version last imported
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseSource (
+                    source_id TEXT PRIMARY KEY,
+                    Exercise_ID INTEGER NOT NULL UNIQUE,
+                    mtime_ns INTEGER,
+                    size INTEGER,
+                    sha256 TEXT,
+                    imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS Exercise_detail_ad AFTER DELETE ON Exercise BEGIN
+                        DELETE FROM ExerciseInstruction WHERE Exercise_ID = old.Exercise_ID;
+                        DELETE FROM ExerciseImage WHERE Exercise_ID = old.Exercise_ID;
+                        DELETE FROM ExerciseSource WHERE Exercise_ID = old.Exercise_ID;
+                    END''')
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS Exercise_instructions_au AFTER UPDATE OF instructions ON Exercise
+                    WHEN old.instructions IS NOT new.instructions BEGIN
+                        DELETE FROM ExerciseInstruction WHERE Exercise_ID = old.Exercise_ID;
+                    END''')
+
+
+def exercise_filters(source):
+    """Pick the supported filters out of request args or a JSON body"""
+    return {key: source.get(key) for key in EXERCISE_FILTERS if source.get(key)}
+
+
+def build_exercise_where(filters):
+    """WHERE clause and parameters for a dict of exercise filters"""
+    clauses = []
+    params = []
+
+    for column in ('level', 'mechanic', 'category'):
+        if filters.get(column):
+            clauses.append(f"{column} = ?")
+            params.append(filters[column])
+
+    equipment = filters.get('equipment')
+    if equipment == 'null':
+        clauses.append("equipment IS NULL")
+    elif equipment:
+        clauses.append("equipment = ?")
+        params.append(equipment)
+
+    muscle = filters.get('primaryMuscle')
+    if muscle:
+        clauses.append("Exercise_ID IN (SELECT Exercise_ID FROM ExerciseMuscle WHERE muscle = ? AND role = 'primary')")
+        params.append(muscle.lower())
+
+    return (' WHERE ' + ' AND '.join(clauses)) if clauses else '', params
+
+
+def find_exercises(conn, filters):
+    """All exercises matching the filters, in ID order"""
+    where, params = build_exercise_where(filters)
+    return conn.execute(f"SELECT * FROM Exercise{where} ORDER BY Exercise_ID", params).fetchall()
+
+
+def page_exercises(conn, filters, per_page=10, cursor=None, page=1):
+    """
+    One page of matching exercises plus the cursor for the next page.
+    With a cursor (the last Exercise_ID seen) the page is a keyset seek;
+    without one, `page` is honoured with OFFSET for older clients.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    where, params = build_exercise_where(filters)
+    if cursor is not None:
+        where += (' AND ' if where else ' WHERE ') + "Exercise_ID > ?"
+        params.append(int(cursor))
+        offset = 0
+    else:
+        offset = (page - 1) * per_page
+
+    rows = conn.execute(
+        f"SELECT * FROM Exercise{where} ORDER BY Exercise_ID LIMIT ? OFFSET ?",
+        params + [per_page + 1, offset]
+    ).fetchall()
+
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        return rows, rows[-1]['Exercise_ID']
+    return rows, None
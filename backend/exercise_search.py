@@ -0,0 +1,93 @@
+# Full-text exercise search for NextGenFitness
+#
+# ExerciseSearch is an FTS5 index over Exercise (external content, so the
+# text is not stored twice) kept in sync by triggers. Queries are turned into
+# prefix terms ("ham" "cur" -> ham* AND cur*) and ranked with bm25, name
+# matches weighing most. If the SQLite build has no FTS5, search falls back
+# to the old name LIKE match.
+
+import re
+import sqlite3
+
+SEARCH_COLUMNS = ('name', 'primaryMuscles', 'equipment', 'instructions')
+# bm25 column weights, in SEARCH_COLUMNS order
+SEARCH_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def create_search_index(cursor):
+    """
+    Create the FTS5 table and its sync triggers; returns False when FTS5 is unavailable.
+    The index is built from the existing rows the first time it is created.
+    """
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'ExerciseSearch'")
+    exists = cursor.fetchone() is not None
+    columns = ', '.join(SEARCH_COLUMNS)
+    new_columns = ', '.join(f"new.{col}" for col in SEARCH_COLUMNS)
+    old_columns = ', '.join(f"old.{col}" for col in SEARCH_COLUMNS)
+
+    try:
+        cursor.execute(f'''CREATE VIRTUAL TABLE IF NOT EXISTS ExerciseSearch USING fts5(
+                        {columns},
+                        content = 'Exercise',
+                        content_rowid = 'Exercise_ID',
+                        prefix = '2 3',
+                        tokenize = 'unicode61 remove_diacritics 2')''')
+    except sqlite3.OperationalError:
+        return False
+
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS Exercise_search_ai AFTER INSERT ON Exercise BEGIN
+                        INSERT INTO ExerciseSearch (rowid, {columns})
+                        VALUES (new.Exercise_ID, {new_columns});
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS Exercise_search_ad AFTER DELETE ON Exercise BEGIN
+                        INSERT INTO ExerciseSearch (ExerciseSearch, rowid, {columns})
+                        VALUES ('delete', old.Exercise_ID, {old_columns});
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER IF NOT EXISTS Exercise_search_au AFTER UPDATE ON Exercise BEGIN
+                        INSERT INTO ExerciseSearch (ExerciseSearch, rowid, {columns})
+                        VALUES ('delete', old.Exercise_ID, {old_columns});
+                        INSERT INTO ExerciseSearch (rowid, {columns})
+                        VALUES (new.Exercise_ID, {new_columns});
+                    END''')
+
+    if not exists:
+        cursor.execute("INSERT INTO ExerciseSearch (ExerciseSearch) VALUES ('rebuild')")
+    return True
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query of quoted prefix terms, or None if it has no words"""
+    tokens = _TOKEN.findall(text.lower())
+    if not tokens:
+        return None
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def search_exercises(conn, text, limit=10, offset=0):
+    """
+    Exercise rows matching `text`, best first, paginated in SQL.
+    An empty query lists exercises in ID order, like the old LIKE '%%' search.
+    """
+    match = build_match_query(text)
+    if match is not None:
+        weights = ', '.join(str(w) for w in SEARCH_WEIGHTS)
+        try:
+            return conn.execute(f'''
+                SELECT e.*
+                FROM ExerciseSearch s
+                JOIN Exercise e ON e.Exercise_ID = s.rowid
+                WHERE ExerciseSearch MATCH ?
+                ORDER BY bm25(ExerciseSearch, {weights}), e.Exercise_ID
+                LIMIT ? OFFSET ?
+            ''', (match, limit, offset)).fetchall()
+        except sqlite3.OperationalError:
+            pass  # no FTS5 index in this database
+
+    return conn.execute('''
+        SELECT * FROM Exercise
+        WHERE LOWER(name) LIKE ?
+        ORDER BY Exercise_ID
+        LIMIT ? OFFSET ?
+    ''', ('%' + text.lower() + '%', limit, offset)).fetchall()
@@ -0,0 +1,152 @@
+# Exercise similarity index for NextGenFitness
+#
+# Every exercise is encoded as one row of a NumPy feature matrix: its primary
+# and secondary muscles (from ExerciseMuscle) plus one-hot equipment,
+# mechanic, level and force. Rows are L2-normalised, so the cosine similarity
+# of one exercise against all others is a single matrix-vector product.
+# The index backs the substitute-exercise endpoint and orders the rotation of
+# generated plans so consecutive workout days work different muscle groups.
+# It is rebuilt lazily after the exercise catalog is invalidated.
+
+import threading
+
+import numpy as np
+
+# Relative weight of each feature group in the similarity score
+FEATURE_WEIGHTS = {
+    'primary': 1.0,
+    'secondary': 0.5,
+    'equipment': 0.6,
+    'mechanic': 0.3,
+    'level': 0.3,
+    'force': 0.4,
+}
+CATEGORICAL_FEATURES = ('equipment', 'mechanic', 'level', 'force')
+SAME_DAY_PENALTY = 4.0  # weight of muscle overlap within one workout day vs. across the plan
+
+
+class ExerciseSimilarity:
+    """
+    Feature matrix over the Exercise table.
+    get_connection: callable returning a DB connection (the app's pool checkout)
+    """
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._generation = 0
+        # Swapped as a whole on reload:
+        # (Exercise_IDs, Exercise_ID -> matrix row, normalised features, muscle weights per exercise)
+        self._state = (np.zeros(0, dtype=np.int64), {}, np.zeros((0, 0), np.float32), np.zeros((0, 0), np.float32))
+
+    def load(self):
+        """(Re)build the feature matrix from Exercise and ExerciseMuscle"""
+        generation = self._generation
+        conn = self.get_connection()
+        try:
+            rows = conn.execute('''
+                SELECT Exercise_ID, equipment, mechanic, level, force
+                FROM Exercise ORDER BY Exercise_ID
+            ''').fetchall()
+            muscle_rows = conn.execute("SELECT muscle, Exercise_ID, role FROM ExerciseMuscle").fetchall()
+        finally:
+            conn.close()
+
+        ids = np.array([row[0] for row in rows], dtype=np.int64)
+        position = {exercise_id: i for i, exercise_id in enumerate(ids.tolist())}
+        muscles = sorted({row[0] for row in muscle_rows})
+        muscle_column = {muscle: j for j, muscle in enumerate(muscles)}
+
+        # Muscle block: one column per muscle, primary and secondary weighted apart
+        load = np.zeros((len(ids), len(muscles)), dtype=np.float32)
+        for muscle, exercise_id, role in muscle_rows:
+            i = position.get(exercise_id)
+            if i is not None:
+                weight = FEATURE_WEIGHTS['primary' if role == 'primary' else 'secondary']
+                load[i, muscle_column[muscle]] = max(load[i, muscle_column[muscle]], weight)
+
+        blocks = [load]
+        for k, feature in enumerate(CATEGORICAL_FEATURES, start=1):
+            values = [row[k] if row[k] not in (None, '', 'null') else None for row in rows]
+            vocabulary = {value: j for j, value in enumerate(sorted({v for v in values if v is not None}))}
+            block = np.zeros((len(ids), len(vocabulary)), dtype=np.float32)
+            for i, value in enumerate(values):
+                if value is not None:
+                    block[i, vocabulary[value]] = FEATURE_WEIGHTS[feature]
+            blocks.append(block)
+
+        features = np.hstack(blocks) if len(ids) else np.zeros((0, 0), np.float32)
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        features /= np.where(norms == 0, 1, norms)
+
+        with self._lock:
+            self._state = (ids, position, features, load)
+            self._loaded = generation == self._generation
+
+    def invalidate(self):
+        """Drop the matrix; the next lookup rebuilds it"""
+        with self._lock:
+            self._loaded = False
+            self._generation += 1
+
+    def _snapshot(self):
+        if not self._loaded:
+            self.load()
+        return self._state
+
+    def similar(self, exercise_id, k=5, candidates=None):
+        """
+        Top-k (Exercise_ID, cosine similarity) pairs for an exercise, best first,
+        optionally restricted to the candidate IDs. Raises KeyError for an unknown exercise.
+        """
+        ids, position, features, _ = self._snapshot()
+        scores = features @ features[position[exercise_id]]
+
+        mask = np.ones(len(ids), dtype=bool)
+        if candidates is not None:
+            mask[:] = False
+            mask[[position[c] for c in candidates if c in position]] = True
+        mask[position[exercise_id]] = False
+
+        eligible = np.flatnonzero(mask)
+        if not len(eligible) or k < 1:
+            return []
+        k = min(k, len(eligible))
+        top = eligible[np.argpartition(-scores[eligible], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def balanced_rotation(self, exercise_ids, exercises_per_day, rng=None):
+        """
+        Order exercise_ids so each workout day of exercises_per_day items hits
+        different muscles and muscle use stays even across the rotation. Each
+        slot picks the unused exercise whose muscles overlap least with the
+        current day (and then with everything picked so far); random jitter
+        breaks ties so plans for the same filters still differ.
+        """
+        _, position, _, load = self._snapshot()
+        rng = rng or np.random.default_rng()
+        known = [exercise_id for exercise_id in exercise_ids if exercise_id in position]
+        unknown = [exercise_id for exercise_id in exercise_ids if exercise_id not in position]
+        if not known:
+            return list(exercise_ids)
+
+        candidates = load[[position[exercise_id] for exercise_id in known]]
+        jitter = rng.random(len(known)) * 1e-3
+        available = np.ones(len(known), dtype=bool)
+        total_use = np.zeros(load.shape[1], dtype=np.float32)
+        day_use = np.zeros(load.shape[1], dtype=np.float32)
+
+        order = []
+        for slot in range(len(known)):
+            if slot % exercises_per_day == 0:
+                day_use[:] = 0
+            overlap = candidates @ (SAME_DAY_PENALTY * day_use + total_use / (slot + 1)) + jitter
+            overlap[~available] = np.inf
+            pick = int(np.argmin(overlap))
+            available[pick] = False
+            day_use += candidates[pick]
+            total_use += candidates[pick]
+            order.append(known[pick])
+        return order + unknown
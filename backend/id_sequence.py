@@ -0,0 +1,75 @@
+# Atomic ID sequences for NextGenFitness
+#
+# Every text primary key in the app looks like <prefix><number> (U001, DPL012,
+# MP1040 ...). Instead of reading the current maximum back through a text sort,
+# each sequence keeps its last issued number in the IdSequence table and is
+# advanced inside the caller's transaction, so an ID is only consumed when the
+# row that uses it is committed.
+
+# sequence name -> (table, id column, prefix)
+SEQUENCES = {
+    'user': ('User', 'user_id', 'U'),
+    'profile': ('Profile', 'profile_id', 'P'),
+    'goal': ('Goal', 'goal_id', 'G'),
+    'feedback': ('Feedback', 'feedback_id', 'F'),
+    'log': ('SystemLog', 'log_id', 'L'),
+    'diet_pref': ('UserDietPreference', 'diet_pref_id', 'DP'),
+    'report': ('Report', 'report_id', 'RP'),
+    'diet_plan': ('DietPlan', 'diet_plan_id', 'DPL'),
+    'meal_plan': ('MealPlan', 'meal_plan_id', 'MP'),
+    'progress': ('UserDietPlanProgress', 'progress_id', 'PRG'),
+    'logged_meal': ('LoggedMeal', 'meal_id', 'LM'),
+    'ingredient': ('Ingredient', 'ingredient_id', 'ING'),
+    'recipe': ('RecipeLibrary', 'recipe_id', 'RCP'),
+}
+
+ID_DIGITS = 3  # minimum zero padding, numbers past 999 simply get longer
+
+
+def create_sequence_table(cursor):
+    """Create the counters table used by all sequences"""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS IdSequence (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL) WITHOUT ROWID''')
+
+
+def format_id(name, number):
+    prefix = SEQUENCES[name][2]
+    return f"{prefix}{number:0{ID_DIGITS}d}"
+
+
+def _seed_sequence(conn, name):
+    """
+    Start a sequence at the highest numeric ID already in its table.
+    IDs with non-numeric suffixes (old uuid fallbacks) are ignored.
+    """
+    table, column, prefix = SEQUENCES[name]
+    conn.execute(f'''
+        INSERT OR IGNORE INTO IdSequence (name, value)
+        SELECT ?, COALESCE(MAX(CAST(SUBSTR({column}, ?) AS INTEGER)), 0)
+        FROM {table}
+        WHERE {column} GLOB ? AND SUBSTR({column}, ?) NOT GLOB '*[^0-9]*'
+    ''', (name, len(prefix) + 1, f"{prefix}[0-9]*", len(prefix) + 1))
+
+
+def allocate_ids(conn, name, count=1):
+    """
+    Reserve `count` consecutive IDs from a sequence in one round trip.
+    Runs on the caller's connection: the UPDATE takes the write lock, so
+    concurrent allocators are serialised, and a rollback returns the block.
+    """
+    if count < 1:
+        return []
+
+    cur = conn.execute("UPDATE IdSequence SET value = value + ? WHERE name = ?", (count, name))
+    if cur.rowcount == 0:
+        _seed_sequence(conn, name)
+        conn.execute("UPDATE IdSequence SET value = value + ? WHERE name = ?", (count, name))
+
+    last = conn.execute("SELECT value FROM IdSequence WHERE name = ?", (name,)).fetchone()[0]
+    return [format_id(name, number) for number in range(last - count + 1, last + 1)]
+
+
+def next_id(conn, name):
+    """Reserve a single ID from a sequence"""
+    return allocate_ids(conn, name, 1)[0]
@@ -0,0 +1,122 @@
+# Resized exercise image variants for NextGenFitness
+#
+# The exercise photos are full-resolution JPEGs, far larger than a list
+# thumbnail needs. A derivative is the photo fitted within size x size pixels
+# and re-encoded as WebP or JPEG. Derivatives are generated by a small thread
+# pool (Pillow releases the GIL while decoding and encoding) and stored on
+# disk under a key made from the original's content hash and the variant, so
+# a replaced photo never serves a stale derivative and identical photos share
+# one file. Later requests are served straight from the cache directory.
+
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageOps
+
+# Requested sizes are rounded up to one of these, which bounds the cache
+DERIVATIVE_SIZES = (64, 128, 256, 512, 1024)
+DERIVATIVE_FORMATS = {
+    # format name: (Pillow format, file extension, mimetype, save options)
+    'webp': ('WEBP', 'webp', 'image/webp', {'quality': 75, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', 'image/jpeg', {'quality': 80, 'optimize': True, 'progressive': True}),
+}
+DEFAULT_FORMAT = 'webp'
+GENERATE_TIMEOUT_SECONDS = 30
+
+
+def derivative_size(requested):
+    """Smallest supported size >= the requested one (the largest if it is bigger still)"""
+    try:
+        requested = int(requested)
+    except (TypeError, ValueError):
+        raise ValueError("size must be a positive number of pixels") from None
+    if requested < 1:
+        raise ValueError("size must be a positive number of pixels")
+    return next((size for size in DERIVATIVE_SIZES if size >= requested), DERIVATIVE_SIZES[-1])
+
+
+class ImageDerivatives:
+    """
+    On-disk cache of resized image variants.
+    cache_dir: where derivatives are written (created on first use).
+    """
+
+    def __init__(self, cache_dir, workers=2):
+        self.cache_dir = cache_dir
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-derivatives')
+        self._lock = threading.RLock()  # a done future runs its callback under the lock
+        self._pending = {}  # cache key -> Future, so concurrent requests share one render
+        self._digests = {}  # (source path, mtime_ns, size) -> content hash
+
+    def _content_digest(self, source_path):
+        stat = os.stat(source_path)
+        key = (source_path, stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(source_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 16), b''):
+                    sha.update(block)
+            digest = sha.hexdigest()[:32]
+            self._digests[key] = digest
+        return digest
+
+    def cache_path(self, source_path, size, fmt):
+        digest = self._content_digest(source_path)
+        extension = DERIVATIVE_FORMATS[fmt][1]
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}-{size}.{extension}")
+
+    def _render(self, source_path, target_path, size, fmt):
+        pillow_format, _, _, options = DERIVATIVE_FORMATS[fmt]
+        with Image.open(source_path) as image:
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((size, size), Image.LANCZOS)
+            if pillow_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            # Write to a temporary file first so readers never see a partial image
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(target_path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as out:
+                    image.save(out, pillow_format, **options)
+                os.replace(temp_path, target_path)
+            except BaseException:
+                os.unlink(temp_path)
+                raise
+        return target_path
+
+    def derive(self, source_path, size, fmt=None):
+        """
+        Path and mimetype of the derivative of source_path for a requested size
+        and format, generating it on the worker pool if it is not cached yet.
+        Raises ValueError for an unsupported size or format.
+        """
+        fmt = (fmt or DEFAULT_FORMAT).lower()
+        if fmt == 'jpg':
+            fmt = 'jpeg'
+        if fmt not in DERIVATIVE_FORMATS:
+            raise ValueError(f"format must be one of: {', '.join(DERIVATIVE_FORMATS)}")
+        size = derivative_size(size)
+        mimetype = DERIVATIVE_FORMATS[fmt][2]
+
+        target_path = self.cache_path(source_path, size, fmt)
+        if os.path.exists(target_path):
+            return target_path, mimetype
+
+        with self._lock:
+            future = self._pending.get(target_path)
+            if future is None:
+                future = self._pool.submit(self._render, source_path, target_path, size, fmt)
+                self._pending[target_path] = future
+                future.add_done_callback(lambda _: self._forget(target_path))
+        return future.result(timeout=GENERATE_TIMEOUT_SECONDS), mimetype
+
+    def _forget(self, target_path):
+        with self._lock:
+            self._pending.pop(target_path, None)
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
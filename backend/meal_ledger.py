@@ -0,0 +1,245 @@
+# Meal log for NextGenFitness
+#
+# Logging, editing and deleting a meal each run as one transaction on one
+# connection: the LoggedMeal change, the ID allocation and the day's
+# UserDietPlanProgress update commit or roll back together. BEGIN IMMEDIATE
+# takes the write lock up front, so two writers never both read and then
+# fight to upgrade. Daily progress moves by the calorie and meal-count delta
+# of the change instead of re-summing the user's whole day.
+#
+# History reads are paged by day: SQL groups one page of log dates with
+# their totals, then fetches only those days' meals.
+
+import json
+from datetime import date
+
+from id_sequence import next_id
+
+MEAL_FIELDS = ('meal_type', 'meal_name', 'calories', 'notes')
+HISTORY_DAYS = 30  # days per history page unless the caller asks for fewer/more
+MAX_HISTORY_DAYS = 366
+
+
+class MealNotFound(LookupError):
+    """Raised when an edit or delete names a meal that does not exist"""
+
+
+class MealLedger:
+    """
+    get_connection: callable returning a DB connection (the app's pool checkout).
+    When the caller already has a transaction open on that connection the
+    ledger joins it and leaves the commit to the caller.
+    """
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+
+    def _run(self, work, *args):
+        """work(cursor, *args) as a single transaction"""
+        conn = self.get_connection()
+        owns_transaction = not conn.in_transaction
+        try:
+            if owns_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+            result = work(conn.cursor(), *args)
+            if owns_transaction:
+                conn.commit()
+            return result
+        except Exception:
+            if owns_transaction:
+                conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def log(self, user_id, meal_type, meal_name, calories, notes='', diet_plan_id=None, log_date=None):
+        """
+        Record a meal (on the user's latest diet plan unless one is given) and
+        add it to that day's progress. Returns (meal_id, progress_id).
+        Raises ValueError if the user has no diet plan.
+        """
+        log_date = log_date or date.today().isoformat()
+        return self._run(self._log, user_id, meal_type, meal_name, float(calories), notes,
+                         diet_plan_id, log_date)
+
+    def edit(self, meal_id, changes):
+        """
+        Update a meal's type, name, calories or notes; a calorie change moves
+        the day's progress by the difference. Raises MealNotFound, or
+        ValueError if changes has none of those fields.
+        """
+        return self._run(self._edit, meal_id, changes)
+
+    def delete(self, meal_id):
+        """Remove a meal and take it off the day's progress. Raises MealNotFound."""
+        return self._run(self._delete, meal_id)
+
+    def history(self, user_id, date_from=None, date_to=None, limit=HISTORY_DAYS, cursor=None):
+        """
+        Up to `limit` logged days for a user, newest first, optionally within
+        [date_from, date_to] and before `cursor` (the last date of the
+        previous page). Returns (days, next_cursor): days is a list of
+        (log_date, total_calories, meal_count, [meal dicts]).
+        """
+        clauses, params = ["user_id = ?"], [user_id]
+        if date_from:
+            clauses.append("log_date >= ?")
+            params.append(date_from)
+        if date_to:
+            clauses.append("log_date <= ?")
+            params.append(date_to)
+        if cursor:
+            clauses.append("log_date < ?")
+            params.append(cursor)
+        where = ' AND '.join(clauses)
+
+        conn = self.get_connection()
+        try:
+            totals = conn.execute(f'''
+                SELECT log_date, SUM(calories) AS total_calories, COUNT(*) AS meal_count
+                FROM LoggedMeal WHERE {where}
+                GROUP BY log_date ORDER BY log_date DESC LIMIT ?
+            ''', params + [limit + 1]).fetchall()
+
+            next_cursor = None
+            if len(totals) > limit:
+                totals = totals[:limit]
+                next_cursor = totals[-1][0]
+            if not totals:
+                return [], None
+
+            meals = {}
+            for row in conn.execute('''
+                SELECT meal_id, diet_plan_id, meal_type, meal_name, calories, notes, created_at, log_date
+                FROM LoggedMeal
+                WHERE user_id = ? AND log_date BETWEEN ? AND ?
+                ORDER BY log_date DESC, created_at DESC
+            ''', (user_id, totals[-1][0], totals[0][0])):
+                meals.setdefault(row[7], []).append({
+                    'meal_id': row[0],
+                    'diet_plan_id': row[1],
+                    'meal_type': row[2],
+                    'meal_name': row[3],
+                    'calories': row[4],
+                    'notes': row[5],
+                    'logged_at': row[6],
+                })
+        finally:
+            conn.close()
+
+        return [(log_date, total, count, meals.get(log_date, [])) for log_date, total, count in totals], next_cursor
+
+    def _log(self, cursor, user_id, meal_type, meal_name, calories, notes, diet_plan_id, log_date):
+        if not diet_plan_id:
+            cursor.execute("SELECT diet_plan_id FROM DietPlan WHERE user_id = ? ORDER BY created_at DESC LIMIT 1",
+                           (user_id,))
+            latest = cursor.fetchone()
+            if latest is None:
+                raise ValueError('No active diet plan found for this user. Please create a diet plan first.')
+            diet_plan_id = latest[0]
+
+        cursor.execute('''
+            SELECT progress_id FROM UserDietPlanProgress
+            WHERE user_id = ? AND diet_plan_id = ? AND date = ?
+        ''', (user_id, diet_plan_id, log_date))
+        progress = cursor.fetchone()
+        if progress:
+            progress_id = progress[0]
+            self._shift_progress(cursor, progress_id, calories, 1)
+        else:
+            progress_id = next_id(cursor.connection, 'progress')
+            cursor.execute('''
+                INSERT INTO UserDietPlanProgress (progress_id, user_id, diet_plan_id, date, calories_consumed, meals_completed)
+                VALUES (?, ?, ?, ?, ?, 1)
+            ''', (progress_id, user_id, diet_plan_id, log_date, calories))
+
+        meal_id = next_id(cursor.connection, 'logged_meal')
+        cursor.execute('''
+            INSERT INTO LoggedMeal (meal_id, user_id, diet_plan_id, progress_id, meal_type, meal_name, calories, notes, log_date)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (meal_id, user_id, diet_plan_id, progress_id, meal_type, meal_name, calories, notes, log_date))
+        return meal_id, progress_id
+
+    def _edit(self, cursor, meal_id, changes):
+        meal = self._meal(cursor, meal_id)
+        fields = [field for field in MEAL_FIELDS if field in changes]
+        if not fields:
+            raise ValueError('No fields to update provided.')
+
+        values = [float(changes[field]) if field == 'calories' else changes[field] for field in fields]
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        cursor.execute(f"UPDATE LoggedMeal SET {assignments} WHERE meal_id = ?", values + [meal_id])
+
+        if 'calories' in changes:
+            delta = float(changes['calories']) - (meal['calories'] or 0)
+            if delta:
+                self._shift_meal_day(cursor, meal, delta, 0)
+
+    def _delete(self, cursor, meal_id):
+        meal = self._meal(cursor, meal_id)
+        cursor.execute("DELETE FROM LoggedMeal WHERE meal_id = ?", (meal_id,))
+        self._shift_meal_day(cursor, meal, -(meal['calories'] or 0), -1)
+
+    def _meal(self, cursor, meal_id):
+        cursor.execute('''
+            SELECT user_id, diet_plan_id, progress_id, calories, log_date
+            FROM LoggedMeal WHERE meal_id = ?
+        ''', (meal_id,))
+        meal = cursor.fetchone()
+        if meal is None:
+            raise MealNotFound(meal_id)
+        return meal
+
+    def _shift_progress(self, cursor, progress_id, calorie_delta, meal_delta):
+        cursor.execute('''
+            UPDATE UserDietPlanProgress
+            SET calories_consumed = MAX(calories_consumed + ?, 0),
+                meals_completed = MAX(meals_completed + ?, 0)
+            WHERE progress_id = ?
+        ''', (calorie_delta, meal_delta, progress_id))
+        return cursor.rowcount
+
+    def _shift_meal_day(self, cursor, meal, calorie_delta, meal_delta):
+        """Apply a delta to the progress row the meal was counted in"""
+        if meal['progress_id'] and self._shift_progress(cursor, meal['progress_id'], calorie_delta, meal_delta):
+            return
+
+        # Meals logged before progress_id was recorded: fall back to the
+        # user's row for that day, or recount the day into a new one
+        cursor.execute("SELECT progress_id FROM UserDietPlanProgress WHERE user_id = ? AND date = ?",
+                       (meal['user_id'], meal['log_date']))
+        progress = cursor.fetchone()
+        if progress:
+            self._shift_progress(cursor, progress[0], calorie_delta, meal_delta)
+            return
+
+        diet_plan_id = meal['diet_plan_id']
+        if not diet_plan_id:
+            cursor.execute("SELECT diet_plan_id FROM DietPlan WHERE user_id = ? ORDER BY created_at DESC LIMIT 1",
+                           (meal['user_id'],))
+            latest = cursor.fetchone()
+            if latest is None:
+                return  # no plan to attach a progress row to
+            diet_plan_id = latest[0]
+        cursor.execute('''
+            INSERT INTO UserDietPlanProgress (progress_id, user_id, diet_plan_id, date, calories_consumed, meals_completed)
+            SELECT ?, ?, ?, ?, COALESCE(SUM(calories), 0), COUNT(*)
+            FROM LoggedMeal WHERE user_id = ? AND log_date = ?
+        ''', (next_id(cursor.connection, 'progress'), meal['user_id'], diet_plan_id, meal['log_date'],
+              meal['user_id'], meal['log_date']))
+
+
+def iter_history_json(payload, days):
+    """
+    Stream a history response as JSON chunks: the scalar fields of `payload`,
+    then "logged_meals" and "daily_totals" objects written one day at a time.
+    """
+    head = json.dumps(payload)
+    yield head[:-1] + (', ' if payload else '') + '"logged_meals": {'
+    for i, (log_date, _, _, meals) in enumerate(days):
+        yield ('' if i == 0 else ', ') + json.dumps(log_date) + ': ' + json.dumps(meals)
+    yield '}, "daily_totals": {'
+    for i, (log_date, total_calories, meal_count, _) in enumerate(days):
+        totals = {'calories': total_calories, 'meals': meal_count}
+        yield ('' if i == 0 else ', ') + json.dumps(log_date) + ': ' + json.dumps(totals)
+    yield '}}'
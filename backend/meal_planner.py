@@ -0,0 +1,162 @@
+# Meal plan optimisation for NextGenFitness
+#
+# Picks one recipe per meal slot per day so each day's calories, protein,
+# carbs and fat land as close as possible to the plan targets. Each day is
+# built greedily slot by slot, then improved by a bounded local search that
+# swaps single meals. Variety rules: a recipe is used at most once per day,
+# not in the same slot on consecutive days, and only a few times per slot over
+# the plan (each relaxed only when the slot has too few recipes).
+# Work is bounded by CANDIDATE_LIMIT and MAX_ITERATIONS; with a seed the plan
+# is reproducible (TIME_LIMIT_SECONDS is only a safety net for huge inputs).
+
+import json
+import random
+import time
+
+MACROS = ('calories', 'protein', 'carbs', 'fat')
+# Calories matter most; the macro grams refine the choice among similar days
+MACRO_WEIGHTS = {'calories': 4.0, 'protein': 2.0, 'carbs': 1.0, 'fat': 1.0}
+
+CANDIDATE_LIMIT = 200  # recipes sampled per greedy slot decision, keeps large libraries cheap
+SWAP_CANDIDATES = 48  # recipes sampled per local search move
+MAX_ITERATIONS = 3000  # local search moves for the whole plan (at most 8 per meal)
+TIME_LIMIT_SECONDS = 2.0
+MAX_REPEATS = 2  # uses of one recipe in one slot over the plan
+
+
+def recipe_macros(recipe):
+    """(calories, protein, carbs, fat) of a recipe dict"""
+    try:
+        nutrition = json.loads(recipe.get('nutrition_info') or '{}')
+    except (TypeError, ValueError):
+        nutrition = {}
+    calories = recipe.get('calories', nutrition.get('calories', 0)) or 0
+    return (float(calories), float(nutrition.get('protein', 0) or 0),
+            float(nutrition.get('carbs', 0) or 0), float(nutrition.get('fat', 0) or 0))
+
+
+class MealPlanner:
+    """
+    targets: daily {'calories', 'protein', 'carbs', 'fat'} (missing or zero
+    targets are ignored in the cost).
+    """
+
+    def __init__(self, targets, weights=None, seed=None, candidate_limit=CANDIDATE_LIMIT,
+                 max_iterations=MAX_ITERATIONS, time_limit=TIME_LIMIT_SECONDS, variety_window=1,
+                 max_repeats=MAX_REPEATS):
+        weights = weights or MACRO_WEIGHTS
+        self.terms = [(i, float(targets[m]), weights.get(m, 1.0))
+                      for i, m in enumerate(MACROS) if targets.get(m)]
+        self.rng = random.Random(seed)
+        self.candidate_limit = candidate_limit
+        self.max_iterations = max_iterations
+        self.time_limit = time_limit
+        self.variety_window = variety_window
+        self.max_repeats = max_repeats
+
+    def day_cost(self, totals):
+        """Weighted squared relative deviation of a day's totals from the targets"""
+        cost = 0.0
+        for i, target, weight in self.terms:
+            deviation = (totals[i] - target) / target
+            cost += weight * deviation * deviation
+        return cost
+
+    def _candidates(self, size, limit):
+        if size <= limit:
+            return range(size)
+        return self.rng.sample(range(size), limit)
+
+    def _allowed(self, keys, slot, index, day, picks, uses, max_uses):
+        """Variety rules for putting recipe `index` of `slot` on `day`"""
+        if uses[slot][index] >= max_uses[slot]:
+            return False
+        recipe_key = keys[slot][index]
+        for other_slot, other_index in enumerate(picks[day]):
+            if other_slot != slot and other_index is not None and keys[other_slot][other_index] == recipe_key:
+                return False  # same recipe twice in a day
+        window = min(self.variety_window, len(keys[slot]) - 1)
+        for back in range(1, window + 1):
+            if day - back >= 0 and picks[day - back][slot] == index:
+                return False
+            if day + back < len(picks) and picks[day + back][slot] == index:
+                return False
+        return True
+
+    def plan(self, slots, duration_days):
+        """
+        slots: ordered list of (meal_type, [recipe dicts]); empty slots are skipped.
+        Returns [{'meal_type', 'recipe', 'day'}] in day/slot order.
+        """
+        slots = [(meal_type, recipes) for meal_type, recipes in slots if recipes]
+        if not slots or duration_days < 1:
+            return []
+
+        macros = [[recipe_macros(r) for r in recipes] for _, recipes in slots]
+        keys = [[r.get('recipe_id', id(r)) for r in recipes] for _, recipes in slots]
+        slot_sizes = [len(recipes) for _, recipes in slots]
+        slot_count = len(slots)
+        picks = [[None] * slot_count for _ in range(duration_days)]
+        uses = [[0] * size for size in slot_sizes]
+        # Each recipe may repeat up to max_repeats times, or twice its even share on long plans
+        max_uses = [max(self.max_repeats, 2 * -(-duration_days // size)) for size in slot_sizes]
+        day_totals = [[0.0] * len(MACROS) for _ in range(duration_days)]
+
+        # 1. Greedy: fill each day slot by slot, assuming the remaining slots
+        #    will hit their even share of the targets
+        for day in range(duration_days):
+            totals = day_totals[day]
+            for s in range(slot_count):
+                remaining = slot_count - s - 1
+                best, best_cost = None, None
+                for index in self._candidates(slot_sizes[s], self.candidate_limit):
+                    if not self._allowed(keys, s, index, day, picks, uses, max_uses):
+                        continue
+                    trial = [totals[k] + macros[s][index][k] for k in range(len(MACROS))]
+                    projected = list(trial)
+                    for i, target, _ in self.terms:
+                        projected[i] += target * remaining / slot_count
+                    cost = self.day_cost(projected)
+                    if best_cost is None or cost < best_cost:
+                        best, best_cost = index, cost
+                if best is None:  # variety rules cannot be met, take any recipe
+                    best = self.rng.randrange(slot_sizes[s])
+                picks[day][s] = best
+                uses[s][best] += 1
+                for k in range(len(MACROS)):
+                    totals[k] += macros[s][best][k]
+
+        # 2. Local search: swap single meals while it lowers that day's cost,
+        #    stopping early once a full round of moves finds nothing better
+        meal_count = duration_days * slot_count
+        deadline = time.perf_counter() + self.time_limit
+        stale = 0
+        for _ in range(min(self.max_iterations, 8 * meal_count)):
+            if stale >= meal_count or time.perf_counter() > deadline:
+                break
+            day = self.rng.randrange(duration_days)
+            s = self.rng.randrange(slot_count)
+            totals = day_totals[day]
+            current = picks[day][s]
+            base = [totals[k] - macros[s][current][k] for k in range(len(MACROS))]
+            best, best_cost = current, self.day_cost(totals)
+            for index in self._candidates(slot_sizes[s], SWAP_CANDIDATES):
+                if index == current or not self._allowed(keys, s, index, day, picks, uses, max_uses):
+                    continue
+                cost = self.day_cost([base[k] + macros[s][index][k] for k in range(len(MACROS))])
+                if cost < best_cost:
+                    best, best_cost = index, cost
+            if best == current:
+                stale += 1
+            else:
+                stale = 0
+                picks[day][s] = best
+                uses[s][current] -= 1
+                uses[s][best] += 1
+                day_totals[day] = [base[k] + macros[s][best][k] for k in range(len(MACROS))]
+
+        return [
+            {'meal_type': slots[s][0], 'recipe': slots[s][1][picks[day][s]], 'day': day + 1}
+            for day in range(duration_days)
+            for s in range(slot_count)
+        ]
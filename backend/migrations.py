@@ -0,0 +1,394 @@
+# Versioned schema migrations for NextGenFitness
+#
+# The schema version is kept in PRAGMA user_version. Startup reads it (a
+# single header read) and only when it is behind len(MIGRATIONS) applies the
+# pending migrations, all in one transaction together with the new version.
+# BEGIN IMMEDIATE makes concurrent workers wait for the first one to finish
+# instead of running the same DDL twice.
+#
+# Migrations are append-only: once one has shipped, change the schema by
+# adding a new function to MIGRATIONS rather than editing it. Migration 1 is
+# the baseline and uses IF NOT EXISTS and guarded ALTERs so that it adopts
+# databases created before migrations existed, including the shipped
+# NextGenFitness.db.
+
+import logging
+
+from dietary_rollups import create_dietary_rollups, create_preference_rollups
+from exercise_query import create_exercise_detail_tables, create_exercise_indexes
+from exercise_search import create_search_index
+from id_sequence import create_sequence_table
+from plan_lifecycle import PLAN_ACTIVE, PLAN_COMPLETED, WORKOUT_PLAN_END
+from reminder_engine import create_reminder_tables
+from scheduler import create_job_tables
+from workout_indexes import create_workout_indexes
+from workout_schedule import PLAN_RULE_COLUMNS
+from workout_stats import create_workout_stats
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(cursor, table, columns):
+    """ALTER TABLE ... ADD COLUMN for each (name, declaration) the existing table lacks"""
+    cursor.execute(f"PRAGMA table_info({table})")
+    existing = {row[1] for row in cursor.fetchall()}
+    if not existing:
+        return  # table does not exist in this database
+    for name, declaration in columns:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {name} {declaration}")
+
+
+def create_user_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS User
+                    (user_id TEXT PRIMARY KEY,
+                    username TEXT NOT NULL,
+                    email TEXT UNIQUE NOT NULL,
+                    password TEXT NOT NULL,
+                    role INTEGER)''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Profile
+                    (profile_id TEXT PRIMARY KEY,
+                    user_id TEXT UNIQUE NOT NULL,
+                    full_name TEXT,
+                    age INTEGER,
+                    gender TEXT,
+                    height REAL,
+                    weight REAL,
+                    bmi REAL,
+                    location TEXT,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Goal
+                    (goal_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    workout_plan TEXT,
+                    diet_plan TEXT,
+                    goal_type TEXT,
+                    target_value REAL,
+                    current_value REAL,
+                    status TEXT,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS MealScans
+                    (meal_scan_id TEXT PRIMARY KEY,
+                    user_id TEXT,
+                    food_name TEXT,
+                    calories INTEGER,
+                    nutrients TEXT,
+                    image_path TEXT,
+                    timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Feedback (
+                    feedback_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    submitted_at DATE,
+                    category TEXT,
+                    feedback_text TEXT,
+                    status TEXT,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS FeedbackResponse (
+                    feedback_id TEXT NOT NULL,
+                    user_id TEXT NOT NULL,
+                    response_text TEXT,
+                    response_date DATE,
+                    PRIMARY KEY (feedback_id, user_id),
+                    FOREIGN KEY (feedback_id) REFERENCES Feedback(feedback_id),
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Report (
+                    report_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    created_at DATE,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS SystemLog (
+                    log_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    action TEXT,
+                    timestamp TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS notifications (
+                    notification_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    plan_id INTEGER,
+                    type TEXT NOT NULL,
+                    details TEXT,
+                    checked INTEGER DEFAULT 0,
+                    date TEXT NOT NULL,
+                    exercise_id INTEGER,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+
+def create_workout_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Exercise (
+                    Exercise_ID INTEGER PRIMARY KEY,
+                    name TEXT,
+                    level TEXT,
+                    mechanic TEXT,
+                    equipment TEXT,
+                    primaryMuscles TEXT,
+                    instructions TEXT,
+                    category INTEGER,
+                    images INTEGER)''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS WorkoutPlan (
+                    plan_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    duration_months INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    progress INTEGER DEFAULT 0,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+    add_missing_columns(cursor, 'WorkoutPlan', [('progress', 'INTEGER DEFAULT 0')])
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS WorkoutPlanExercise (
+                    Workout_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    plan_id INTEGER NOT NULL,
+                    Exercise_ID INTEGER NOT NULL,
+                    date TEXT,
+                    FOREIGN KEY (Exercise_ID) REFERENCES Exercise(Exercise_ID),
+                    FOREIGN KEY (plan_id) REFERENCES WorkoutPlan(plan_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseStatus (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    user_id TEXT NOT NULL,
+                    Exercise_ID INTEGER NOT NULL,
+                    plan_id INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    status TEXT NOT NULL CHECK (status IN ('completed', 'overdue')),
+                    FOREIGN KEY (user_id) REFERENCES User(user_id),
+                    FOREIGN KEY (Exercise_ID) REFERENCES Exercise(Exercise_ID),
+                    FOREIGN KEY (plan_id) REFERENCES WorkoutPlan(plan_id))''')
+
+
+def create_diet_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS DietPlan
+                    (diet_plan_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    plan_name TEXT,
+                    description TEXT,
+                    start_date DATE,
+                    end_date DATE,
+                    daily_calories INTEGER,
+                    protein_grams INTEGER,
+                    carbs_grams INTEGER,
+                    fat_grams INTEGER,
+                    fiber_grams INTEGER,
+                    duration_days INTEGER DEFAULT 7,
+                    status TEXT DEFAULT 'Active',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS MealPlan
+                    (meal_plan_id TEXT PRIMARY KEY,
+                    diet_plan_id TEXT NOT NULL,
+                    day_number INTEGER NOT NULL,
+                    meal_type TEXT NOT NULL,
+                    recipe_id TEXT NOT NULL,
+                    serving_size REAL DEFAULT 1.0,
+                    calories INTEGER,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id),
+                    FOREIGN KEY (recipe_id) REFERENCES RecipeLibrary(recipe_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS UserDietPlanProgress
+                    (progress_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    diet_plan_id TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    calories_consumed INTEGER DEFAULT 0,
+                    meals_completed INTEGER DEFAULT 0,
+                    weight REAL,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id),
+                    FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS LoggedMeal (
+                    meal_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    diet_plan_id TEXT,
+                    progress_id TEXT,
+                    meal_type TEXT NOT NULL,
+                    meal_name TEXT NOT NULL,
+                    calories REAL NOT NULL,
+                    notes TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id),
+                    FOREIGN KEY (diet_plan_id) REFERENCES DietPlan(diet_plan_id),
+                    FOREIGN KEY (progress_id) REFERENCES UserDietPlanProgress(progress_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS UserDietPreference
+                    (diet_pref_id TEXT PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    diet_type TEXT,
+                    dietary_goal TEXT,
+                    allergies TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (user_id) REFERENCES User(user_id))''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS Ingredient (
+                    ingredient_id TEXT PRIMARY KEY,
+                    name TEXT NOT NULL UNIQUE,
+                    category TEXT,
+                    nutritional_value TEXT,
+                    allergen_info TEXT)''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS RecipeLibrary (
+                    recipe_id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL,
+                    description TEXT,
+                    ingredients TEXT,
+                    instructions TEXT,
+                    nutrition_info TEXT,
+                    image_url TEXT)''')
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS DietPreferenceIngredient (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    diet_pref_id TEXT NOT NULL,
+                    ingredient_id TEXT NOT NULL,
+                    preference_type TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (diet_pref_id) REFERENCES UserDietPreference(diet_pref_id),
+                    FOREIGN KEY (ingredient_id) REFERENCES Ingredient(ingredient_id))''')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_diet_plan_user ON DietPlan(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_meal_plan_diet ON MealPlan(diet_plan_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_progress_user_date ON UserDietPlanProgress(user_id, date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_progress_diet_plan ON UserDietPlanProgress(diet_plan_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_diet_pref_user ON UserDietPreference(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_recipe_title ON RecipeLibrary(title)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logged_meal_user ON LoggedMeal(user_id)')
+
+
+def migration_1_baseline(cursor):
+    """Every table the routes use, plus the indexes, triggers and counters added so far"""
+    create_user_tables(cursor)
+    create_workout_tables(cursor)
+    create_diet_tables(cursor)
+
+    # Counters behind generate_*_id
+    create_sequence_table(cursor)
+
+    # Per-plan "checked through" dates for overdue detection, and the
+    # scheduler's record of daily job runs
+    create_reminder_tables(cursor)
+    create_job_tables(cursor)
+
+    # Full-text index behind /search and the filter indexes/ExerciseMuscle
+    # table behind the listings and plan generation
+    create_search_index(cursor)
+    create_exercise_indexes(cursor)
+
+    # Schedule-rule storage for workout plans (see workout_schedule.ScheduleRule)
+    add_missing_columns(cursor, 'WorkoutPlan', PLAN_RULE_COLUMNS)
+
+    # Indexes behind the plan, reminder and notification lookups
+    # (query_plan_check.py fails if one of those queries scans again)
+    create_workout_indexes(cursor)
+
+    # Trigger-maintained progress counters and global workout analytics
+    create_workout_stats(cursor)
+
+
+def migration_2_exercise_details(cursor):
+    """Exercise.force plus the instruction/image/import-state tables of exercise_importer.py"""
+    add_missing_columns(cursor, 'Exercise', [('force', 'TEXT')])
+    create_exercise_detail_tables(cursor)
+
+
+def migration_3_logged_meal_log_date(cursor):
+    """
+    LoggedMeal.log_date: the meal's day as 'YYYY-MM-DD', so daily totals,
+    history and analytics filter on a plain indexed column instead of
+    date(created_at). Existing rows are backfilled from created_at, and a
+    trigger fills it for inserts that do not set it.
+    """
+    add_missing_columns(cursor, 'LoggedMeal', [('log_date', 'TEXT')])
+    cursor.execute("UPDATE LoggedMeal SET log_date = date(created_at) WHERE log_date IS NULL")
+    cursor.execute('''CREATE TRIGGER IF NOT EXISTS LoggedMeal_log_date_ai AFTER INSERT ON LoggedMeal
+                    WHEN new.log_date IS NULL BEGIN
+                        UPDATE LoggedMeal SET log_date = date(new.created_at) WHERE meal_id = new.meal_id;
+                    END''')
+
+    # (user_id, log_date) replaces the user_id-only index; log_date alone serves the cross-user analytics
+    cursor.execute('DROP INDEX IF EXISTS idx_logged_meal_user')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logged_meal_user_date ON LoggedMeal(user_id, log_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_logged_meal_date ON LoggedMeal(log_date)')
+
+
+def migration_4_plan_lifecycle(cursor):
+    """WorkoutPlan.status and the index behind the nightly expired-plan sweep (plan_lifecycle.py)"""
+    add_missing_columns(cursor, 'WorkoutPlan', [('status', f"TEXT DEFAULT '{PLAN_ACTIVE}'")])
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_diet_plan_status_end ON DietPlan(status, end_date)')
+
+
+def migration_5_dietary_rollups(cursor):
+    """Daily rollup tables and triggers behind the admin dietary analytics (dietary_rollups.py)"""
+    create_dietary_rollups(cursor)
+
+
+def migration_6_workout_plan_end(cursor):
+    """
+    Materialized plans record their first workout date in start_date, and
+    plans the sweep completed before their last scheduled workout reopen.
+    """
+    cursor.execute('''
+        UPDATE WorkoutPlan
+        SET start_date = (SELECT MIN(date) FROM WorkoutPlanExercise WHERE plan_id = WorkoutPlan.plan_id)
+        WHERE start_date IS NULL AND COALESCE(storage, 'materialized') <> 'rule'
+    ''')
+    cursor.execute(f'''
+        UPDATE WorkoutPlan SET status = ?
+        WHERE status = ? AND {WORKOUT_PLAN_END} > date('now', 'localtime')
+    ''', (PLAN_ACTIVE, PLAN_COMPLETED))
+
+
+def migration_7_preference_rollups(cursor):
+    """Dietary goal and allergy counts for the admin analytics (dietary_rollups.py)"""
+    create_preference_rollups(cursor)
+
+
+# Position + 1 is the schema version a migration brings the database to
+MIGRATIONS = [
+    migration_1_baseline,
+    migration_2_exercise_details,
+    migration_3_logged_meal_log_date,
+    migration_4_plan_lifecycle,
+    migration_5_dietary_rollups,
+    migration_6_workout_plan_end,
+    migration_7_preference_rollups,
+]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply the pending migrations in one transaction. Returns how many were applied."""
+    target = len(migrations)
+    current = schema_version(conn)
+    if current >= target:
+        if current > target:
+            logger.warning("Database schema version %s is newer than this code (%s)", current, target)
+        return 0
+
+    conn.commit()  # BEGIN needs a connection without an open transaction
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        current = schema_version(conn)  # another worker may have migrated while we waited
+        cursor = conn.cursor()
+        for version in range(current + 1, target + 1):
+            migrations[version - 1](cursor)
+            logger.info("Applied schema migration %s (%s)", version, migrations[version - 1].__name__)
+        cursor.execute(f"PRAGMA user_version = {max(current, target)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return max(0, target - current)
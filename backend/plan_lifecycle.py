@@ -0,0 +1,44 @@
+# Plan lifecycle sweep for NextGenFitness
+#
+# Diet plans end on their end_date and workout plans the day after their last
+# scheduled workout. Instead of read endpoints flipping a plan's status when
+# its owner happens to look, a daily scheduler job completes every expired
+# plan with one UPDATE per table, and the read paths only read. The reminder
+# jobs skip completed workout plans once they have been fully checked.
+
+from datetime import date
+
+from workout_schedule import CADENCE_DAYS, PLAN_STORAGE_RULE, WORKOUT_DAYS_PER_MONTH
+
+PLAN_ACTIVE = 'Active'
+PLAN_COMPLETED = 'Completed'
+
+# Last scheduled workout date of a WorkoutPlan row (alias-free, so it can be
+# used on WorkoutPlan directly): rule plans compute it from their rule,
+# materialized plans read it from their rows
+WORKOUT_PLAN_LAST_DATE = f"""
+    CASE WHEN WorkoutPlan.storage = '{PLAN_STORAGE_RULE}'
+         THEN date(WorkoutPlan.start_date, '+' || ((WorkoutPlan.duration_months * {WORKOUT_DAYS_PER_MONTH} - 1)
+                   * COALESCE(WorkoutPlan.cadence_days, {CADENCE_DAYS})) || ' days')
+         ELSE (SELECT MAX(date) FROM WorkoutPlanExercise WHERE plan_id = WorkoutPlan.plan_id)
+    END"""
+
+# First day (YYYY-MM-DD) on which a WorkoutPlan row has ended
+WORKOUT_PLAN_END = f"date({WORKOUT_PLAN_LAST_DATE}, '+1 day')"
+
+
+def expire_plans(conn, today=None):
+    """
+    Mark every active plan that has ended by `today` ('YYYY-MM-DD', default
+    today) as completed. Returns the number of diet and workout plans changed.
+    """
+    today = today or date.today().isoformat()
+    diet_plans = conn.execute('''
+        UPDATE DietPlan SET status = ?
+        WHERE status = ? AND end_date <= ?
+    ''', (PLAN_COMPLETED, PLAN_ACTIVE, today)).rowcount
+    workout_plans = conn.execute(f'''
+        UPDATE WorkoutPlan SET status = ?
+        WHERE status = ? AND {WORKOUT_PLAN_END} <= ?
+    ''', (PLAN_COMPLETED, PLAN_ACTIVE, today)).rowcount
+    return {'diet_plans': diet_plans, 'workout_plans': workout_plans}
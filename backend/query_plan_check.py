@@ -0,0 +1,140 @@
+# Query plan regression check for the workout and meal log tables
+#
+# Copies the database into memory, applies the schema migrations the app
+# runs at startup, then runs EXPLAIN QUERY PLAN for each hot plan, reminder,
+# notification and meal log query. The reminder engine's queries are
+# captured by running its per-user functions (rolled back afterwards), so
+# they are checked exactly as the app issues them. Exits with status 1 if
+# any query reads a table with a full SCAN.
+#
+#   python query_plan_check.py [path/to/NextGenFitness.db]
+
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+
+from migrations import migrate
+from reminder_engine import create_daily_reminders, mark_overdue_exercises
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, 'NextGenFitness.db')
+
+# Queries issued by request handlers in NextGenFItness.py and diet_plan_system.py (keep in sync).
+# Parameters are filled from a sample plan: :user_id, :plan_id, :date.
+HOT_QUERIES = [
+    ('user plans', "SELECT * FROM WorkoutPlan WHERE user_id = :user_id"),
+    ('latest user plan', "SELECT * FROM WorkoutPlan WHERE user_id = :user_id ORDER BY plan_id DESC LIMIT 1"),
+    ('plan exercises on a date',
+     "SELECT Exercise_ID FROM WorkoutPlanExercise WHERE plan_id = :plan_id AND date = :date"),
+    ('plan dates', "SELECT DISTINCT date FROM WorkoutPlanExercise WHERE plan_id = :plan_id ORDER BY date"),
+    ('plan date detail', '''
+        SELECT w.Workout_id, w.exercise_id, w.date, e.*
+        FROM WorkoutPlanExercise w
+        JOIN Exercise e ON w.exercise_id = e.Exercise_ID
+        WHERE w.plan_id = :plan_id AND w.date = :date'''),
+    ('exercise status lookup', '''
+        SELECT * FROM ExerciseStatus
+        WHERE user_id = :user_id AND exercise_id = :exercise_id AND plan_id = :plan_id AND date = :date'''),
+    ('user notifications', '''
+        SELECT notification_id, user_id, plan_id, type, checked, details, exercise_id, date
+        FROM notifications WHERE user_id = :user_id ORDER BY date DESC'''),
+    ("today's reminder plans", '''
+        SELECT COUNT(DISTINCT plan_id) AS plans FROM notifications
+        WHERE user_id = :user_id AND date = :date AND type = 'daily reminder' '''),
+    ('delete user plan exercises', '''
+        DELETE FROM WorkoutPlanExercise
+        WHERE plan_id IN (SELECT plan_id FROM WorkoutPlan WHERE user_id = :user_id)'''),
+    # diet_plan_system.py
+    ('daily meal totals', '''
+        SELECT SUM(calories) AS total_calories, COUNT(meal_id) AS total_meals
+        FROM LoggedMeal WHERE user_id = :user_id AND log_date = :date'''),
+    ('logged meal history days', '''
+        SELECT log_date, SUM(calories) AS total_calories, COUNT(*) AS meal_count FROM LoggedMeal
+        WHERE user_id = :user_id AND log_date < :date GROUP BY log_date ORDER BY log_date DESC LIMIT 31'''),
+    ('logged meal history meals', '''
+        SELECT meal_id, meal_type, meal_name, calories, created_at, log_date FROM LoggedMeal
+        WHERE user_id = :user_id AND log_date BETWEEN :date AND :date ORDER BY log_date DESC, created_at DESC'''),
+    ('meal type distribution', '''
+        SELECT meal_type, COUNT(*) AS count FROM LoggedMeal
+        WHERE log_date BETWEEN :date AND :date GROUP BY meal_type'''),
+]
+
+ALLOWED_SCANS = ('SCAN CONSTANT ROW',)  # INSERT ... SELECT without a FROM clause
+
+
+def scanned_tables(conn, sql, params=()):
+    """Plan steps of a statement that read a whole table"""
+    steps = [row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+    return [step for step in steps if step.startswith('SCAN ') and step not in ALLOWED_SCANS]
+
+
+def traced_statements(conn, func, *args):
+    """Distinct statements func(conn, *args) executes, with their values inlined; its changes are rolled back"""
+    statements = {}
+
+    def record(sql):
+        sql = sql.strip()
+        if sql.split(None, 1)[0].upper() in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            shape = re.sub(r"'(?:[^']|'')*'|\b\d+\b", '?', sql)
+            statements.setdefault(shape, sql)
+
+    conn.execute('SAVEPOINT query_plan_check')
+    conn.set_trace_callback(record)
+    try:
+        func(conn, *args)
+    finally:
+        conn.set_trace_callback(None)
+        conn.execute('ROLLBACK TO query_plan_check')
+        conn.execute('RELEASE query_plan_check')
+    return list(statements.values())
+
+
+def sample_params(conn):
+    row = conn.execute('''
+        SELECT wp.user_id, wp.plan_id, wpe.Exercise_ID, wpe.date
+        FROM WorkoutPlanExercise wpe JOIN WorkoutPlan wp ON wp.plan_id = wpe.plan_id
+        LIMIT 1
+    ''').fetchone()
+    if row is None:
+        return {'user_id': 'U001', 'plan_id': 1, 'exercise_id': 1, 'date': datetime.now().strftime('%Y-%m-%d')}
+    return {'user_id': row[0], 'plan_id': row[1], 'exercise_id': row[2], 'date': row[3]}
+
+
+def check_query_plans(db_path=DEFAULT_DB):
+    """[(query name, scanned steps)] for every hot query that scans"""
+    source = sqlite3.connect(db_path)
+    conn = sqlite3.connect(':memory:')
+    source.backup(conn)
+    source.close()
+    conn.row_factory = sqlite3.Row
+
+    migrate(conn)
+
+    params = sample_params(conn)
+    checks = [(name, sql, params) for name, sql in HOT_QUERIES]
+    engine_calls = [
+        ('overdue check', mark_overdue_exercises, params['user_id'], params['date']),
+        ("plan's daily reminders", create_daily_reminders, params['date'], params['user_id'], params['plan_id']),
+    ]
+    for name, func, *args in engine_calls:
+        for i, sql in enumerate(traced_statements(conn, func, *args), 1):
+            checks.append((f'{name} #{i}', sql, ()))
+
+    failures = []
+    for name, sql, query_params in checks:
+        scans = scanned_tables(conn, sql, query_params)
+        print(f"{'SCAN' if scans else 'ok  '}  {name}" + (f"  ({'; '.join(scans)})" if scans else ''))
+        if scans:
+            failures.append((name, scans))
+    conn.close()
+    return failures
+
+
+if __name__ == '__main__':
+    failures = check_query_plans(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB)
+    if failures:
+        print(f"{len(failures)} hot queries scan a table")
+        sys.exit(1)
+    print("All hot queries use an index")
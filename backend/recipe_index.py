@@ -0,0 +1,231 @@
+# Recipe eligibility index for diet plan generation
+#
+# Recipes, their parsed ingredients and macros, and the ingredient allergen
+# table are read once and compiled into bitmasks: every ingredient name and
+# every allergen gets a bit, each recipe carries the OR of its ingredients'
+# bits, and each dietary preference has a mask of restricted ingredients.
+# Checking a recipe against a user is then a couple of AND operations, and
+# recipes are kept sorted by calories so the calorie window is a bisect.
+
+import json
+import threading
+from bisect import bisect_left, bisect_right
+
+# Ingredients a dietary preference rules out
+DIET_RESTRICTIONS = {
+    'vegetarian': {"chicken breast", "beef", "turkey breast", "salmon", "cod", "shrimp"},
+    'vegan': {"chicken breast", "beef", "turkey breast", "salmon", "cod", "shrimp",
+              "milk", "cheese", "egg", "greek yogurt", "mayonnaise", "butter", "yogurt"},
+    'pescatarian': {"chicken breast", "beef", "turkey breast"},
+    'halal': {"pork", "bacon", "ham", "lard", "gelatin (non-halal)"},
+    'kosher': {"pork", "shellfish", "shrimp", "bacon", "ham", "lobster"}
+}
+
+CALORIE_WINDOW = 400  # a recipe fits a meal within +/- this many calories
+
+BREAKFAST_WORDS = ['breakfast', 'omelette', 'pancake', 'cereal', 'yogurt', 'parfait',
+                   'toast', 'scramble', 'oatmeal', 'oats', 'banana', 'muffin', 'smoothie',
+                   'burrito', 'walnut', 'honey', 'wrap', 'egg salad']
+LUNCH_WORDS = ['salad', 'soup', 'sandwich', 'wrap', 'bowl', 'quinoa', 'stir fry', 'lentil']
+DINNER_WORDS = ['stew', 'pasta', 'rice', 'curry', 'grilled', 'roasted', 'dinner',
+                'alfredo', 'risotto', 'stuffed', 'baked', 'parmesan']
+
+
+def classify_meal_type(title, calories):
+    """Breakfast/lunch/dinner bucket of a recipe from its title, falling back to calories"""
+    title_lower = title.lower()
+    if any(word in title_lower for word in BREAKFAST_WORDS):
+        return 'breakfast'
+    if any(word in title_lower for word in LUNCH_WORDS):
+        return 'lunch'
+    if any(word in title_lower for word in DINNER_WORDS):
+        return 'dinner'
+    if calories < 300:
+        return 'breakfast'
+    if calories < 500:
+        return 'lunch'
+    return 'dinner'
+
+
+def fits_fitness_goal(fitness_goal, calories, protein):
+    """Macro rules per fitness goal (unknown goals accept everything)"""
+    if fitness_goal == "weight loss" and calories > 600:
+        return False  # skip high-calorie meals
+    if fitness_goal == "muscle gain" and protein < 20:
+        return False  # skip low-protein meals
+    if fitness_goal == "maintenance" and calories > 800:
+        return False
+    return True
+
+
+class RecipeEntry:
+    """A recipe compiled for eligibility checks"""
+
+    __slots__ = ('position', 'row', 'ingredients', 'nutrition', 'calories', 'protein',
+                 'ingredient_mask', 'allergen_mask', 'meal_type')
+
+    def __init__(self, position, row, ingredients, nutrition, ingredient_mask, allergen_mask):
+        self.position = position  # order in RecipeLibrary
+        self.row = row
+        self.ingredients = ingredients
+        self.nutrition = nutrition
+        self.calories = nutrition.get('calories', 0)
+        self.protein = nutrition.get('protein', 0)
+        self.ingredient_mask = ingredient_mask
+        self.allergen_mask = allergen_mask
+        self.meal_type = classify_meal_type(row['title'], self.calories)
+
+    def as_dict(self):
+        recipe = dict(self.row)
+        recipe['calories'] = self.calories
+        recipe['meal_type'] = self.meal_type
+        return recipe
+
+
+class RecipeIndex:
+    """
+    Compiled RecipeLibrary + Ingredient data. Loaded lazily on first use and
+    rebuilt after invalidate() (called whenever a recipe or ingredient changes).
+    """
+
+    def __init__(self, get_connection):
+        self.get_connection = get_connection
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._generation = 0
+        # Swapped as a whole on reload:
+        # (entries sorted by calories, their calories, ingredient bits,
+        #  allergen bits, diet masks, ingredient allergens)
+        self._state = ([], [], {}, {}, {}, {})
+        self.loads = 0
+
+    def load(self):
+        generation = self._generation
+        conn = self.get_connection()
+        try:
+            ingredient_rows = conn.execute("SELECT name, allergen_info FROM Ingredient").fetchall()
+            recipe_rows = conn.execute("SELECT * FROM RecipeLibrary").fetchall()
+        finally:
+            conn.close()
+
+        ingredient_bits = {}  # lowercase ingredient name -> bit
+        allergen_bits = {}  # allergen name -> bit
+        ingredient_allergens = {}  # ingredient name (as written) -> allergen
+
+        def ingredient_bit(name):
+            key = name.lower()
+            if key not in ingredient_bits:
+                ingredient_bits[key] = 1 << len(ingredient_bits)
+            return ingredient_bits[key]
+
+        for name, allergen_info in ingredient_rows:
+            if allergen_info and allergen_info.strip().lower() != "none":
+                allergen = allergen_info.strip()
+                ingredient_allergens[name.strip()] = allergen
+                allergen_bits.setdefault(allergen, 1 << len(allergen_bits))
+
+        entries = []
+        for position, row in enumerate(recipe_rows):
+            ingredients = [i.strip() for i in (row['ingredients'] or '').split(',')]
+            try:
+                nutrition = json.loads(row['nutrition_info'] or '{}')
+            except ValueError:
+                nutrition = {}
+
+            ingredient_mask = 0
+            allergen_mask = 0
+            for ingredient in ingredients:
+                ingredient_mask |= ingredient_bit(ingredient)
+                allergen = ingredient_allergens.get(ingredient)
+                if allergen:
+                    allergen_mask |= allergen_bits[allergen]
+            entries.append(RecipeEntry(position, dict(row), ingredients, nutrition, ingredient_mask, allergen_mask))
+
+        diet_masks = {}
+        for diet, restricted in DIET_RESTRICTIONS.items():
+            mask = 0
+            for name in restricted:
+                mask |= ingredient_bits.get(name, 0)
+            diet_masks[diet] = mask
+
+        entries.sort(key=lambda entry: entry.calories)
+        calories = [entry.calories for entry in entries]
+
+        with self._lock:
+            self._state = (entries, calories, ingredient_bits, allergen_bits, diet_masks, ingredient_allergens)
+            self._loaded = generation == self._generation
+            self.loads += 1
+
+    def _snapshot(self):
+        if not self._loaded:
+            self.load()
+        return self._state
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+            self._generation += 1
+
+    def allergen_map(self):
+        """Ingredient name -> allergen, for ingredients that have one"""
+        return dict(self._snapshot()[5])
+
+    def get(self, recipe_id):
+        """One recipe as a dict (with 'calories' and 'meal_type'), or None"""
+        for entry in self._snapshot()[0]:
+            if entry.row['recipe_id'] == recipe_id:
+                return entry.as_dict()
+        return None
+
+    def _allergy_mask(self, allergen_bits, allergies):
+        # allergies is the stored text (e.g. "Gluten, Nuts") or a list; a plain
+        # substring test on the text keeps matching what it always matched
+        mask = 0
+        for allergen, bit in allergen_bits.items():
+            if allergen in allergies:
+                mask |= bit
+        return mask
+
+    def eligible(self, calories_per_meal, preferences, rejections=None):
+        """
+        Recipes that fit one meal's calories and the user's allergies, diet,
+        fitness goal and ingredient dislikes, as dicts with 'calories' and
+        'meal_type' added. If `rejections` (a Counter) is given, it counts why
+        recipes in the calorie window were skipped.
+        """
+        entries, calories, ingredient_bits, allergen_bits, diet_masks, _ = self._snapshot()
+
+        allergies = preferences.get('allergies') or []
+        dietary_preference = (preferences.get('dietary_preference') or 'none').lower()
+        fitness_goal = (preferences.get('dietary_goal') or 'maintenance').lower()
+        ingredient_preferences = preferences.get('ingredient_preferences') or {}
+
+        allergy_mask = self._allergy_mask(allergen_bits, allergies)
+        diet_mask = diet_masks.get(dietary_preference, 0)
+        dislike_mask = 0
+        for name, pref in ingredient_preferences.items():
+            if pref and pref.lower() == 'dislike':
+                dislike_mask |= ingredient_bits.get(str(name).lower(), 0)
+
+        low = bisect_left(calories, calories_per_meal - CALORIE_WINDOW)
+        high = bisect_right(calories, calories_per_meal + CALORIE_WINDOW)
+        if rejections is not None:
+            rejections['calories'] += len(entries) - (high - low)
+
+        suitable = []
+        for entry in sorted(entries[low:high], key=lambda e: e.position):
+            if entry.allergen_mask & allergy_mask:
+                reason = 'allergen'
+            elif entry.ingredient_mask & diet_mask:
+                reason = 'diet'
+            elif not fits_fitness_goal(fitness_goal, entry.calories, entry.protein):
+                reason = 'diet'
+            elif entry.ingredient_mask & dislike_mask:
+                reason = 'disliked_ingredient'
+            else:
+                suitable.append(entry.as_dict())
+                continue
+            if rejections is not None:
+                rejections[reason] += 1
+
+        return suitable
@@ -0,0 +1,168 @@
+# Overdue exercise detection and daily reminders for NextGenFitness
+#
+# Every scheduled exercise on a past date (from the day the plan was created)
+# that has no ExerciseStatus row gets an 'overdue' row. Materialized plans are
+# handled by one anti-join INSERT ... SELECT; rule plans are expanded in Python
+# for just the unchecked days. ReminderWatermark remembers, per plan, the last
+# date already processed, so each check only looks at the days since the
+# previous one. Editing a plan's schedule resets its watermark.
+#
+# Daily reminders (a 'daily reminder' notification for each exercise scheduled
+# today that has no status yet) are created the same set-based way. Both work
+# for one user or for all users at once, as the nightly scheduler jobs do.
+# Completed plans (see plan_lifecycle) get no reminders, and are left out of
+# the overdue check once it has covered their last workout date.
+
+from datetime import datetime, timedelta
+
+from plan_lifecycle import PLAN_COMPLETED
+from workout_schedule import ScheduleRule
+
+
+def create_reminder_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ReminderWatermark (
+                    plan_id INTEGER PRIMARY KEY,
+                    checked_through TEXT NOT NULL)''')
+
+
+def reset_watermark(conn, plan_id):
+    """Make the next check rescan a plan from its start (after its schedule changed)"""
+    conn.execute("DELETE FROM ReminderWatermark WHERE plan_id = ?", (plan_id,))
+
+
+def daily_reminder_text(plan_id):
+    return f"Don't forget your workout for plan {plan_id} today! 🏋️‍♀️"
+
+
+def _plan_filter(user_id=None, plan_id=None):
+    """Extra WHERE terms on WorkoutPlan (alias wp) limiting work to one user and/or plan"""
+    clauses, params = [], []
+    if user_id is not None:
+        clauses.append("wp.user_id = ?")
+        params.append(user_id)
+    if plan_id is not None:
+        clauses.append("wp.plan_id = ?")
+        params.append(plan_id)
+    return ''.join(f" AND {clause}" for clause in clauses), params
+
+
+def mark_overdue_exercises(conn, user_id=None, today=None):
+    """
+    Insert 'overdue' ExerciseStatus rows for every past, unrecorded exercise
+    in the user's plans (every user's when user_id is None) and advance their
+    watermarks to yesterday.
+    Runs on the caller's connection and does not commit. Returns rows inserted.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    yesterday = (datetime.strptime(today, '%Y-%m-%d') - timedelta(days=1)).strftime('%Y-%m-%d')
+    plan_filter, filter_params = _plan_filter(user_id)
+
+    # 1. Materialized plans: one set-based insert for all unchecked past dates
+    inserted = conn.execute(f'''
+        INSERT INTO ExerciseStatus (user_id, Exercise_ID, plan_id, date, status)
+        SELECT DISTINCT wp.user_id, wpe.Exercise_ID, wpe.plan_id, wpe.date, 'overdue'
+        FROM WorkoutPlan wp
+        JOIN WorkoutPlanExercise wpe ON wpe.plan_id = wp.plan_id
+        LEFT JOIN ReminderWatermark w ON w.plan_id = wp.plan_id
+        WHERE COALESCE(wp.storage, 'materialized') <> 'rule'{plan_filter}
+          AND NOT (wp.status IS '{PLAN_COMPLETED}' AND w.checked_through >= (
+              SELECT MAX(date) FROM WorkoutPlanExercise last WHERE last.plan_id = wp.plan_id))
+          AND wpe.date >= SUBSTR(wp.created_at, 1, 10)
+          AND wpe.date < ?
+          AND (w.checked_through IS NULL OR wpe.date > w.checked_through)
+          AND NOT EXISTS (
+              SELECT 1 FROM ExerciseStatus es
+              WHERE es.user_id = wp.user_id AND es.plan_id = wpe.plan_id
+                AND es.Exercise_ID = wpe.Exercise_ID AND es.date = wpe.date)
+    ''', filter_params + [today]).rowcount
+
+    # 2. Rule plans: expand only the unchecked days
+    rule_plans = conn.execute(f'''
+        SELECT wp.*, w.checked_through
+        FROM WorkoutPlan wp
+        LEFT JOIN ReminderWatermark w ON w.plan_id = wp.plan_id
+        WHERE wp.storage = 'rule'{plan_filter}
+    ''', filter_params).fetchall()
+    for plan in rule_plans:
+        rule = ScheduleRule.from_plan_row(plan)
+        if plan['status'] == PLAN_COMPLETED and (plan['checked_through'] or '') >= rule.last_date():
+            continue
+        first = max(plan['created_at'][:10], plan['checked_through'] or '')
+        rows = {
+            (plan['user_id'], exercise_id, plan['plan_id'], workout_date)
+            for workout_date in rule.dates()
+            if first <= workout_date < today and workout_date != plan['checked_through']
+            for exercise_id in rule.exercises_on(workout_date)
+        }
+        if rows:
+            inserted += conn.executemany('''
+                INSERT INTO ExerciseStatus (user_id, Exercise_ID, plan_id, date, status)
+                SELECT ?1, ?2, ?3, ?4, 'overdue'
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM ExerciseStatus
+                    WHERE user_id = ?1 AND Exercise_ID = ?2 AND plan_id = ?3 AND date = ?4)
+            ''', sorted(rows, key=lambda r: (r[3], r[1]))).rowcount
+
+    # 3. Everything before today has now been checked
+    conn.execute(f'''
+        INSERT INTO ReminderWatermark (plan_id, checked_through)
+        SELECT wp.plan_id, ? FROM WorkoutPlan wp WHERE 1 = 1{plan_filter}
+        ON CONFLICT(plan_id) DO UPDATE SET checked_through = excluded.checked_through
+        WHERE excluded.checked_through > ReminderWatermark.checked_through
+    ''', [yesterday] + filter_params)
+    return inserted
+
+
+def create_daily_reminders(conn, today=None, user_id=None, plan_id=None):
+    """
+    Insert a 'daily reminder' notification for every exercise scheduled today
+    that has no status and no reminder yet, for all users unless user_id or
+    plan_id narrow it down.
+    Runs on the caller's connection and does not commit. Returns rows inserted.
+    """
+    today = today or datetime.now().strftime('%Y-%m-%d')
+    plan_filter, filter_params = _plan_filter(user_id, plan_id)
+    not_done = '''
+        NOT EXISTS (
+            SELECT 1 FROM ExerciseStatus es
+            WHERE es.user_id = {user} AND es.plan_id = {plan}
+              AND es.Exercise_ID = {exercise} AND es.date = {day})
+        AND NOT EXISTS (
+            SELECT 1 FROM notifications n
+            WHERE n.user_id = {user} AND n.plan_id = {plan} AND n.date = {day}
+              AND n.exercise_id = {exercise} AND n.type = 'daily reminder')'''
+
+    # 1. Materialized plans: one set-based insert
+    materialized_pending = not_done.format(user='wp.user_id', plan='wp.plan_id',
+                                           exercise='wpe.Exercise_ID', day='wpe.date')
+    inserted = conn.execute(f'''
+        INSERT INTO notifications (user_id, plan_id, type, details, checked, exercise_id, date)
+        SELECT DISTINCT wp.user_id, wp.plan_id, 'daily reminder',
+               'Don''t forget your workout for plan ' || wp.plan_id || ' today! 🏋️‍♀️',
+               0, wpe.Exercise_ID, wpe.date
+        FROM WorkoutPlan wp
+        JOIN WorkoutPlanExercise wpe ON wpe.plan_id = wp.plan_id
+        WHERE COALESCE(wp.storage, 'materialized') <> 'rule'{plan_filter}
+          AND wp.status IS NOT '{PLAN_COMPLETED}'
+          AND wpe.date = ?
+          AND {materialized_pending}
+    ''', filter_params + [today]).rowcount
+
+    # 2. Rule plans: today's exercises come from the rule
+    rule_plans = conn.execute(f'''
+        SELECT wp.* FROM WorkoutPlan wp
+        WHERE wp.storage = 'rule' AND wp.status IS NOT '{PLAN_COMPLETED}'{plan_filter}
+    ''', filter_params).fetchall()
+    rows = [
+        (plan['user_id'], plan['plan_id'], daily_reminder_text(plan['plan_id']), exercise_id, today)
+        for plan in rule_plans
+        for exercise_id in dict.fromkeys(ScheduleRule.from_plan_row(plan).exercises_on(today))
+    ]
+    if rows:
+        rule_pending = not_done.format(user='?1', plan='?2', exercise='?4', day='?5')
+        inserted += conn.executemany(f'''
+            INSERT INTO notifications (user_id, plan_id, type, details, checked, exercise_id, date)
+            SELECT ?1, ?2, 'daily reminder', ?3, 0, ?4, ?5
+            WHERE {rule_pending}
+        ''', rows).rowcount
+    return inserted
@@ -0,0 +1,186 @@
+# Background job scheduler for NextGenFitness
+#
+# Daily jobs (e.g. marking overdue exercises and creating the day's reminders
+# for every user) run on one worker thread shortly after their time of day,
+# instead of inside user requests. Each run is recorded in ScheduledJobRun,
+# keyed by (job, run_date): a run is claimed by inserting its row, so it
+# happens once per day even with several app processes (or the debug
+# reloader), a failed run is retried a few times, and a run whose process
+# died is picked up again once it is stale. On start the latest missed run of
+# each job is caught up.
+#
+# The same thread also runs small one-off tasks queued with submit(), such as
+# today's reminders for a plan that was just created. start() is per process:
+# a forked worker (e.g. under gunicorn) gets its own thread on its first
+# start(), and nothing ever runs on the calling request's thread.
+
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+STALE_AFTER_SECONDS = 3600  # a 'running' claim older than this is taken over
+
+
+def create_job_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ScheduledJobRun (
+                    job TEXT NOT NULL,
+                    run_date TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    detail TEXT,
+                    PRIMARY KEY (job, run_date))''')
+
+
+class JobScheduler:
+    """
+    Runs registered daily jobs, func(conn, run_date), on a daemon thread.
+    get_connection: callable returning a DB connection (closed after each run).
+    """
+
+    def __init__(self, get_connection, poll_interval=60.0, max_attempts=MAX_ATTEMPTS,
+                 stale_after=STALE_AFTER_SECONDS):
+        self.get_connection = get_connection
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+        self.jobs = []  # (name, 'HH:MM', func)
+        self._tasks = queue.SimpleQueue()
+        self._run_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None  # process that started _thread
+
+    def add_daily_job(self, name, run_at, func):
+        """Run func(conn, 'YYYY-MM-DD') once a day, at or after run_at ('HH:MM')"""
+        datetime.strptime(run_at, '%H:%M')  # reject malformed times up front
+        self.jobs.append((name, run_at, func))
+
+    @property
+    def running(self):
+        return self._pid == os.getpid() and self._thread is not None and self._thread.is_alive()
+
+    def due_date(self, run_at, now):
+        """Latest date whose run of a job scheduled at run_at is due by now"""
+        if now.strftime('%H:%M') >= run_at:
+            return now.strftime('%Y-%m-%d')
+        return (now - timedelta(days=1)).strftime('%Y-%m-%d')
+
+    def _claim(self, conn, name, run_date, now):
+        started_at = now.strftime('%Y-%m-%d %H:%M:%S')
+        stale_before = (now - timedelta(seconds=self.stale_after)).strftime('%Y-%m-%d %H:%M:%S')
+        claimed = conn.execute('''
+            INSERT OR IGNORE INTO ScheduledJobRun (job, run_date, status, attempts, started_at)
+            VALUES (?, ?, 'running', 1, ?)
+        ''', (name, run_date, started_at)).rowcount
+        if not claimed:
+            claimed = conn.execute('''
+                UPDATE ScheduledJobRun
+                SET status = 'running', attempts = attempts + 1, started_at = ?, finished_at = NULL
+                WHERE job = ? AND run_date = ?
+                  AND ((status = 'failed' AND attempts < ?) OR (status = 'running' AND started_at < ?))
+            ''', (started_at, name, run_date, self.max_attempts, stale_before)).rowcount
+        conn.commit()
+        return claimed == 1
+
+    def _finish(self, conn, name, run_date, status, detail):
+        conn.execute('''
+            UPDATE ScheduledJobRun SET status = ?, finished_at = ?, detail = ?
+            WHERE job = ? AND run_date = ?
+        ''', (status, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), detail, name, run_date))
+        conn.commit()
+
+    def run_pending(self, now=None):
+        """Run every job whose latest due run has not been done yet. Returns the names that ran."""
+        now = now or datetime.now()
+        ran = []
+        with self._run_lock:
+            conn = self.get_connection()
+            try:
+                for name, run_at, func in self.jobs:
+                    run_date = self.due_date(run_at, now)
+                    if not self._claim(conn, name, run_date, now):
+                        continue
+                    started = time.perf_counter()
+                    try:
+                        result = func(conn, run_date)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.exception("Job %s for %s failed", name, run_date)
+                        self._finish(conn, name, run_date, 'failed', str(e))
+                        continue
+                    logger.info("Job %s for %s done in %.2fs: %s",
+                                name, run_date, time.perf_counter() - started, result)
+                    self._finish(conn, name, run_date, 'done', None if result is None else str(result))
+                    ran.append(name)
+            finally:
+                conn.close()
+        return ran
+
+    def submit(self, func, *args):
+        """
+        Queue func(conn, *args) for the worker thread, starting it if needed.
+        Call after committing the data it needs.
+        """
+        self.start()
+        self._tasks.put((func, args))
+
+    def _run_task(self, func, args):
+        conn = self.get_connection()
+        try:
+            func(conn, *args)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.exception("Background task %s failed", getattr(func, '__name__', func))
+        finally:
+            conn.close()
+
+    def _work(self):
+        next_poll = time.monotonic()
+        while not self._stop.is_set():
+            if time.monotonic() >= next_poll:
+                try:
+                    self.run_pending()
+                except Exception:
+                    logger.exception("Scheduler poll failed")
+                next_poll = time.monotonic() + self.poll_interval
+            try:
+                task = self._tasks.get(timeout=max(0.0, next_poll - time.monotonic()))
+            except queue.Empty:
+                continue
+            if task is None:
+                break
+            self._run_task(*task)
+
+    def start(self):
+        """Start this process's worker thread if it is not running; its first poll catches up missed runs"""
+        if self.running:
+            return
+        with self._start_lock:
+            if self.running:
+                return
+            if self._pid != os.getpid():
+                # Forked from the process that owned the thread: its queue is not ours
+                self._tasks = queue.SimpleQueue()
+                self._run_lock = threading.Lock()
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._work, name='job-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._tasks.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
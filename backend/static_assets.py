@@ -0,0 +1,103 @@
+# Content-versioned static files for NextGenFitness
+#
+# Exercise photos and uploaded meal images used to be served with no
+# validators, so clients downloaded the same bytes on every screen. A
+# StaticAssets instance keeps a manifest of content hashes for one directory
+# (built at startup, refreshed per file when its mtime or size changes).
+# URLs carry the hash as ?v=<hash>; a request whose ?v matches the current
+# content is cacheable forever (immutable), anything else must revalidate.
+# Every response has an ETag and Last-Modified, so revalidation is a 304.
+
+import hashlib
+import os
+
+from flask import send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def file_digest(path):
+    """Short sha256 hex digest of a file's contents"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            sha.update(block)
+    return sha.hexdigest()[:16]
+
+
+def set_cache_headers(response, versioned):
+    """Immutable for a URL pinned to the current content, revalidate-every-time otherwise"""
+    if versioned:
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+        response.cache_control.max_age = 0
+        response.expires = None
+    return response
+
+
+class StaticAssets:
+    """
+    Content-hash manifest for the files under one directory.
+    root: directory served (paths are relative to it, '/'-separated)
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._manifest = {}  # relative path -> (mtime_ns, size, digest)
+
+    def build(self):
+        """Hash every file under root; returns the number of files"""
+        manifest = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                relpath = os.path.relpath(path, self.root).replace(os.sep, '/')
+                try:
+                    stat = os.stat(path)
+                    manifest[relpath] = (stat.st_mtime_ns, stat.st_size, file_digest(path))
+                except OSError:
+                    continue  # removed while walking
+        self._manifest = manifest
+        return len(manifest)
+
+    def _path(self, relpath):
+        path = safe_join(self.root, relpath)
+        return path if path is not None and os.path.isfile(path) else None
+
+    def version(self, relpath):
+        """Content hash of root/relpath, or None if there is no such file"""
+        path = self._path(relpath)
+        if path is None:
+            self._manifest.pop(relpath, None)
+            return None
+        stat = os.stat(path)
+        entry = self._manifest.get(relpath)
+        if entry is None or entry[:2] != (stat.st_mtime_ns, stat.st_size):
+            entry = (stat.st_mtime_ns, stat.st_size, file_digest(path))
+            self._manifest[relpath] = entry
+        return entry[2]
+
+    def url(self, prefix, relpath):
+        """Versioned URL for root/relpath under prefix, or None if the file is missing"""
+        version = self.version(relpath)
+        return f"{prefix}/{relpath}?v={version}" if version is not None else None
+
+    def send(self, relpath, requested_version=None, mimetype=None):
+        """
+        Response for root/relpath with an ETag of its content hash, answering
+        If-None-Match / If-Modified-Since with 304. Raises NotFound.
+        """
+        version = self.version(relpath)
+        if version is None:
+            raise NotFound()
+        response = send_file(self._path(relpath), mimetype=mimetype, etag=version, conditional=True)
+        return set_cache_headers(response, requested_version == version)
+
+    def __len__(self):
+        return len(self._manifest)
@@ -0,0 +1,21 @@
+# Secondary indexes for the workout, reminder and notification tables
+#
+# Plan dates, reminders, overdue checks and the notification list all look
+# rows up by plan, user and date; without these indexes each of those queries
+# scans its whole table. query_plan_check.py verifies the hot queries use them.
+
+WORKOUT_INDEXES = {
+    'idx_workout_plan_exercise_plan_date': ('WorkoutPlanExercise', 'plan_id, date'),
+    'idx_exercise_status_user_plan_date': ('ExerciseStatus', 'user_id, plan_id, date'),
+    'idx_notifications_user_date_type': ('notifications', 'user_id, date, type'),
+    'idx_workout_plan_user': ('WorkoutPlan', 'user_id'),
+}
+
+
+def create_workout_indexes(cursor):
+    """Create the indexes above (tables missing from this database are skipped)"""
+    cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {row[0] for row in cursor.fetchall()}
+    for name, (table, columns) in WORKOUT_INDEXES.items():
+        if table in tables:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
@@ -0,0 +1,159 @@
+# Workout plan scheduling for NextGenFitness
+#
+# A plan is a rotation of exercises laid out over workout days: every
+# CADENCE_DAYS days, EXERCISES_PER_DAY exercises, for duration_months * 12 days.
+# The whole schedule is computed in memory and written with one executemany,
+# or, for 'rule' plans, only the rotation is stored and dates are expanded on
+# demand by ScheduleRule.
+
+import json
+from datetime import datetime, timedelta
+
+WORKOUT_DAYS_PER_MONTH = 12  # 3 days/week × 4 weeks/month
+EXERCISES_PER_DAY = 3
+CADENCE_DAYS = 2  # every 2 days
+
+# How a plan's exercises are stored
+PLAN_STORAGE_MATERIALIZED = 'materialized'  # one WorkoutPlanExercise row per slot
+PLAN_STORAGE_RULE = 'rule'  # rotation/start/cadence on WorkoutPlan, expanded on demand
+
+# WorkoutPlan columns holding a rule plan (added to older databases at startup)
+PLAN_RULE_COLUMNS = [
+    ('storage', f"TEXT DEFAULT '{PLAN_STORAGE_MATERIALIZED}'"),
+    ('start_date', 'TEXT'),
+    ('rotation', 'TEXT'),
+    ('exercises_per_day', 'INTEGER'),
+    ('cadence_days', 'INTEGER'),
+]
+
+
+def total_workout_days(duration_months):
+    return duration_months * WORKOUT_DAYS_PER_MONTH
+
+
+def build_schedule(rotation, start_date, duration_months,
+                   exercises_per_day=EXERCISES_PER_DAY, cadence_days=CADENCE_DAYS):
+    """
+    Lay the rotation out over the plan's workout days.
+    Returns an ordered list of (date 'YYYY-MM-DD', [rotation items for that day]);
+    the rotation is repeated as often as needed to fill every slot.
+    """
+    if not rotation:
+        return []
+
+    size = len(rotation)
+    schedule = []
+    for day_index in range(total_workout_days(duration_months)):
+        workout_date = (start_date + timedelta(days=day_index * cadence_days)).strftime("%Y-%m-%d")
+        first_slot = day_index * exercises_per_day
+        day_items = [rotation[(first_slot + j) % size] for j in range(exercises_per_day)]
+        schedule.append((workout_date, day_items))
+    return schedule
+
+
+def materialize_schedule(cursor, plan_id, schedule, exercise_id=lambda item: item):
+    """Insert every scheduled exercise as WorkoutPlanExercise rows in a single executemany"""
+    cursor.executemany('''
+        INSERT INTO WorkoutPlanExercise (plan_id, Exercise_ID, date)
+        VALUES (?, ?, ?)
+    ''', [
+        (plan_id, exercise_id(item), workout_date)
+        for workout_date, day_items in schedule
+        for item in day_items
+    ])
+
+
+def schedule_to_dict(schedule):
+    return {workout_date: list(day_items) for workout_date, day_items in schedule}
+
+
+def iter_plan_json(payload, schedule):
+    """
+    Stream a plan response as JSON chunks: the scalar fields of `payload`
+    followed by a "plan" object written one date at a time, so long plans
+    are never serialised into a single string.
+    """
+    head = json.dumps(payload)
+    yield head[:-1] + (', ' if payload else '') + '"plan": {'
+    for i, (workout_date, day_items) in enumerate(schedule):
+        yield ('' if i == 0 else ', ') + json.dumps(workout_date) + ': ' + json.dumps(day_items)
+    yield '}}'
+
+
+class ScheduleRule:
+    """
+    Compact plan representation stored on the WorkoutPlan row: the exercise
+    rotation, the first workout date and the cadence. Any date's exercises
+    are computed arithmetically, so creating a plan writes a single row.
+    """
+
+    def __init__(self, rotation, start_date, duration_months,
+                 exercises_per_day=EXERCISES_PER_DAY, cadence_days=CADENCE_DAYS):
+        self.rotation = list(rotation)
+        self.start_date = start_date
+        self.duration_months = duration_months
+        self.exercises_per_day = exercises_per_day
+        self.cadence_days = cadence_days
+
+    @classmethod
+    def from_plan_row(cls, plan):
+        """Build the rule for a WorkoutPlan row, or None if the plan is materialized"""
+        plan = dict(plan)
+        if plan.get('storage') != PLAN_STORAGE_RULE:
+            return None
+        return cls(
+            json.loads(plan['rotation'] or '[]'),
+            datetime.strptime(plan['start_date'], "%Y-%m-%d").date(),
+            plan['duration_months'],
+            plan.get('exercises_per_day') or EXERCISES_PER_DAY,
+            plan.get('cadence_days') or CADENCE_DAYS,
+        )
+
+    def to_columns(self):
+        """Values for the WorkoutPlan rule columns"""
+        return {
+            'storage': PLAN_STORAGE_RULE,
+            'start_date': self.start_date.strftime("%Y-%m-%d"),
+            'rotation': json.dumps(self.rotation),
+            'exercises_per_day': self.exercises_per_day,
+            'cadence_days': self.cadence_days,
+        }
+
+    @property
+    def total_days(self):
+        return total_workout_days(self.duration_months)
+
+    def slot_count(self):
+        return self.total_days * self.exercises_per_day if self.rotation else 0
+
+    def dates(self):
+        """All workout dates of the plan, in order"""
+        return [
+            (self.start_date + timedelta(days=i * self.cadence_days)).strftime("%Y-%m-%d")
+            for i in range(self.total_days)
+        ]
+
+    def last_date(self):
+        """Date of the plan's final workout day ('YYYY-MM-DD')"""
+        last = self.start_date + timedelta(days=(self.total_days - 1) * self.cadence_days)
+        return last.strftime("%Y-%m-%d")
+
+    def exercises_on(self, date_str):
+        """Rotation items scheduled on a date ('YYYY-MM-DD'); empty if it is not a workout day"""
+        if not self.rotation:
+            return []
+        day = datetime.strptime(date_str, "%Y-%m-%d").date()
+        offset = (day - self.start_date).days
+        if offset < 0 or offset % self.cadence_days:
+            return []
+        day_index = offset // self.cadence_days
+        if day_index >= self.total_days:
+            return []
+        first_slot = day_index * self.exercises_per_day
+        size = len(self.rotation)
+        return [self.rotation[(first_slot + j) % size] for j in range(self.exercises_per_day)]
+
+    def schedule(self):
+        """Fully expanded schedule, e.g. for materialization or analytics"""
+        return build_schedule(self.rotation, self.start_date, self.duration_months,
+                              self.exercises_per_day, self.cadence_days)
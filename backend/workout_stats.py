@@ -0,0 +1,243 @@
+# Materialized workout statistics for NextGenFitness
+#
+# Workout progress and the global workout analytics are read from counters
+# instead of being recounted on every request:
+#   WorkoutPlan.total_exercises / completed_exercises / overdue_exercises
+#                              per-plan counters, and WorkoutPlan.progress
+#                              (completed share of total, in percent)
+#   workout_stats (one row)    plan count, completed/overdue exercise counts
+#                              and the running sum of per-plan progress ratios
+#   ExerciseUsage              how often each exercise is scheduled
+# Triggers on WorkoutPlan, WorkoutPlanExercise and ExerciseStatus keep them
+# current in the same transaction as the change. Rule-stored plans count
+# their slots from the rotation (see workout_schedule.ScheduleRule).
+# create_workout_stats() drops and recreates the triggers, so a migration that
+# calls it again installs changed definitions; rebuild_workout_stats()
+# recomputes everything from the base tables.
+
+from workout_schedule import EXERCISES_PER_DAY, PLAN_STORAGE_RULE, WORKOUT_DAYS_PER_MONTH
+
+WORKOUT_PLAN_COUNTERS = [
+    ('total_exercises', 'INTEGER NOT NULL DEFAULT 0'),
+    ('completed_exercises', 'INTEGER NOT NULL DEFAULT 0'),
+    ('overdue_exercises', 'INTEGER NOT NULL DEFAULT 0'),
+]
+
+STATS_TRIGGERS = [
+    'WorkoutPlan_stats_ai', 'WorkoutPlan_stats_ad', 'WorkoutPlan_stats_au', 'WorkoutPlan_storage_au',
+    'WorkoutPlanExercise_stats_ai', 'WorkoutPlanExercise_stats_ad', 'WorkoutPlanExercise_stats_au',
+    'ExerciseStatus_stats_ai', 'ExerciseStatus_stats_ad', 'ExerciseStatus_stats_au',
+]
+
+
+def _rule_slots(plan):
+    """SQL for the number of scheduled slots of a rule plan row (alias or new/old)"""
+    return (f"(CASE WHEN {plan}.storage = '{PLAN_STORAGE_RULE}' AND json_array_length({plan}.rotation) > 0 "
+            f"THEN {plan}.duration_months * {WORKOUT_DAYS_PER_MONTH} "
+            f"* COALESCE({plan}.exercises_per_day, {EXERCISES_PER_DAY}) ELSE 0 END)")
+
+
+def _rule_usage(plan, sign='', tables=''):
+    """SELECT of (Exercise_ID, uses) for each rotation entry of a rule plan row"""
+    slots = _rule_slots(plan)
+    size = f"json_array_length({plan}.rotation)"
+    return f'''
+        SELECT value, {sign}({slots} / {size} + (key < {slots} % {size}))
+        FROM {tables}json_each(CASE WHEN {plan}.storage = '{PLAN_STORAGE_RULE}' AND json_valid({plan}.rotation)
+                                    THEN {plan}.rotation ELSE '[]' END)
+        WHERE 1'''
+
+
+def _progress(plan):
+    return f"(CASE WHEN {plan}.total_exercises > 0 THEN {plan}.completed_exercises * 1.0 / {plan}.total_exercises ELSE 0 END)"
+
+
+def _progress_percent(plan):
+    """WorkoutPlan.progress: whole percent, as check_workout_progress reports it"""
+    return f"CAST({_progress(plan)} * 100 AS INTEGER)"
+
+
+def _add_usage(exercise, amount):
+    return f'''
+        INSERT INTO ExerciseUsage (Exercise_ID, uses) VALUES ({exercise}, {amount})
+        ON CONFLICT(Exercise_ID) DO UPDATE SET uses = uses + excluded.uses;'''
+
+
+def create_workout_stats(cursor):
+    """Create the counter columns, tables and triggers; backfill them when the schema was extended"""
+    cursor.execute("PRAGMA table_info(WorkoutPlan)")
+    existing = {row[1] for row in cursor.fetchall()}
+    added = False
+    for name, declaration in WORKOUT_PLAN_COUNTERS:
+        if name not in existing:
+            cursor.execute(f"ALTER TABLE WorkoutPlan ADD COLUMN {name} {declaration}")
+            added = True
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'workout_stats'")
+    exists = cursor.fetchone() is not None
+
+    cursor.execute('''CREATE TABLE IF NOT EXISTS workout_stats (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    total_plans INTEGER NOT NULL DEFAULT 0,
+                    completed_exercises INTEGER NOT NULL DEFAULT 0,
+                    overdue_exercises INTEGER NOT NULL DEFAULT 0,
+                    progress_sum REAL NOT NULL DEFAULT 0,
+                    progress_plans INTEGER NOT NULL DEFAULT 0)''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ExerciseUsage (
+                    Exercise_ID INTEGER PRIMARY KEY,
+                    uses INTEGER NOT NULL DEFAULT 0)''')
+    cursor.execute('''CREATE INDEX IF NOT EXISTS idx_exercise_usage_uses
+                    ON ExerciseUsage (uses DESC, Exercise_ID)''')
+
+    for trigger in STATS_TRIGGERS:
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+
+    # 1. Plans: plan count, progress ratio sum, rule plan slots and usage
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlan_stats_ai AFTER INSERT ON WorkoutPlan BEGIN
+                        UPDATE workout_stats SET total_plans = total_plans + 1,
+                            progress_sum = progress_sum + {_progress('new')},
+                            progress_plans = progress_plans + (new.total_exercises > 0)
+                        WHERE id = 1;
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises + {_rule_slots('new')}
+                        WHERE plan_id = new.plan_id AND new.storage = '{PLAN_STORAGE_RULE}';
+                        INSERT INTO ExerciseUsage (Exercise_ID, uses) {_rule_usage('new')}
+                        ON CONFLICT(Exercise_ID) DO UPDATE SET uses = uses + excluded.uses;
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlan_stats_ad AFTER DELETE ON WorkoutPlan BEGIN
+                        UPDATE workout_stats SET total_plans = total_plans - 1,
+                            progress_sum = progress_sum - {_progress('old')},
+                            progress_plans = progress_plans - (old.total_exercises > 0)
+                        WHERE id = 1;
+                        INSERT INTO ExerciseUsage (Exercise_ID, uses) {_rule_usage('old', '-')}
+                        ON CONFLICT(Exercise_ID) DO UPDATE SET uses = uses + excluded.uses;
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlan_stats_au
+                    AFTER UPDATE OF total_exercises, completed_exercises ON WorkoutPlan BEGIN
+                        UPDATE workout_stats SET
+                            progress_sum = progress_sum + {_progress('new')} - {_progress('old')},
+                            progress_plans = progress_plans + (new.total_exercises > 0) - (old.total_exercises > 0)
+                        WHERE id = 1;
+                        UPDATE WorkoutPlan SET progress = {_progress_percent('new')} WHERE plan_id = new.plan_id;
+                    END''')
+    # A rule plan being materialized: its WorkoutPlanExercise rows now do the counting
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlan_storage_au AFTER UPDATE OF storage ON WorkoutPlan
+                    WHEN old.storage = '{PLAN_STORAGE_RULE}' AND new.storage IS NOT '{PLAN_STORAGE_RULE}' BEGIN
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises - {_rule_slots('old')}
+                        WHERE plan_id = new.plan_id;
+                        INSERT INTO ExerciseUsage (Exercise_ID, uses) {_rule_usage('old', '-')}
+                        ON CONFLICT(Exercise_ID) DO UPDATE SET uses = uses + excluded.uses;
+                    END''')
+
+    # 2. Scheduled exercises of materialized plans
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlanExercise_stats_ai AFTER INSERT ON WorkoutPlanExercise BEGIN
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises + 1 WHERE plan_id = new.plan_id;
+                        {_add_usage('new.Exercise_ID', 1)}
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlanExercise_stats_ad AFTER DELETE ON WorkoutPlanExercise BEGIN
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises - 1 WHERE plan_id = old.plan_id;
+                        {_add_usage('old.Exercise_ID', -1)}
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER WorkoutPlanExercise_stats_au
+                    AFTER UPDATE OF plan_id, Exercise_ID ON WorkoutPlanExercise BEGIN
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises - 1 WHERE plan_id = old.plan_id;
+                        UPDATE WorkoutPlan SET total_exercises = total_exercises + 1 WHERE plan_id = new.plan_id;
+                        {_add_usage('old.Exercise_ID', -1)}
+                        {_add_usage('new.Exercise_ID', 1)}
+                    END''')
+
+    # 3. Exercise statuses (a plan counts its owner's statuses)
+    def count_status(row, sign):
+        return f'''
+                        UPDATE WorkoutPlan SET
+                            completed_exercises = completed_exercises {sign} ({row}.status = 'completed'),
+                            overdue_exercises = overdue_exercises {sign} ({row}.status = 'overdue')
+                        WHERE plan_id = {row}.plan_id AND user_id = {row}.user_id;
+                        UPDATE workout_stats SET
+                            completed_exercises = completed_exercises {sign} ({row}.status = 'completed'),
+                            overdue_exercises = overdue_exercises {sign} ({row}.status = 'overdue')
+                        WHERE id = 1;'''
+
+    cursor.execute(f'''CREATE TRIGGER ExerciseStatus_stats_ai AFTER INSERT ON ExerciseStatus BEGIN
+                        {count_status('new', '+')}
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER ExerciseStatus_stats_ad AFTER DELETE ON ExerciseStatus BEGIN
+                        {count_status('old', '-')}
+                    END''')
+    cursor.execute(f'''CREATE TRIGGER ExerciseStatus_stats_au
+                    AFTER UPDATE OF status, plan_id, user_id ON ExerciseStatus BEGIN
+                        {count_status('old', '-')}
+                        {count_status('new', '+')}
+                    END''')
+
+    if added or not exists:
+        rebuild_workout_stats(cursor)
+
+
+def rebuild_workout_stats(cursor):
+    """Recompute every counter from WorkoutPlan, WorkoutPlanExercise and ExerciseStatus"""
+    cursor.execute(f'''
+        UPDATE WorkoutPlan SET
+            total_exercises = CASE WHEN storage = '{PLAN_STORAGE_RULE}' THEN {_rule_slots('WorkoutPlan')}
+                ELSE (SELECT COUNT(*) FROM WorkoutPlanExercise wpe WHERE wpe.plan_id = WorkoutPlan.plan_id) END,
+            completed_exercises = (
+                SELECT COUNT(*) FROM ExerciseStatus es
+                WHERE es.plan_id = WorkoutPlan.plan_id AND es.user_id = WorkoutPlan.user_id
+                  AND es.status = 'completed'),
+            overdue_exercises = (
+                SELECT COUNT(*) FROM ExerciseStatus es
+                WHERE es.plan_id = WorkoutPlan.plan_id AND es.user_id = WorkoutPlan.user_id
+                  AND es.status = 'overdue')
+    ''')
+
+    # The triggers above touched workout_stats while counters changed; replace it wholesale
+    cursor.execute(f'''
+        INSERT OR REPLACE INTO workout_stats
+            (id, total_plans, completed_exercises, overdue_exercises, progress_sum, progress_plans)
+        SELECT 1,
+               (SELECT COUNT(*) FROM WorkoutPlan),
+               (SELECT COUNT(*) FROM ExerciseStatus WHERE status = 'completed'),
+               (SELECT COUNT(*) FROM ExerciseStatus WHERE status = 'overdue'),
+               (SELECT COALESCE(SUM({_progress('WorkoutPlan')}), 0) FROM WorkoutPlan),
+               (SELECT COUNT(*) FROM WorkoutPlan WHERE total_exercises > 0)
+    ''')
+
+    cursor.execute("DELETE FROM ExerciseUsage")
+    cursor.execute(f'''
+        INSERT INTO ExerciseUsage (Exercise_ID, uses)
+        SELECT Exercise_ID, SUM(uses) FROM (
+            SELECT Exercise_ID, COUNT(*) AS uses FROM WorkoutPlanExercise GROUP BY Exercise_ID
+            UNION ALL
+            {_rule_usage('WorkoutPlan', tables='WorkoutPlan, ')}
+        )
+        GROUP BY Exercise_ID
+    ''')
+
+
+def read_workout_stats(conn):
+    """Global counters: plans, completed/overdue exercises, average progress and the most used exercise"""
+    stats = conn.execute("SELECT * FROM workout_stats WHERE id = 1").fetchone()
+    top = conn.execute('''
+        SELECT u.Exercise_ID, e.name
+        FROM ExerciseUsage u LEFT JOIN Exercise e ON e.Exercise_ID = u.Exercise_ID
+        WHERE u.uses > 0
+        ORDER BY u.uses DESC, u.Exercise_ID
+        LIMIT 1
+    ''').fetchone()
+
+    progress_plans = stats['progress_plans'] if stats else 0
+    return {
+        'total_plans': stats['total_plans'] if stats else 0,
+        'completed_exercises': stats['completed_exercises'] if stats else 0,
+        'overdue_exercises': stats['overdue_exercises'] if stats else 0,
+        'average_progress_percent': round(stats['progress_sum'] * 100 / progress_plans, 1) if progress_plans else 0,
+        'most_chosen_exercise': top['name'] if top else None,
+    }
+
+
+def read_plan_progress(conn, plan_id):
+    """A plan's progress and counters (one primary-key lookup), or None if there is no such plan"""
+    row = conn.execute('''
+        SELECT progress, total_exercises, completed_exercises, overdue_exercises
+        FROM WorkoutPlan WHERE plan_id = ?
+    ''', (plan_id,)).fetchone()
+    return dict(row) if row else None